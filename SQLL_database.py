@@ -1,18 +1,347 @@
 import sqlite3
 import hashlib
+import hmac
 import secrets
-from datetime import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from move_codec import encode_moves, decode_moves
+from bloom_filter import BloomFilter
+
+# Per-connection cache of compiled statements; every query in this module fits comfortably
+CACHED_STATEMENTS = 256
+# The filter of taken usernames/emails is rebuilt after this long, or once it outgrows its capacity,
+# to drop names freed by expired sign-ups and pick up ones added by other processes
+TAKEN_FILTER_MAX_AGE = 300.0
+# Elo rating of a new account. The users.rating column defaults to 0 from before ratings were Elo,
+# so every INSERT sets it explicitly
+INITIAL_RATING = 1200
+PRAGMAS = [
+    # Lets db_maintenance hand pages freed by deletes back to the OS. Only takes effect on a new file,
+    # and must come before the switch to WAL; existing files need one VACUUM (db_maintenance --convert)
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    # Readers keep reading while a writer commits
+    "PRAGMA journal_mode=WAL",
+    # In WAL mode NORMAL only fsyncs at checkpoints and is still safe against corruption
+    "PRAGMA synchronous=NORMAL",
+    # 8 MB page cache per connection (negative = KiB)
+    "PRAGMA cache_size=-8000",
+    "PRAGMA temp_store=MEMORY",
+    # Wait for a competing writer instead of failing with "database is locked"
+    "PRAGMA busy_timeout=5000",
+]
+
+
+# Schema changes after the base tables, applied in order and tracked in PRAGMA user_version.
+# Append new entries; never edit one that has shipped.
+MIGRATIONS = [
+    # 1: indexes for the lookups that otherwise scan whole tables
+    [
+        "CREATE INDEX IF NOT EXISTS idx_login_attempts_username_time ON login_attempts (username, attempt_time)",
+        "CREATE INDEX IF NOT EXISTS idx_pending_users_expires_at ON pending_users (expires_at)",
+        "CREATE INDEX IF NOT EXISTS idx_password_resets_email ON password_resets (email)",
+        "CREATE INDEX IF NOT EXISTS idx_password_resets_expires_at ON password_resets (expires_at)",
+    ],
+    # 2: finished games recorded by the server; moves take 2 bytes each (see move_codec)
+    [
+        """CREATE TABLE IF NOT EXISTS games (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            white TEXT NOT NULL,
+            black TEXT NOT NULL,
+            result TEXT NOT NULL,
+            termination TEXT,
+            time_control TEXT,
+            move_data BLOB NOT NULL,
+            started_at TIMESTAMP,
+            ended_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_games_white ON games (white)",
+        "CREATE INDEX IF NOT EXISTS idx_games_black ON games (black)",
+        "CREATE INDEX IF NOT EXISTS idx_games_ended_at ON games (ended_at)",
+    ],
+    # 3: leaderboard order, so the top players are read from the front of an index instead of sorting every user
+    [
+        "CREATE INDEX IF NOT EXISTS idx_users_leaderboard ON users (rating DESC, username) WHERE is_active = TRUE",
+    ],
+    # 4: ratings started at 0, the floor, so losses were clamped while wins counted in full; move every
+    # account up by the Elo starting rating, which keeps the differences between players as they were
+    [
+        f"UPDATE users SET rating = rating + {INITIAL_RATING}",
+    ],
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(conn):
+    """Bring the schema up to len(MIGRATIONS); returns the number of migrations applied"""
+    applied = 0
+    for version, statements in enumerate(MIGRATIONS, start=1):
+        if schema_version(conn) >= version:
+            continue
+        # Each migration and its version bump commit together, so a crash can't half-apply one.
+        # IMMEDIATE takes the write lock first, so another process can't apply the same migration meanwhile.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) < version:
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version = {version}")
+                applied += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
+
+
+class ConnectionPool:
+    """Long-lived connections to one database file, shared by every UserDatabase and thread"""
+
+    def __init__(self, db_file, max_idle=4):
+        self.db_file = db_file
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        self.schema_lock = threading.Lock()
+        self.schema_ready = False
+        # Bloom filter of every username and email in use (see UserDatabase.check_availability)
+        self.taken_filter = None
+        self.taken_filter_built = 0.0
+        self.taken_filter_lock = threading.Lock()
+        # Names added while a rebuild reads the tables (None when no rebuild is running)
+        self.taken_filter_added = None
+
+    def _connect(self):
+        # A connection is only ever used by the thread that acquired it, so it may move between threads
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, cached_statements=CACHED_STATEMENTS)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return self._connect()
+
+    def release(self, conn):
+        # Uncommitted work is discarded, just like closing a connection would
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if len(self.idle) < self.max_idle:
+                self.idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self.lock:
+            connections, self.idle = self.idle, []
+        for conn in connections:
+            conn.close()
+
+
+# Password hashing scheme for new hashes, "algorithm:param=value,...". Override per deployment with the
+# environment variable, e.g. CHESS_PASSWORD_HASH="scrypt:n=32768,r=8,p=1"; older hashes are upgraded at login.
+PASSWORD_HASH_ENV_VAR = "CHESS_PASSWORD_HASH"
+DEFAULT_PASSWORD_SCHEME = "pbkdf2_sha256:iterations=100000"
+# Hashes stored before the algorithm was recorded: bare hex PBKDF2-SHA256 with 100000 iterations
+LEGACY_SCHEME = ("pbkdf2_sha256", {"iterations": 100000})
+
+# hashlib's PBKDF2 and scrypt release the GIL, so threads are enough to spread hashing over every core
+_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="user-db")
+
+
+def _pbkdf2_sha256(password, salt, iterations):
+    return hashlib.pbkdf2_hmac('sha256', password, salt, iterations)
+
+
+def _scrypt(password, salt, n, r, p):
+    # OpenSSL needs 128 * r * (n + p + 2) bytes; the default 32 MB cap is too small for larger n
+    return hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=128 * r * (n + p + 2) + 1024 * 1024)
+
+
+HASHERS = {
+    "pbkdf2_sha256": _pbkdf2_sha256,
+    "scrypt": _scrypt,
+}
+
+
+def parse_scheme(text):
+    """'scrypt:n=16384,r=8,p=1' -> ('scrypt', {'n': 16384, 'r': 8, 'p': 1})"""
+    algorithm, _, param_text = text.strip().partition(":")
+    if algorithm not in HASHERS:
+        raise ValueError(f"Unknown password hash algorithm '{algorithm}'")
+    params = {}
+    for item in filter(None, param_text.split(",")):
+        key, _, value = item.partition("=")
+        params[key.strip()] = int(value)
+    return algorithm, params
+
+
+def format_params(params):
+    return ",".join(f"{key}={value}" for key, value in sorted(params.items()))
+
+
+def current_scheme():
+    return parse_scheme(os.environ.get(PASSWORD_HASH_ENV_VAR) or DEFAULT_PASSWORD_SCHEME)
+
+
+def stored_scheme(password_hash):
+    """(algorithm, params, hex digest) of a stored hash, which is 'algorithm$params$hex' or legacy bare hex"""
+    if "$" not in password_hash:
+        return LEGACY_SCHEME[0], LEGACY_SCHEME[1], password_hash
+    algorithm, param_text, digest = password_hash.split("$", 2)
+    return parse_scheme(f"{algorithm}:{param_text}") + (digest,)
+
+
+def _digest(password, salt, algorithm, params):
+    return HASHERS[algorithm](password.encode('utf-8'), salt.encode('utf-8'), **params).hex()
+
+
+def hash_password(password, salt=None, scheme=None):
+    """('algorithm$params$hex', salt) of password under scheme (default: current_scheme());
+    a new random salt is made when none is given"""
+    if salt is None:
+        salt = secrets.token_hex(16)
+    algorithm, params = scheme or current_scheme()
+
+    password_hash = f"{algorithm}${format_params(params)}${_digest(password, salt, algorithm, params)}"
+    return password_hash, salt
+
+
+def verify_password(password, password_hash, salt):
+    """Check password against a stored hash of any supported scheme (constant-time comparison)"""
+    algorithm, params, digest = stored_scheme(password_hash)
+    return hmac.compare_digest(_digest(password, salt, algorithm, params), digest)
+
+
+def needs_rehash(password_hash):
+    """The stored hash uses another algorithm or cost than new hashes would"""
+    algorithm, params, _ = stored_scheme(password_hash)
+    return "$" not in password_hash or (algorithm, params) != current_scheme()
+
+
+def fmt_timestamp(moment):
+    """datetime -> the 'YYYY-MM-DD HH:MM:SS' text SQLite's CURRENT_TIMESTAMP uses (None stays None)"""
+    return moment.strftime("%Y-%m-%d %H:%M:%S") if moment else None
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(db_file):
+    with _pools_lock:
+        pool = _pools.get(db_file)
+        if pool is None:
+            pool = _pools[db_file] = ConnectionPool(db_file)
+        return pool
+
+
+# Tables whose rows carry an expires_at Unix timestamp and are useless after it (see db_maintenance)
+EXPIRING_TABLES = ("pending_users", "password_resets")
+
+
+def delete_expired(conn, table, now, batch_size=None):
+    """Delete the rows of table that expired before now; returns how many.
+    With batch_size each batch is its own short transaction, so other writers never wait for the whole sweep."""
+    limit = f"LIMIT {int(batch_size)}" if batch_size else ""
+    total = 0
+    while True:
+        cursor = conn.execute(
+            f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE expires_at < ? {limit})", (now,)
+        )
+        conn.commit()
+        total += cursor.rowcount
+        if not batch_size or cursor.rowcount < batch_size:
+            return total
+
+
+def find_taken(conn, username=None, email=None):
+    """Which of username/email are in use by a user or a pending sign-up: a subset of {"username", "email"}.
+    One UNION query, each part answered from a unique index."""
+    parts, params = [], []
+    if username is not None:
+        parts += ["SELECT 'username' FROM users WHERE username = ?",
+                  "SELECT 'username' FROM pending_users WHERE username = ?"]
+        params += [username, username]
+    if email is not None:
+        parts += ["SELECT 'email' FROM users WHERE email = ?",
+                  "SELECT 'email' FROM pending_users WHERE email = ?"]
+        params += [email.lower(), email.lower()]
+    if not parts:
+        return set()
+    return {row[0] for row in conn.execute(" UNION ".join(parts), params)}
+
+
+# ---- writes shared by UserDatabase and db_writer.DatabaseWriter; each runs on an open cursor ----
+
+def insert_login_attempt(cursor, username, ip_address, successful):
+    cursor.execute(
+        "INSERT INTO login_attempts (username, ip_address, successful) VALUES (?, ?, ?)",
+        (username, ip_address, successful)
+    )
+
+
+def insert_games(cursor, games):
+    """See UserDatabase.add_games; returns the number of rows inserted"""
+    cursor.executemany(
+        """INSERT INTO games (white, black, result, termination, time_control, move_data, started_at, ended_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        # A game without ended_at ends now, as the column default would say if the INSERT left it out
+        [(game["white"], game["black"], game["result"], game.get("termination"), game.get("time_control"),
+          encode_moves(game["moves"]), fmt_timestamp(game.get("started_at")),
+          fmt_timestamp(game.get("ended_at") or datetime.now(timezone.utc)))
+         for game in games]
+    )
+    return cursor.rowcount
+
+
+def rate_users(cursor, usernames, compute):
+    """See UserDatabase.update_ratings; the caller owns the transaction"""
+    placeholders = ", ".join("?" * len(usernames))
+    cursor.execute(
+        f"SELECT username, rating FROM users WHERE username IN ({placeholders}) AND is_active = TRUE",
+        list(usernames)
+    )
+    ratings = dict(cursor.fetchall())
+
+    if len(ratings) != len(set(usernames)):
+        return False, "User not found"
+
+    new_ratings = compute(ratings)
+    cursor.executemany(
+        "UPDATE users SET rating = ? WHERE username = ?",
+        [(rating, username) for username, rating in new_ratings.items()]
+    )
+    return True, {username: (ratings[username], rating) for username, rating in new_ratings.items()}
 
 
 class UserDatabase:
-    def __init__(self, db_file="user_data.db"):
-        """Initialize database connection and create tables if they don't exist"""
+    def __init__(self, db_file="user_data.db", writer=None, limiter=None):
+        """Initialize database connection and create tables if they don't exist.
+        With a db_writer.DatabaseWriter, login attempts are written behind instead of inline;
+        with a rate_limiter.LoginRateLimiter, authenticate_user refuses floods before hashing anything."""
         self.db_file = db_file
-        self.create_tables()
+        self.pool = get_connection_pool(db_file)
+        self.writer = writer
+        self.limiter = limiter
+
+        # Creating the schema once per file is enough; later instances are just a handle on the pool
+        with self.pool.schema_lock:
+            if not self.pool.schema_ready:
+                self.create_tables()
+                self.pool.schema_ready = True
 
     def create_tables(self):
         """Create necessary tables if they don't exist"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         # Users table
@@ -67,25 +396,23 @@ class UserDatabase:
         ''')
 
         conn.commit()
-        conn.close()
+        try:
+            apply_migrations(conn)
+        finally:
+            self.pool.release(conn)
 
     def _hash_password(self, password, salt=None):
         """Hash a password with a salt for secure storage"""
-        if salt is None:
-            salt = secrets.token_hex(16)
+        return hash_password(password, salt)
 
-        password_hash = hashlib.pbkdf2_hmac(
-            'sha256',
-            password.encode('utf-8'),
-            salt.encode('utf-8'),
-            100000  # Number of iterations
-        ).hex()
-
-        return password_hash, salt
+    def submit(self, method_name, *args, **kwargs):
+        """Run a method (e.g. 'authenticate_user') on the worker pool; returns a concurrent.futures.Future.
+        Use this from UI code for anything that hashes a password."""
+        return _executor.submit(getattr(self, method_name), *args, **kwargs)
 
     def add_user(self, username, email, password):
         """Add a verified user to the database"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -93,20 +420,21 @@ class UserDatabase:
             password_hash, salt = self._hash_password(password)
 
             cursor.execute(
-                "INSERT INTO users (username, email, password_hash, salt) VALUES (?, ?, ?, ?)",
-                (username, email.lower(), password_hash, salt)
+                "INSERT INTO users (username, email, password_hash, salt, rating) VALUES (?, ?, ?, ?, ?)",
+                (username, email.lower(), password_hash, salt, INITIAL_RATING)
             )
             conn.commit()
+            self._mark_taken(username, email)
             return True
         except sqlite3.IntegrityError:
             # User already exists
             return False
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def add_pending_user(self, username, email, password, verification_code, expiry_minutes=30):
         """Add a user to pending verification"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -116,9 +444,19 @@ class UserDatabase:
             # Calculate expiry time
             expiry_time = datetime.now().timestamp() + (expiry_minutes * 60)
 
-            # First delete any existing pending user with same email or username
-            cursor.execute("DELETE FROM pending_users WHERE email = ? OR username = ?",
-                           (email.lower(), username))
+            # The availability check before this can be stale (see check_availability), so the final check is
+            # made here, with the write lock held so no other sign-up can claim the names in between
+            cursor.execute("BEGIN IMMEDIATE")
+
+            # Replace this person's earlier sign-up (same username and email) and anyone's expired one
+            cursor.execute(
+                "DELETE FROM pending_users WHERE (email = ? AND username = ?) "
+                "OR ((email = ? OR username = ?) AND expires_at < ?)",
+                (email.lower(), username, email.lower(), username, datetime.now().timestamp())
+            )
+            if find_taken(conn, username, email):
+                conn.rollback()
+                return False
 
             # Insert new pending user
             cursor.execute(
@@ -128,16 +466,17 @@ class UserDatabase:
                 (username, email.lower(), password_hash, salt, verification_code, expiry_time)
             )
             conn.commit()
+            self._mark_taken(username, email)
             return True
         except sqlite3.IntegrityError:
             # There was an issue with the insertion
             return False
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def verify_user(self, email, verification_code):
         """Verify a user's email and move them from pending to active users"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -159,8 +498,8 @@ class UserDatabase:
 
             # Add to verified users
             cursor.execute(
-                "INSERT INTO users (username, email, password_hash, salt) VALUES (?, ?, ?, ?)",
-                (username, email, password_hash, salt)
+                "INSERT INTO users (username, email, password_hash, salt, rating) VALUES (?, ?, ?, ?, ?)",
+                (username, email, password_hash, salt, INITIAL_RATING)
             )
 
             # Remove from pending users
@@ -171,11 +510,11 @@ class UserDatabase:
         except sqlite3.IntegrityError:
             return False, "Username or email already exists"
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def authenticate_user(self, username_or_email, password, ip_address=None):
         """Authenticate a user and return user data if successful"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -188,47 +527,74 @@ class UserDatabase:
             cursor.execute(query, (username_or_email.lower(),))
             user_data = cursor.fetchone()
 
-            # Record the login attempt
-            if ip_address:
-                cursor.execute(
-                    "INSERT INTO login_attempts (username, ip_address) VALUES (?, ?)",
-                    (username_or_email, ip_address)
-                )
+            # Attempts count against the account whichever of its names was typed, so switching between
+            # username and email doesn't double the failures allowed; unknown names are keyed as typed
+            account = user_data[1] if user_data else username_or_email.strip().lower()
+            if self.limiter is not None:
+                retry_after = self.limiter.check(account, ip_address)
+                if retry_after:
+                    return False, f"Too many login attempts. Try again in {int(retry_after) + 1} seconds."
 
             if not user_data:
+                self._record_login_attempt(cursor, account, ip_address, False)
                 conn.commit()
                 return False, "Invalid username or email"
 
             user_id, username, email, stored_hash, salt = user_data
 
             # Verify password
-            calculated_hash, _ = self._hash_password(password, salt)
-
-            if calculated_hash == stored_hash:
+            if verify_password(password, stored_hash, salt):
                 # Update last login time
                 cursor.execute(
                     "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
                     (user_id,)
                 )
 
-                # Mark login attempt as successful
-                if ip_address:
+                # The plain password is only available now: move old hashes to the configured scheme
+                if needs_rehash(stored_hash):
+                    new_hash, new_salt = self._hash_password(password)
                     cursor.execute(
-                        "UPDATE login_attempts SET successful = TRUE WHERE username = ? ORDER BY attempt_time DESC LIMIT 1",
-                        (username_or_email,)
+                        "UPDATE users SET password_hash = ?, salt = ? WHERE id = ?",
+                        (new_hash, new_salt, user_id)
                     )
 
+                self._record_login_attempt(cursor, account, ip_address, True)
                 conn.commit()
                 return True, {"id": user_id, "username": username, "email": email}
             else:
+                self._record_login_attempt(cursor, account, ip_address, False)
                 conn.commit()
                 return False, "Invalid password"
         finally:
-            conn.close()
+            self.pool.release(conn)
+
+    def _record_login_attempt(self, cursor, username, ip_address, successful):
+        """One row per attempt with its outcome, so there is nothing to update afterwards"""
+        if self.limiter is not None:
+            self.limiter.record(username, ip_address, successful)
+        if not ip_address:
+            return
+        if self.writer is not None:
+            self.writer.submit(insert_login_attempt, username, ip_address, successful)
+        else:
+            insert_login_attempt(cursor, username, ip_address, successful)
+
+    def recent_login_attempts(self, seconds):
+        """[(username, ip_address, successful, Unix time)] of the attempts in the last `seconds`, oldest first"""
+        since = fmt_timestamp(datetime.now(timezone.utc) - timedelta(seconds=seconds))
+        conn = self.pool.acquire()
+        try:
+            return conn.execute(
+                "SELECT username, ip_address, successful, CAST(strftime('%s', attempt_time) AS INTEGER) "
+                "FROM login_attempts WHERE attempt_time >= ? ORDER BY attempt_time, id",
+                (since,)
+            ).fetchall()
+        finally:
+            self.pool.release(conn)
 
     def create_password_reset(self, email, reset_code, expiry_minutes=30):
         """Create a password reset code for a user"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -254,11 +620,11 @@ class UserDatabase:
             conn.commit()
             return True, "Reset code created"
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def verify_reset_code(self, email, reset_code):
         """Verify a password reset code"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -279,11 +645,11 @@ class UserDatabase:
 
             return True, "Valid reset code"
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def reset_password(self, email, reset_code, new_password):
         """Reset a user's password after verification"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -308,11 +674,24 @@ class UserDatabase:
             conn.commit()
             return True, "Password reset successfully"
         finally:
-            conn.close()
+            self.pool.release(conn)
+
+    def invalidate_codes(self, email):
+        """Make the email's reset and verification codes unusable (after too many wrong guesses).
+        The pending sign-up stays until it is swept, so resend_verification can still revive it."""
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("DELETE FROM password_resets WHERE email = ?", (email.lower(),))
+            cursor.execute("UPDATE pending_users SET expires_at = 0 WHERE email = ?", (email.lower(),))
+            conn.commit()
+        finally:
+            self.pool.release(conn)
 
     def resend_verification(self, email, new_code, expiry_minutes=30):
         """Update verification code for pending user"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -330,11 +709,11 @@ class UserDatabase:
             conn.commit()
             return True, "Verification code updated"
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def get_pending_user_email(self, username_or_email):
         """Get email of pending user by username or email"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -350,71 +729,105 @@ class UserDatabase:
                 return result[0]
             return None
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def email_exists(self, email):
         """Check if email exists in users or pending users"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-
-        try:
-            # Check in active users
-            cursor.execute("SELECT id FROM users WHERE email = ?", (email.lower(),))
-            if cursor.fetchone():
-                return True
-
-            # Check in pending users
-            cursor.execute("SELECT id FROM pending_users WHERE email = ?", (email.lower(),))
-            if cursor.fetchone():
-                return True
-
-            return False
-        finally:
-            conn.close()
+        return self.check_availability(email=email)[1]
 
     def username_exists(self, username):
         """Check if username exists in users or pending users"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
-
+        return self.check_availability(username=username)[0]
+
+    def check_availability(self, username=None, email=None):
+        """(username taken, email taken) across users and pending users, for the sign-up form.
+        A name the Bloom filter has never seen is reported free without touching the database; otherwise
+        one query answers for both. The filter only learns of names other processes add when it is rebuilt,
+        so for up to TAKEN_FILTER_MAX_AGE a name can be reported free when it isn't; add_pending_user
+        checks again inside its transaction before anything is written."""
+        taken_filter = self._taken_filter()
+        if taken_filter is not None:
+            if username is not None and f"u:{username}" not in taken_filter:
+                username = None
+            if email is not None and f"e:{email.lower()}" not in taken_filter:
+                email = None
+            if username is None and email is None:
+                return False, False
+
+        conn = self.pool.acquire()
         try:
-            # Check in active users
-            cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
-            if cursor.fetchone():
-                return True
-
-            # Check in pending users
-            cursor.execute("SELECT id FROM pending_users WHERE username = ?", (username,))
-            if cursor.fetchone():
-                return True
-
-            return False
+            taken = find_taken(conn, username, email)
         finally:
-            conn.close()
-
-    def cleanup_expired_records(self):
-        """Clean up expired password reset codes and pending users"""
-        conn = sqlite3.connect(self.db_file)
-        cursor = conn.cursor()
+            self.pool.release(conn)
+        return "username" in taken, "email" in taken
+
+    def _taken_filter(self):
+        """The current filter, rebuilt when stale. Returns None (ask the database) while the first one
+        is being built; the old filter keeps answering during later rebuilds."""
+        pool = self.pool
+        with pool.taken_filter_lock:
+            taken_filter = pool.taken_filter
+            if not (taken_filter is None or taken_filter.is_full()
+                    or time.monotonic() - pool.taken_filter_built > TAKEN_FILTER_MAX_AGE):
+                return taken_filter
+            if pool.taken_filter_added is not None:
+                # Another thread is rebuilding it
+                return taken_filter
+            pool.taken_filter_added = []
+
+        # Reading every name takes a while on a big table; checks meanwhile don't wait for it
+        try:
+            conn = pool.acquire()
+            try:
+                names = conn.execute(
+                    "SELECT 'u:' || username FROM users UNION ALL SELECT 'u:' || username FROM pending_users "
+                    "UNION ALL SELECT 'e:' || email FROM users UNION ALL SELECT 'e:' || email FROM pending_users"
+                ).fetchall()
+            finally:
+                pool.release(conn)
+            # Room to grow before the next rebuild
+            new_filter = BloomFilter(max(1024, 2 * len(names)))
+            for (name,) in names:
+                new_filter.add(name)
+        except Exception:
+            with pool.taken_filter_lock:
+                pool.taken_filter_added = None
+            raise
+
+        with pool.taken_filter_lock:
+            # Names this process added after the read started may be missing from it
+            for name in pool.taken_filter_added:
+                new_filter.add(name)
+            pool.taken_filter_added = None
+            pool.taken_filter = new_filter
+            pool.taken_filter_built = time.monotonic()
+        return new_filter
+
+    def _mark_taken(self, username=None, email=None):
+        """Keep the filter in step with names this process adds (between rebuilds)"""
+        names = []
+        if username is not None:
+            names.append(f"u:{username}")
+        if email is not None:
+            names.append(f"e:{email.lower()}")
+        with self.pool.taken_filter_lock:
+            if self.pool.taken_filter_added is not None:
+                self.pool.taken_filter_added.extend(names)
+            taken_filter = self.pool.taken_filter
+            if taken_filter is None:
+                return
+            for name in names:
+                taken_filter.add(name)
+
+    def cleanup_expired_records(self, batch_size=None):
+        """Clean up expired password reset codes and pending users; returns {table: rows deleted}"""
+        conn = self.pool.acquire()
 
         try:
             current_time = datetime.now().timestamp()
-
-            # Delete expired password reset codes
-            cursor.execute(
-                "DELETE FROM password_resets WHERE expires_at < ?",
-                (current_time,)
-            )
-
-            # Delete expired pending users
-            cursor.execute(
-                "DELETE FROM pending_users WHERE expires_at < ?",
-                (current_time,)
-            )
-
-            conn.commit()
+            return {table: delete_expired(conn, table, current_time, batch_size) for table in EXPIRING_TABLES}
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     def add_sample_user(self):
         """Add a sample user for testing"""
@@ -425,7 +838,7 @@ class UserDatabase:
 
     def update_username(self, old_username, new_username):
         """Update a user's username"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -450,50 +863,147 @@ class UserDatabase:
             )
 
             conn.commit()
+            self._mark_taken(username=new_username)
             return True, "Username updated successfully"
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
         finally:
-            conn.close()
+            self.pool.release(conn)
 
     # Add this function to SQLL_database.py in the UserDatabase class
 
+    def _apply_rating_change(self, cursor, username, rating_to_add):
+        """One atomic UPDATE; the non-negative rule is part of the WHERE clause, so no row is read first"""
+        cursor.execute(
+            "UPDATE users SET rating = rating + ? WHERE username = ? AND is_active = TRUE AND rating + ? >= 0 "
+            "RETURNING rating",
+            (rating_to_add, username, rating_to_add)
+        )
+        row = cursor.fetchone()
+        if row:
+            return True, f"Rating updated successfully. New rating: {row[0]}"
+
+        # Nothing matched: only now find out which condition failed
+        cursor.execute("SELECT 1 FROM users WHERE username = ? AND is_active = TRUE", (username,))
+        if not cursor.fetchone():
+            return False, "User not found"
+        return False, "Rating cannot go below zero"
+
     def add_rating(self, username, rating_to_add):
         """Add to a user's existing rating"""
-        conn = sqlite3.connect(self.db_file)
+        return self.add_ratings([(username, rating_to_add)])[0]
+
+    def add_ratings(self, changes):
+        """Apply several (username, rating_to_add) changes in one transaction, e.g. both players of a game.
+        Returns one (success, message) per change; a change that fails doesn't block the others."""
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
-            # Check if the username exists and get current rating
-            cursor.execute("SELECT id, rating FROM users WHERE username = ? AND is_active = TRUE", (username,))
-            user = cursor.fetchone()
+            # Take the write lock up front so the whole batch is one short transaction
+            cursor.execute("BEGIN IMMEDIATE")
+            results = [self._apply_rating_change(cursor, username, rating_to_add)
+                       for username, rating_to_add in changes]
+            conn.commit()
+            return results
+        except sqlite3.Error as e:
+            return [(False, f"Database error: {str(e)}")] * len(changes)
+        finally:
+            self.pool.release(conn)
 
-            if not user:
-                return False, "User not found"
+    def update_ratings(self, usernames, compute):
+        """Read the users' ratings, compute(ratings) -> {username: new_rating}, and write the new ratings,
+        all in one transaction so no other rating change can slip in between"""
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
 
-            user_id, current_rating = user
-            new_rating = current_rating + rating_to_add
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            success, result = rate_users(cursor, usernames, compute)
+            if success:
+                conn.commit()
+            return success, result
+        except sqlite3.Error as e:
+            return False, f"Database error: {str(e)}"
+        finally:
+            self.pool.release(conn)
 
-            # Validate that the new rating doesn't go below 0
-            if new_rating < 0:
-                return False, "Rating cannot go below zero"
+    def set_ratings(self, ratings):
+        """Overwrite the ratings of existing users from {username: rating}; returns how many were updated"""
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
 
-            # Update the rating
-            cursor.execute(
+        try:
+            cursor.executemany(
                 "UPDATE users SET rating = ? WHERE username = ?",
-                (new_rating, username)
+                [(rating, username) for username, rating in ratings.items()]
             )
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            self.pool.release(conn)
+
+    def top_players(self, limit, offset=0):
+        """[(username, rating)] of active users, highest rating first (ties by username)"""
+        conn = self.pool.acquire()
+        try:
+            return conn.execute(
+                "SELECT username, rating FROM users WHERE is_active = TRUE "
+                "ORDER BY rating DESC, username LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        finally:
+            self.pool.release(conn)
+
+    def add_games(self, games):
+        """Insert finished games in one transaction. Each game is a dict with white, black, result,
+        termination, time_control, moves (chess.Move or UCI strings), started_at and ended_at (datetimes;
+        a missing ended_at means now)"""
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
 
+        try:
+            count = insert_games(cursor, games)
             conn.commit()
-            return True, f"Rating updated successfully. New rating: {new_rating}"
-        except sqlite3.Error as e:
-            return False, f"Database error: {str(e)}"
+            return count
         finally:
-            conn.close()
+            self.pool.release(conn)
+
+    def iter_games(self, player=None, since=None, batch_size=500):
+        """Yield stored games oldest first as dicts (moves as a list of UCI strings),
+        optionally only those of one player and/or ended at or after `since` (a datetime)"""
+        conditions, params = [], []
+        if player is not None:
+            conditions.append("(white = ? OR black = ?)")
+            params += [player, player]
+        if since is not None:
+            conditions.append("ended_at >= ?")
+            params.append(fmt_timestamp(since))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+        conn = self.pool.acquire()
+        try:
+            cursor = conn.execute(
+                f"""SELECT id, white, black, result, termination, time_control, move_data AS moves,
+                           started_at, ended_at
+                    FROM games {where} ORDER BY id""",
+                params
+            )
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    game = dict(zip(columns, row))
+                    game["moves"] = [move.uci() for move in decode_moves(game["moves"])]
+                    yield game
+        finally:
+            self.pool.release(conn)
 
     def get_rating(self, username):
         """Get a user's current rating"""
-        conn = sqlite3.connect(self.db_file)
+        conn = self.pool.acquire()
         cursor = conn.cursor()
 
         try:
@@ -509,7 +1019,7 @@ class UserDatabase:
         except sqlite3.Error as e:
             return False, f"Database error: {str(e)}"
         finally:
-            conn.close()
+            self.pool.release(conn)
 
 
 # Example usage
@@ -0,0 +1,233 @@
+import queue
+import threading
+from concurrent.futures import Future
+import chess
+import engine_locator
+from stockfish_pool import get_pool
+from evaluation_cache import EvaluationCache
+
+DEFAULT_WORKERS = 2
+DEFAULT_CACHE_SIZE = 2048
+DEFAULT_MOVETIME_MS = 500
+# Positions waiting for an engine; beyond this new requests are turned away instead of queued
+DEFAULT_MAX_QUEUE = 32
+# Analyses one client may have queued or running at once
+DEFAULT_MAX_PER_CLIENT = 2
+# Stockfish level used for analysis (full strength, see stockfish_pool.difficulty_profile)
+ANALYSIS_LEVEL = 20
+
+
+def position_key(board):
+    """Cache key: the position without move counters, which don't change the analysis"""
+    return board.epd()
+
+
+class StockfishAnalyzer:
+    """One pooled Stockfish process owned by a single analysis worker"""
+    name = "stockfish"
+
+    def __init__(self, path):
+        self.pool = get_pool(path)
+        self.engine = self.pool.acquire(ANALYSIS_LEVEL)
+
+    def analyze(self, board, movetime_ms):
+        self.engine.set_fen_position(board.fen())
+        self.engine._put(f"go movetime {movetime_ms}")
+
+        result = {"bestmove": None, "score": None, "mate": None, "pv": [], "depth": 0}
+        while True:
+            line = self.engine._read_line()
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == "bestmove":
+                if parts[1] != "(none)":
+                    result["bestmove"] = parts[1]
+                return result
+            if parts[0] == "info" and "score" in parts and "pv" in parts:
+                # Stockfish scores are from the side to move
+                score_index = parts.index("score")
+                kind, value = parts[score_index + 1], int(parts[score_index + 2])
+                result["score"], result["mate"] = (value, None) if kind == "cp" else (None, value)
+                result["depth"] = int(parts[parts.index("depth") + 1])
+                result["pv"] = parts[parts.index("pv") + 1:]
+
+    def close(self):
+        self.pool.release(self.engine)
+
+
+class ChessBotAnalyzer:
+    """Fallback when no Stockfish binary is available"""
+    name = "chess_bot"
+
+    def __init__(self):
+        from chess_bot import ChessBot
+        self.bot = ChessBot()
+        self.last_entry = None
+        self.bot.info_callback = self.record
+
+    def record(self, entry):
+        if entry['completed']:
+            self.last_entry = entry
+
+    def analyze(self, board, movetime_ms):
+        self.last_entry = None
+        self.bot.time_limit = movetime_ms / 1000.0
+        self.bot.stop_requested = False
+        move, _ = self.bot.iterative_deepening(board, 64)
+
+        result = {"bestmove": move.uci() if move else None, "score": None, "mate": None, "pv": [], "depth": 0}
+        if self.last_entry is not None:
+            score = self.last_entry['eval']
+            # ChessBot scores are from White's side; report them for the side to move like Stockfish
+            if board.turn == chess.BLACK:
+                score = -score
+            if score not in (float('inf'), float('-inf')):
+                result["score"] = int(score)
+            result["depth"] = self.last_entry['depth']
+            result["pv"] = [m.uci() for m in self.last_entry.get('pv', [])]
+        return result
+
+    def close(self):
+        pass
+
+
+def make_analyzer():
+    path = engine_locator.find_stockfish()
+    if path is not None:
+        try:
+            return StockfishAnalyzer(path)
+        except Exception as e:
+            print(f"Analysis: could not start Stockfish ({e}), using the chess bot")
+            engine_locator.report_failure(path)
+    return ChessBotAnalyzer()
+
+
+class AnalysisService:
+    """Analyses positions on a fixed number of engines shared by every client"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, cache_size=DEFAULT_CACHE_SIZE, movetime_ms=DEFAULT_MOVETIME_MS,
+                 max_queue=DEFAULT_MAX_QUEUE, max_per_client=DEFAULT_MAX_PER_CLIENT, analyzer_factory=make_analyzer):
+        self.movetime_ms = movetime_ms
+        self.cache = EvaluationCache(max_size=cache_size)
+        self.profile = ("analysis", movetime_ms)
+        # key -> Future of the analysis that is queued or running, shared by identical requests
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.max_per_client = max_per_client
+        # client -> number of its analyses that are queued or running
+        self.in_flight = {}
+        self.counters = {"requests": 0, "coalesced": 0, "analyzed": 0, "rejected": 0}
+        self.running = True
+        self.threads = [threading.Thread(target=self.worker, args=(analyzer_factory,), daemon=True)
+                        for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, fen, client=None):
+        """Future with the analysis of fen; raises ValueError for an invalid FEN and RuntimeError
+        when client already has max_per_client analyses pending or the queue is full"""
+        board = chess.Board(fen)
+        if not board.is_valid():
+            raise ValueError(f"Invalid position: {fen}")
+        key = position_key(board)
+
+        with self.lock:
+            if not self.running:
+                raise RuntimeError("Analysis service is shut down")
+            self.counters["requests"] += 1
+            cached = self.cache.get(fen, self.profile)
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+                return future
+            if client is not None and self.in_flight.get(client, 0) >= self.max_per_client:
+                self.counters["rejected"] += 1
+                raise RuntimeError("Too many analysis requests; wait for the last ones to finish")
+            if key in self.pending:
+                self.counters["coalesced"] += 1
+                future = self.pending[key]
+            else:
+                future = Future()
+                try:
+                    self.jobs.put_nowait((key, board, future))
+                except queue.Full:
+                    self.counters["rejected"] += 1
+                    raise RuntimeError("The analysis engines are busy; try again in a moment")
+                self.pending[key] = future
+            if client is not None:
+                self.in_flight[client] = self.in_flight.get(client, 0) + 1
+
+        if client is not None:
+            # Outside the lock: a future that is already done runs the callback right here
+            future.add_done_callback(lambda f: self._release(client))
+        return future
+
+    def _release(self, client):
+        with self.lock:
+            count = self.in_flight.pop(client, 0) - 1
+            if count > 0:
+                self.in_flight[client] = count
+
+    def analyze(self, fen, callback, client=None):
+        """Call callback(result, error) once fen has been analysed"""
+        try:
+            future = self.submit(fen, client)
+        except Exception as e:
+            callback(None, e)
+            return
+
+        def done(f):
+            error = f.exception()
+            callback(None if error else f.result(), error)
+
+        future.add_done_callback(done)
+
+    def worker(self, analyzer_factory):
+        analyzer = None
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            key, board, future = job
+            try:
+                if analyzer is None:
+                    analyzer = analyzer_factory()
+                result = analyzer.analyze(board, self.movetime_ms)
+                result.update({"fen": board.fen(), "engine": analyzer.name})
+            except Exception as e:
+                with self.lock:
+                    self.pending.pop(key, None)
+                future.set_exception(e)
+                # The engine may be in an unknown state; start a fresh one for the next job
+                if analyzer is not None:
+                    analyzer.close()
+                    analyzer = None
+                continue
+
+            with self.lock:
+                self.pending.pop(key, None)
+                self.counters["analyzed"] += 1
+                self.cache.put(result["fen"], result, self.profile)
+            future.set_result(result)
+
+        if analyzer is not None:
+            analyzer.close()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats["cache"] = self.cache.stats()
+        return stats
+
+    def shutdown(self):
+        with self.lock:
+            if not self.running:
+                return
+            self.running = False
+        for _ in self.threads:
+            # Blocks while the queue is full; the workers keep draining it
+            self.jobs.put(None)
+        for thread in self.threads:
+            thread.join()
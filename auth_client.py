@@ -0,0 +1,157 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from socket import socket, AF_INET, SOCK_STREAM
+
+BUFSIZ = 1024
+TIMEOUT = 15.0
+
+# The signed-in client's connection to the server, set by SignInApp (see connect)
+accounts = None
+
+
+def connect(host, port):
+    """Point the module-level accounts at a server, replacing any previous one"""
+    global accounts
+    if accounts is not None:
+        if (accounts.host, accounts.port) == (host, port):
+            return accounts
+        accounts.close()
+    accounts = RemoteUserDatabase(host, port)
+    return accounts
+
+
+class RemoteUserDatabase:
+    """The account part of UserDatabase, answered by the server's AuthService over one socket.
+    Methods return the same (success, result) pairs; network failures come back as (False, message)."""
+
+    def __init__(self, host, port, timeout=TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = ""
+        self.lock = threading.Lock()
+        self.token = None
+        self.username = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def _connect(self):
+        sock = socket(AF_INET, SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect((self.host, self.port))
+        self.sock = sock
+        self.buffer = ""
+
+    def _exchange(self, line):
+        if self.sock is None:
+            self._connect()
+        self.sock.sendall(bytes(line, "utf8"))
+        while "\n" not in self.buffer:
+            data = self.sock.recv(BUFSIZ)
+            if not data:
+                raise ConnectionError("Server closed the connection")
+            self.buffer += data.decode("utf8")
+        reply, self.buffer = self.buffer.split("\n", 1)
+        return reply
+
+    def _call(self, op, **args):
+        request = {"op": op, "args": args}
+        if self.token:
+            request["token"] = self.token
+        line = "{auth}" + json.dumps(request) + "\n"
+
+        with self.lock:
+            try:
+                reused = self.sock is not None
+                try:
+                    reply = self._exchange(line)
+                except (ConnectionError, OSError):
+                    if not reused:
+                        raise
+                    # The server (or a NAT in between) may have dropped the idle connection; try a fresh one
+                    self.close_socket()
+                    reply = self._exchange(line)
+            except (ConnectionError, OSError) as e:
+                self.close_socket()
+                return False, f"Cannot reach the server at {self.host}:{self.port} ({e})"
+
+        if not reply.startswith("{auth}"):
+            return False, f"Unexpected reply from the server: {reply[:80]}"
+        reply = json.loads(reply[len("{auth}"):])
+        return reply["success"], reply["result"]
+
+    def submit(self, method_name, *args, **kwargs):
+        """Run a method off the calling thread; returns a concurrent.futures.Future (see UserDatabase.submit)"""
+        return self.executor.submit(getattr(self, method_name), *args, **kwargs)
+
+    def authenticate_user(self, username_or_email, password):
+        success, result = self._call("sign_in", username_or_email=username_or_email, password=password)
+        if success:
+            self.token = result["token"]
+            self.username = result["username"]
+        return success, result
+
+    def sign_out(self):
+        if self.token:
+            self._call("sign_out", token=self.token)
+        self.token = None
+        self.username = None
+
+    def check_availability(self, username=None, email=None):
+        success, result = self._call("check_availability", username=username, email=email)
+        if not success:
+            # Not knowing is not the same as free
+            raise RuntimeError(result)
+        return tuple(result)
+
+    def email_exists(self, email):
+        return self.check_availability(email=email)[1]
+
+    def username_exists(self, username):
+        return self.check_availability(username=username)[0]
+
+    def sign_up(self, username, email, password):
+        """Registers a pending user; the server mails the verification code"""
+        return self._call("sign_up", username=username, email=email, password=password)
+
+    def resend_verification(self, email):
+        return self._call("resend_verification", email=email)
+
+    def verify_user(self, email, verification_code):
+        return self._call("verify_user", email=email, code=verification_code)
+
+    def request_password_reset(self, email):
+        """The server mails a reset code if the email is registered"""
+        return self._call("request_password_reset", email=email)
+
+    def verify_reset_code(self, email, reset_code):
+        return self._call("verify_reset_code", email=email, code=reset_code)
+
+    def reset_password(self, email, reset_code, new_password):
+        return self._call("reset_password", email=email, code=reset_code, new_password=new_password)
+
+    def get_rating(self, username):
+        return self._call("get_rating", username=username)
+
+    def update_username(self, old_username, new_username):
+        """Only the signed-in user can be renamed, so old_username must be theirs"""
+        if old_username != self.username:
+            return False, "You can only change your own username"
+        success, message = self._call("update_username", new_username=new_username)
+        if success:
+            self.username = new_username
+        return success, message
+
+    def close_socket(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def close(self):
+        with self.lock:
+            self.close_socket()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,258 @@
+import secrets
+import threading
+import time
+from SQLL_database import UserDatabase
+from rate_limiter import LoginRateLimiter, SlidingWindowCounter
+
+SESSION_TTL = 12 * 3600.0
+CODE_EXPIRY_MINUTES = 30
+
+# All limits below are per THROTTLE_WINDOW seconds
+THROTTLE_WINDOW = 900.0
+# Wrong codes per email before its code is invalidated; a new code has to be requested
+MAX_CODE_FAILURES = 5
+# Code checks per address, right or wrong
+MAX_IP_CODE_ATTEMPTS = 30
+# Availability checks, sign-ups and code requests per address (each tells whether a name or email is in use)
+MAX_IP_LOOKUPS = 60
+# Mails a single address can have sent, and mails a single mailbox can receive
+MAX_IP_MAILS = 10
+MAX_EMAIL_MAILS = 3
+
+
+def new_code():
+    """Six-digit verification code"""
+    return str(100000 + secrets.randbelow(900000))
+
+
+class SessionStore:
+    """Session tokens issued at sign-in; a token stands for the username until it expires or is revoked"""
+
+    def __init__(self, ttl=SESSION_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.sessions = {}  # token -> [username, expires at]
+        self.lock = threading.Lock()
+
+    def issue(self, username):
+        token = secrets.token_urlsafe(32)
+        with self.lock:
+            self.prune()
+            self.sessions[token] = [username, self.clock() + self.ttl]
+        return token
+
+    def lookup(self, token):
+        """Username of a live session, or None"""
+        with self.lock:
+            session = self.sessions.get(token)
+            if session is None:
+                return None
+            if session[1] < self.clock():
+                del self.sessions[token]
+                return None
+            return session[0]
+
+    def revoke(self, token):
+        with self.lock:
+            self.sessions.pop(token, None)
+
+    def rename(self, old_username, new_username):
+        with self.lock:
+            for session in self.sessions.values():
+                if session[0] == old_username:
+                    session[0] = new_username
+
+    def prune(self):
+        now = self.clock()
+        for token in [token for token, session in self.sessions.items() if session[1] < now]:
+            del self.sessions[token]
+
+
+class AuthService:
+    """Account operations for clients, answered by the server so only the server opens user_data.db.
+
+    A request is {"op": name, "args": {...}}; the reply is {"success": bool, "result": ...} with the same
+    values UserDatabase returns. Verification and reset codes are made and mailed here, never sent to clients.
+    """
+
+    # Operations a client may call, and whether they need a session token
+    OPERATIONS = {
+        "sign_in": False, "sign_out": False, "check_availability": False, "sign_up": False,
+        "resend_verification": False, "verify_user": False, "request_password_reset": False,
+        "verify_reset_code": False, "reset_password": False, "get_rating": False, "update_username": True,
+    }
+
+    def __init__(self, db=None, outbox=None, sessions=None, leaderboard=None, window=THROTTLE_WINDOW):
+        self.db = db or UserDatabase()
+        self.outbox = outbox
+        self.sessions = sessions or SessionStore()
+        self.leaderboard = leaderboard
+        # Codes are 6 digits, so guessing is only hopeless while wrong guesses are this limited
+        self.code_attempts = LoginRateLimiter(window, MAX_CODE_FAILURES, MAX_IP_CODE_ATTEMPTS)
+        self.lookups = SlidingWindowCounter(window)
+        self.mail_senders = SlidingWindowCounter(window)
+        self.mail_recipients = SlidingWindowCounter(window)
+        self.throttle_lock = threading.Lock()
+        self.counters = {"requests": 0, "errors": 0, "throttled": 0}
+
+    def handle(self, request, ip_address=None):
+        """Reply dict for one request dict"""
+        self.counters["requests"] += 1
+        op = request.get("op")
+        args = request.get("args") or {}
+        if not isinstance(args, dict):
+            return {"success": False, "result": "Bad request"}
+        if op not in self.OPERATIONS:
+            return {"success": False, "result": f"Unknown operation '{op}'"}
+
+        if self.OPERATIONS[op]:
+            username = self.sessions.lookup(request.get("token"))
+            if username is None:
+                return {"success": False, "result": "Please sign in again"}
+            args["session_user"] = username
+
+        try:
+            success, result = getattr(self, op)(ip_address=ip_address, **args)
+        except TypeError as e:
+            return {"success": False, "result": f"Bad arguments for {op}: {e}"}
+        except Exception as e:
+            self.counters["errors"] += 1
+            print(f"Auth {op} failed: {e}")
+            return {"success": False, "result": "Server error"}
+        return {"success": success, "result": result}
+
+    def _throttle(self, ip_address, mail_to=None):
+        """Seconds to wait before ip_address may make another lookup (that mails mail_to), or 0.
+        An allowed request is counted against every limit it is under."""
+        now = time.time()
+        with self.throttle_lock:
+            waits = []
+            if ip_address:
+                waits.append(self.lookups.retry_after(ip_address, MAX_IP_LOOKUPS, now))
+                if mail_to:
+                    waits.append(self.mail_senders.retry_after(ip_address, MAX_IP_MAILS, now))
+            if mail_to:
+                waits.append(self.mail_recipients.retry_after(mail_to.lower(), MAX_EMAIL_MAILS, now))
+            wait = max(waits, default=0.0)
+            if wait:
+                self.counters["throttled"] += 1
+                return wait
+            if ip_address:
+                self.lookups.add(ip_address, now)
+                if mail_to:
+                    self.mail_senders.add(ip_address, now)
+            if mail_to:
+                self.mail_recipients.add(mail_to.lower(), now)
+            return 0.0
+
+    def _check_code(self, kind, email, ip_address, check):
+        """Run check() -> (success, message) for a code guess, within the wrong-code limits"""
+        key = f"{kind}:{email.strip().lower()}"
+        wait = self.code_attempts.check(key, ip_address)
+        if wait:
+            self.counters["throttled"] += 1
+            return False, f"Too many attempts. Try again in {int(wait) + 1} seconds."
+        success, message = check()
+        self.code_attempts.record(key, ip_address, success)
+        if not success and self.code_attempts.failures(key) >= MAX_CODE_FAILURES:
+            self.db.invalidate_codes(email)
+            message = "Too many wrong codes. Please request a new one."
+        return success, message
+
+    def _new_code_issued(self, kind, email):
+        # A fresh code gets a fresh set of guesses
+        self.code_attempts.record(f"{kind}:{email.strip().lower()}", None, True)
+
+    def _mail(self, email, code, purpose):
+        if self.outbox is None:
+            print(f"No outbox: {purpose} code for {email} is {code}")
+            return
+        self.outbox.send(email, f"{purpose} Code", f"Your {purpose.lower()} code is: {code}")
+
+    # ---- operations (each returns (success, result)) ----
+
+    def sign_in(self, username_or_email, password, ip_address=None):
+        # Password hashing runs on the database worker pool, so concurrent sign-ins can't use more cores than it has
+        success, result = self.db.submit("authenticate_user", username_or_email, password, ip_address).result()
+        if not success:
+            return False, result
+        result["token"] = self.sessions.issue(result["username"])
+        return True, result
+
+    def sign_out(self, token, ip_address=None):
+        self.sessions.revoke(token)
+        return True, "Signed out"
+
+    def check_availability(self, username=None, email=None, ip_address=None):
+        wait = self._throttle(ip_address)
+        if wait:
+            return False, f"Too many requests. Try again in {int(wait) + 1} seconds."
+        return True, self.db.check_availability(username, email)
+
+    def sign_up(self, username, email, password, ip_address=None):
+        wait = self._throttle(ip_address, email)
+        if wait:
+            return False, f"Too many requests. Try again in {int(wait) + 1} seconds."
+        username_taken, email_taken = self.db.check_availability(username, email)
+        if email_taken:
+            return False, "Email already exists"
+        if username_taken:
+            return False, "Username already exists"
+        if len(password) < 8:
+            return False, "Password must be at least 8 characters long"
+
+        code = new_code()
+        if not self.db.submit("add_pending_user", username, email, password, code, CODE_EXPIRY_MINUTES).result():
+            # Someone claimed one of the names since the availability check
+            return False, "Username or email already exists"
+        self._new_code_issued("verify", email)
+        self._mail(email, code, "Account Verification")
+        return True, "A verification code is on its way to your email"
+
+    def resend_verification(self, email, ip_address=None):
+        wait = self._throttle(ip_address, email)
+        if wait:
+            return False, f"Too many requests. Try again in {int(wait) + 1} seconds."
+        code = new_code()
+        success, message = self.db.resend_verification(email, code, CODE_EXPIRY_MINUTES)
+        if success:
+            self._new_code_issued("verify", email)
+            self._mail(email, code, "Account Verification")
+        return success, message
+
+    def verify_user(self, email, code, ip_address=None):
+        return self._check_code("verify", email, ip_address, lambda: self.db.verify_user(email, code))
+
+    def request_password_reset(self, email, ip_address=None):
+        wait = self._throttle(ip_address, email)
+        if wait:
+            return False, f"Too many requests. Try again in {int(wait) + 1} seconds."
+        if not self.db.email_exists(email):
+            return False, "Email not found in our records"
+        code = new_code()
+        success, message = self.db.create_password_reset(email, code, CODE_EXPIRY_MINUTES)
+        if success:
+            self._new_code_issued("reset", email)
+            self._mail(email, code, "Password Reset")
+            message = "A verification code is on its way to your email"
+        return success, message
+
+    def verify_reset_code(self, email, code, ip_address=None):
+        return self._check_code("reset", email, ip_address, lambda: self.db.verify_reset_code(email, code))
+
+    def reset_password(self, email, code, new_password, ip_address=None):
+        # The code is checked again here, so it counts as another guess
+        return self._check_code("reset", email, ip_address,
+                                lambda: self.db.submit("reset_password", email, code, new_password).result())
+
+    def get_rating(self, username, ip_address=None):
+        # From the database: the leaderboard is only refreshed every few minutes and lags behind it
+        return self.db.get_rating(username)
+
+    def update_username(self, new_username, session_user, ip_address=None):
+        success, message = self.db.update_username(session_user, new_username)
+        if success:
+            self.sessions.rename(session_user, new_username)
+            if self.leaderboard is not None:
+                self.leaderboard.rename(session_user, new_username)
+        return success, message
@@ -0,0 +1,681 @@
+import random
+import chess
+
+# Lightweight position used only inside the bot search. Bitboards are plain ints
+# (bit 0 = a1, bit 63 = h8), moves are ints and make/unmake keep a flat undo stack
+# instead of python-chess move/_BoardState objects. Convert to and from chess.Board
+# at the root with Position.from_board / to_board / to_chess_move.
+
+WHITE = 0
+BLACK = 1
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+EMPTY = -1
+
+# Move encoding: from | to << 6 | promotion (python-chess piece type) << 12 | flags << 15
+FLAG_EN_PASSANT = 1
+FLAG_CASTLING = 2
+FLAG_DOUBLE_PUSH = 4
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+FULL_BOARD = (1 << 64) - 1
+FILE_A = 0x0101010101010101
+FILE_H = FILE_A << 7
+RANK_1 = 0xFF
+RANK_8 = RANK_1 << 56
+DARK_SQUARES = 0xAA55AA55AA55AA55
+LIGHT_SQUARES = FULL_BOARD ^ DARK_SQUARES
+
+
+def _step_targets(square, steps):
+    """Bitboard of squares reachable by single (file, rank) steps that stay on the board"""
+    file, rank = square & 7, square >> 3
+    result = 0
+    for df, dr in steps:
+        f, r = file + df, rank + dr
+        if 0 <= f < 8 and 0 <= r < 8:
+            result |= 1 << (r * 8 + f)
+    return result
+
+
+def _ray(square, df, dr):
+    """Squares from square (exclusive) to the board edge in one direction"""
+    file, rank = square & 7, square >> 3
+    result = 0
+    f, r = file + df, rank + dr
+    while 0 <= f < 8 and 0 <= r < 8:
+        result |= 1 << (r * 8 + f)
+        f, r = f + df, r + dr
+    return result
+
+
+def _slide(square, occupied, directions):
+    """Reference slider attacks by walking rays, used to fill the lookup tables"""
+    file, rank = square & 7, square >> 3
+    result = 0
+    for df, dr in directions:
+        f, r = file + df, rank + dr
+        while 0 <= f < 8 and 0 <= r < 8:
+            bit = 1 << (r * 8 + f)
+            result |= bit
+            if occupied & bit:
+                break
+            f, r = f + df, r + dr
+    return result
+
+
+def _subsets(mask):
+    """Every subset of mask (Carry-Rippler enumeration)"""
+    subset = 0
+    while True:
+        yield subset
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return
+
+
+def _line_table(square, directions):
+    """(relevant mask, {masked occupancy: attacks}) for one line through square"""
+    mask = 0
+    for df, dr in directions:
+        ray = _ray(square, df, dr)
+        # The last square of a ray is attacked whether or not it is occupied
+        if ray:
+            last = ray.bit_length() - 1 if (dr > 0 or (dr == 0 and df > 0)) else (ray & -ray).bit_length() - 1
+            ray &= ~(1 << last)
+        mask |= ray
+    return mask, {occ: _slide(square, occ, directions) for occ in _subsets(mask)}
+
+
+KNIGHT_ATTACKS = [_step_targets(sq, [(1, 2), (2, 1), (2, -1), (1, -2), (-1, -2), (-2, -1), (-2, 1), (-1, 2)])
+                  for sq in range(64)]
+KING_ATTACKS = [_step_targets(sq, [(1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0), (-1, -1), (0, -1), (1, -1)])
+                for sq in range(64)]
+# PAWN_ATTACKS[color][square]: squares attacked by a pawn of that color standing on square
+PAWN_ATTACKS = [[_step_targets(sq, [(-1, 1), (1, 1)]) for sq in range(64)],
+                [_step_targets(sq, [(-1, -1), (1, -1)]) for sq in range(64)]]
+
+# Slider attacks are two dict lookups per piece: one per line through the square
+ROOK_LINES = [_line_table(sq, [(1, 0), (-1, 0)]) + _line_table(sq, [(0, 1), (0, -1)]) for sq in range(64)]
+BISHOP_LINES = [_line_table(sq, [(1, 1), (-1, -1)]) + _line_table(sq, [(-1, 1), (1, -1)]) for sq in range(64)]
+ROOK_EMPTY = [_slide(sq, 0, [(1, 0), (-1, 0), (0, 1), (0, -1)]) for sq in range(64)]
+BISHOP_EMPTY = [_slide(sq, 0, [(1, 1), (-1, -1), (-1, 1), (1, -1)]) for sq in range(64)]
+
+
+def rook_attacks(square, occupied):
+    mask_a, table_a, mask_b, table_b = ROOK_LINES[square]
+    return table_a[occupied & mask_a] | table_b[occupied & mask_b]
+
+
+def bishop_attacks(square, occupied):
+    mask_a, table_a, mask_b, table_b = BISHOP_LINES[square]
+    return table_a[occupied & mask_a] | table_b[occupied & mask_b]
+
+
+def _between_and_line():
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for a in range(64):
+        for b in range(64):
+            if a == b:
+                continue
+            bit_b = 1 << b
+            if ROOK_EMPTY[a] & bit_b:
+                between[a][b] = rook_attacks(a, bit_b) & rook_attacks(b, 1 << a)
+                line[a][b] = (ROOK_EMPTY[a] & ROOK_EMPTY[b]) | (1 << a) | bit_b
+            elif BISHOP_EMPTY[a] & bit_b:
+                between[a][b] = bishop_attacks(a, bit_b) & bishop_attacks(b, 1 << a)
+                line[a][b] = (BISHOP_EMPTY[a] & BISHOP_EMPTY[b]) | (1 << a) | bit_b
+    return between, line
+
+
+# BETWEEN[a][b]: squares strictly between two aligned squares; LINE[a][b]: the full line through both
+BETWEEN, LINE = _between_and_line()
+
+# Castling rights that survive a move touching a given square
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[chess.E1] = 15 ^ (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[chess.H1] = 15 ^ WHITE_KINGSIDE
+CASTLING_MASK[chess.A1] = 15 ^ WHITE_QUEENSIDE
+CASTLING_MASK[chess.E8] = 15 ^ (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[chess.H8] = 15 ^ BLACK_KINGSIDE
+CASTLING_MASK[chess.A8] = 15 ^ BLACK_QUEENSIDE
+
+# Zobrist keys, seeded so hashes are stable between runs
+_rng = random.Random(20240613)
+ZOBRIST_PIECES = [[_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+ZOBRIST_CASTLING = [_rng.getrandbits(64) for _ in range(16)]
+ZOBRIST_EP = [_rng.getrandbits(64) for _ in range(8)]
+ZOBRIST_BLACK_TO_MOVE = _rng.getrandbits(64)
+
+PROMOTION_TYPES = (chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT)
+
+
+def lsb(bb):
+    return (bb & -bb).bit_length() - 1
+
+
+def popcount(bb):
+    return bin(bb).count('1')
+
+
+def encode_move(from_square, to_square, promotion=0, flags=0):
+    return from_square | (to_square << 6) | (promotion << 12) | (flags << 15)
+
+
+def move_from_square(move):
+    return move & 63
+
+
+def move_to_square(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    """Promotion as a python-chess piece type, or 0"""
+    return (move >> 12) & 7
+
+
+class Position:
+    def __init__(self):
+        # bb[color * 6 + piece_type]
+        self.bb = [0] * 12
+        self.occ = [0, 0]
+        self.squares = [EMPTY] * 64
+        self.turn = WHITE
+        self.castling = 0
+        self.ep_square = -1
+        self.halfmove_clock = 0
+        self.hash = 0
+        # (move, captured, castling, ep_square, halfmove_clock, hash) per made move
+        self.undo_stack = []
+        # Hashes of earlier positions, for repetition detection
+        self.hash_history = []
+
+    @classmethod
+    def from_board(cls, board):
+        """Build a position from a chess.Board (standard chess only)"""
+        pos = cls()
+        for square, piece in board.piece_map().items():
+            pos._put_piece(piece.piece_type - 1 + (0 if piece.color == chess.WHITE else 6), square)
+
+        pos.turn = WHITE if board.turn == chess.WHITE else BLACK
+        if board.has_kingside_castling_rights(chess.WHITE):
+            pos.castling |= WHITE_KINGSIDE
+        if board.has_queenside_castling_rights(chess.WHITE):
+            pos.castling |= WHITE_QUEENSIDE
+        if board.has_kingside_castling_rights(chess.BLACK):
+            pos.castling |= BLACK_KINGSIDE
+        if board.has_queenside_castling_rights(chess.BLACK):
+            pos.castling |= BLACK_QUEENSIDE
+        pos.ep_square = board.ep_square if board.ep_square is not None else -1
+        pos.halfmove_clock = board.halfmove_clock
+        pos.hash = pos.compute_hash()
+
+        # Replay the reversible part of the game so repetitions are still seen
+        if board.move_stack and board.halfmove_clock:
+            previous = board.copy(stack=min(board.halfmove_clock, len(board.move_stack)))
+            history = []
+            while previous.move_stack:
+                previous.pop()
+                history.append(cls.from_board(chess.Board(previous.fen())).hash)
+            pos.hash_history = history[::-1]
+        return pos
+
+    def to_board(self):
+        return chess.Board(self.fen())
+
+    def fen(self):
+        rows = []
+        for rank in range(7, -1, -1):
+            row = ""
+            empty = 0
+            for file in range(8):
+                code = self.squares[rank * 8 + file]
+                if code == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                symbol = "pnbrqk"[code % 6]
+                row += symbol.upper() if code < 6 else symbol
+            if empty:
+                row += str(empty)
+            rows.append(row)
+
+        castling = "".join(flag for bit, flag in ((WHITE_KINGSIDE, "K"), (WHITE_QUEENSIDE, "Q"),
+                                                  (BLACK_KINGSIDE, "k"), (BLACK_QUEENSIDE, "q"))
+                           if self.castling & bit) or "-"
+        ep = chess.SQUARE_NAMES[self.ep_square] if self.ep_square != -1 else "-"
+        return f"{'/'.join(rows)} {'w' if self.turn == WHITE else 'b'} {castling} {ep} {self.halfmove_clock} 1"
+
+    def compute_hash(self):
+        h = 0
+        for square, code in enumerate(self.squares):
+            if code != EMPTY:
+                h ^= ZOBRIST_PIECES[code][square]
+        h ^= ZOBRIST_CASTLING[self.castling]
+        if self.ep_square != -1:
+            h ^= ZOBRIST_EP[self.ep_square & 7]
+        if self.turn == BLACK:
+            h ^= ZOBRIST_BLACK_TO_MOVE
+        return h
+
+    def _put_piece(self, code, square):
+        bit = 1 << square
+        self.bb[code] |= bit
+        self.occ[code // 6] |= bit
+        self.squares[square] = code
+
+    # ---- conversions for moves ----
+
+    def to_chess_move(self, move):
+        return chess.Move(move & 63, (move >> 6) & 63, ((move >> 12) & 7) or None)
+
+    def from_chess_move(self, chess_move):
+        """Find the matching legal move, or None"""
+        for move in self.legal_moves():
+            if (move & 63 == chess_move.from_square and (move >> 6) & 63 == chess_move.to_square
+                    and ((move >> 12) & 7) == (chess_move.promotion or 0)):
+                return move
+        return None
+
+    # ---- queries ----
+
+    def piece_type_at(self, square):
+        """Internal piece type (PAWN..KING) on square, or EMPTY"""
+        code = self.squares[square]
+        return code % 6 if code != EMPTY else EMPTY
+
+    def king_square(self, color):
+        return lsb(self.bb[color * 6 + KING])
+
+    def attackers(self, color, square, occupied=None):
+        """Bitboard of pieces of color attacking square"""
+        if occupied is None:
+            occupied = self.occ[0] | self.occ[1]
+        bb = self.bb
+        c = color * 6
+        return ((PAWN_ATTACKS[color ^ 1][square] & bb[c + PAWN])
+                | (KNIGHT_ATTACKS[square] & bb[c + KNIGHT])
+                | (KING_ATTACKS[square] & bb[c + KING])
+                | (bishop_attacks(square, occupied) & (bb[c + BISHOP] | bb[c + QUEEN]))
+                | (rook_attacks(square, occupied) & (bb[c + ROOK] | bb[c + QUEEN])))
+
+    def is_check(self):
+        return bool(self.attackers(self.turn ^ 1, self.king_square(self.turn)))
+
+    def is_capture(self, move):
+        return self.squares[(move >> 6) & 63] != EMPTY or bool((move >> 15) & FLAG_EN_PASSANT)
+
+    def is_castling(self, move):
+        return bool((move >> 15) & FLAG_CASTLING)
+
+    def gives_check(self, move):
+        self.push(move)
+        check = self.is_check()
+        self.pop()
+        return check
+
+    def is_insufficient_material(self):
+        return self._has_insufficient_material(WHITE) and self._has_insufficient_material(BLACK)
+
+    def _has_insufficient_material(self, color):
+        bb = self.bb
+        ours = self.occ[color]
+        if ours & (bb[PAWN] | bb[6 + PAWN] | bb[ROOK] | bb[6 + ROOK] | bb[QUEEN] | bb[6 + QUEEN]):
+            return False
+        if ours & (bb[KNIGHT] | bb[6 + KNIGHT]):
+            kings_and_queens = bb[KING] | bb[6 + KING] | bb[QUEEN] | bb[6 + QUEEN]
+            return popcount(ours) <= 2 and not (self.occ[color ^ 1] & ~kings_and_queens)
+        bishops = bb[BISHOP] | bb[6 + BISHOP]
+        if ours & bishops:
+            same_color = not (bishops & DARK_SQUARES) or not (bishops & LIGHT_SQUARES)
+            return same_color and not (bb[PAWN] | bb[6 + PAWN]) and not (bb[KNIGHT] | bb[6 + KNIGHT])
+        return True
+
+    def is_seventyfive_moves(self):
+        return self.halfmove_clock >= 150
+
+    def is_fivefold_repetition(self):
+        if self.halfmove_clock < 16:
+            return False
+        count = 1
+        history = self.hash_history
+        # Only positions since the last irreversible move can repeat, and only with the same side to move
+        for index in range(len(history) - 2, max(-1, len(history) - 1 - self.halfmove_clock), -2):
+            if history[index] == self.hash:
+                count += 1
+                if count >= 5:
+                    return True
+        return False
+
+    # ---- move generation ----
+
+    def legal_moves(self):
+        """All legal moves for the side to move, as encoded ints"""
+        us = self.turn
+        them = us ^ 1
+        bb = self.bb
+        c = us * 6
+        e = them * 6
+        occ_us = self.occ[us]
+        occ_them = self.occ[them]
+        occupied = occ_us | occ_them
+        king = lsb(bb[c + KING])
+
+        moves = []
+        append = moves.append
+
+        checkers = self.attackers(them, king, occupied)
+
+        # King steps: the king itself must not shield the square it moves along
+        occupied_without_king = occupied ^ (1 << king)
+        targets = KING_ATTACKS[king] & ~occ_us
+        while targets:
+            bit = targets & -targets
+            to = bit.bit_length() - 1
+            targets ^= bit
+            if not self.attackers(them, to, occupied_without_king):
+                append(king | (to << 6))
+
+        if checkers and checkers & (checkers - 1):
+            # Double check: only the king can move
+            return moves
+
+        target_mask = ~occ_us & FULL_BOARD
+        if checkers:
+            checker = lsb(checkers)
+            target_mask &= checkers | BETWEEN[king][checker]
+
+        # Pinned pieces may only move along the line to their king
+        pinned = 0
+        diagonal_sliders = bb[e + BISHOP] | bb[e + QUEEN]
+        straight_sliders = bb[e + ROOK] | bb[e + QUEEN]
+        snipers = (BISHOP_EMPTY[king] & diagonal_sliders) | (ROOK_EMPTY[king] & straight_sliders)
+        while snipers:
+            bit = snipers & -snipers
+            snipers ^= bit
+            blockers = BETWEEN[king][bit.bit_length() - 1] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & occ_us:
+                pinned |= blockers
+        line = LINE[king]
+
+        # Knights (a pinned knight can never move)
+        pieces = bb[c + KNIGHT] & ~pinned
+        while pieces:
+            bit = pieces & -pieces
+            pieces ^= bit
+            frm = bit.bit_length() - 1
+            targets = KNIGHT_ATTACKS[frm] & target_mask
+            while targets:
+                to_bit = targets & -targets
+                targets ^= to_bit
+                append(frm | ((to_bit.bit_length() - 1) << 6))
+
+        # Sliders
+        for piece_type in (BISHOP, ROOK, QUEEN):
+            pieces = bb[c + piece_type]
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                frm = bit.bit_length() - 1
+                if piece_type == BISHOP:
+                    targets = bishop_attacks(frm, occupied)
+                elif piece_type == ROOK:
+                    targets = rook_attacks(frm, occupied)
+                else:
+                    targets = bishop_attacks(frm, occupied) | rook_attacks(frm, occupied)
+                targets &= target_mask
+                if bit & pinned:
+                    targets &= line[frm]
+                while targets:
+                    to_bit = targets & -targets
+                    targets ^= to_bit
+                    append(frm | ((to_bit.bit_length() - 1) << 6))
+
+        # Pawns
+        pawns = bb[c + PAWN]
+        if us == WHITE:
+            forward = 8
+            start_rank = 0xFF00
+            promotion_rank = RANK_8
+        else:
+            forward = -8
+            start_rank = 0xFF << 48
+            promotion_rank = RANK_1
+        pawn_attacks = PAWN_ATTACKS[us]
+        while pawns:
+            bit = pawns & -pawns
+            pawns ^= bit
+            frm = bit.bit_length() - 1
+            allowed = target_mask & line[frm] if bit & pinned else target_mask
+
+            to = frm + forward
+            to_bit = 1 << to
+            if not occupied & to_bit:
+                if to_bit & allowed:
+                    if to_bit & promotion_rank:
+                        for promotion in PROMOTION_TYPES:
+                            append(frm | (to << 6) | (promotion << 12))
+                    else:
+                        append(frm | (to << 6))
+                if bit & start_rank:
+                    double = to + forward
+                    double_bit = 1 << double
+                    if not occupied & double_bit and double_bit & allowed:
+                        append(frm | (double << 6) | (FLAG_DOUBLE_PUSH << 15))
+
+            targets = pawn_attacks[frm] & occ_them & allowed
+            while targets:
+                t_bit = targets & -targets
+                targets ^= t_bit
+                to = t_bit.bit_length() - 1
+                if t_bit & promotion_rank:
+                    for promotion in PROMOTION_TYPES:
+                        append(frm | (to << 6) | (promotion << 12))
+                else:
+                    append(frm | (to << 6))
+
+        # En passant, checked by simulating the capture (rare, and the only move that removes two pieces)
+        ep = self.ep_square
+        if ep != -1 and not occupied & (1 << ep):
+            captured = ep - forward
+            if bb[e + PAWN] & (1 << captured):
+                capturers = PAWN_ATTACKS[them][ep] & bb[c + PAWN]
+                while capturers:
+                    bit = capturers & -capturers
+                    capturers ^= bit
+                    frm = bit.bit_length() - 1
+                    after = (occupied ^ bit ^ (1 << captured)) | (1 << ep)
+                    if (bishop_attacks(king, after) & diagonal_sliders) or \
+                            (rook_attacks(king, after) & straight_sliders):
+                        continue
+                    if (KNIGHT_ATTACKS[king] & bb[e + KNIGHT]) or \
+                            (PAWN_ATTACKS[us][king] & bb[e + PAWN] & ~(1 << captured)):
+                        continue
+                    append(frm | (ep << 6) | (FLAG_EN_PASSANT << 15))
+
+        # Castling (rights are cleared whenever the king or rook moves or the rook is captured)
+        if not checkers and self.castling:
+            if us == WHITE:
+                if self.castling & WHITE_KINGSIDE and not occupied & 0x60 and \
+                        not self.attackers(them, chess.F1, occupied) and not self.attackers(them, chess.G1, occupied):
+                    append(chess.E1 | (chess.G1 << 6) | (FLAG_CASTLING << 15))
+                if self.castling & WHITE_QUEENSIDE and not occupied & 0x0E and \
+                        not self.attackers(them, chess.D1, occupied) and not self.attackers(them, chess.C1, occupied):
+                    append(chess.E1 | (chess.C1 << 6) | (FLAG_CASTLING << 15))
+            else:
+                if self.castling & BLACK_KINGSIDE and not occupied & (0x60 << 56) and \
+                        not self.attackers(them, chess.F8, occupied) and not self.attackers(them, chess.G8, occupied):
+                    append(chess.E8 | (chess.G8 << 6) | (FLAG_CASTLING << 15))
+                if self.castling & BLACK_QUEENSIDE and not occupied & (0x0E << 56) and \
+                        not self.attackers(them, chess.D8, occupied) and not self.attackers(them, chess.C8, occupied):
+                    append(chess.E8 | (chess.C8 << 6) | (FLAG_CASTLING << 15))
+
+        return moves
+
+    def count_moves_for(self, color):
+        """Number of legal moves color would have if it were its turn (used for mobility)"""
+        if color == self.turn:
+            return len(self.legal_moves())
+        turn, ep = self.turn, self.ep_square
+        self.turn, self.ep_square = color, -1
+        try:
+            return len(self.legal_moves())
+        finally:
+            self.turn, self.ep_square = turn, ep
+
+    # ---- make / unmake ----
+
+    def push(self, move):
+        frm = move & 63
+        to = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flags = move >> 15
+
+        bb = self.bb
+        occ = self.occ
+        squares = self.squares
+        us = self.turn
+        code = squares[frm]
+        captured = squares[to]
+        h = self.hash
+
+        self.undo_stack.append((move, captured, self.castling, self.ep_square, self.halfmove_clock, h))
+        self.hash_history.append(h)
+
+        from_bit = 1 << frm
+        to_bit = 1 << to
+
+        if captured != EMPTY:
+            bb[captured] ^= to_bit
+            occ[us ^ 1] ^= to_bit
+            h ^= ZOBRIST_PIECES[captured][to]
+
+        bb[code] ^= from_bit | to_bit
+        occ[us] ^= from_bit | to_bit
+        squares[frm] = EMPTY
+        squares[to] = code
+        h ^= ZOBRIST_PIECES[code][frm] ^ ZOBRIST_PIECES[code][to]
+
+        if promotion:
+            new_code = us * 6 + promotion - 1
+            bb[code] ^= to_bit
+            bb[new_code] |= to_bit
+            squares[to] = new_code
+            h ^= ZOBRIST_PIECES[code][to] ^ ZOBRIST_PIECES[new_code][to]
+
+        if flags & FLAG_EN_PASSANT:
+            captured_square = to - 8 if us == WHITE else to + 8
+            pawn_code = (us ^ 1) * 6 + PAWN
+            cap_bit = 1 << captured_square
+            bb[pawn_code] ^= cap_bit
+            occ[us ^ 1] ^= cap_bit
+            squares[captured_square] = EMPTY
+            h ^= ZOBRIST_PIECES[pawn_code][captured_square]
+        elif flags & FLAG_CASTLING:
+            if to > frm:
+                rook_from, rook_to = to + 1, to - 1
+            else:
+                rook_from, rook_to = to - 2, to + 1
+            rook_code = us * 6 + ROOK
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            bb[rook_code] ^= rook_bits
+            occ[us] ^= rook_bits
+            squares[rook_from] = EMPTY
+            squares[rook_to] = rook_code
+            h ^= ZOBRIST_PIECES[rook_code][rook_from] ^ ZOBRIST_PIECES[rook_code][rook_to]
+
+        if self.ep_square != -1:
+            h ^= ZOBRIST_EP[self.ep_square & 7]
+        if flags & FLAG_DOUBLE_PUSH:
+            self.ep_square = (frm + to) >> 1
+            h ^= ZOBRIST_EP[self.ep_square & 7]
+        else:
+            self.ep_square = -1
+
+        castling = self.castling & CASTLING_MASK[frm] & CASTLING_MASK[to]
+        if castling != self.castling:
+            h ^= ZOBRIST_CASTLING[self.castling] ^ ZOBRIST_CASTLING[castling]
+            self.castling = castling
+
+        if code % 6 == PAWN or captured != EMPTY:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        self.turn = us ^ 1
+        self.hash = h ^ ZOBRIST_BLACK_TO_MOVE
+
+    def pop(self):
+        move, captured, self.castling, self.ep_square, self.halfmove_clock, self.hash = self.undo_stack.pop()
+        self.hash_history.pop()
+
+        frm = move & 63
+        to = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flags = move >> 15
+
+        us = self.turn ^ 1
+        self.turn = us
+        bb = self.bb
+        occ = self.occ
+        squares = self.squares
+
+        from_bit = 1 << frm
+        to_bit = 1 << to
+        code = squares[to]
+
+        if promotion:
+            pawn_code = us * 6 + PAWN
+            bb[code] ^= to_bit
+            bb[pawn_code] |= to_bit
+            code = pawn_code
+
+        bb[code] ^= from_bit | to_bit
+        occ[us] ^= from_bit | to_bit
+        squares[frm] = code
+        squares[to] = captured
+
+        if captured != EMPTY:
+            bb[captured] |= to_bit
+            occ[us ^ 1] |= to_bit
+
+        if flags & FLAG_EN_PASSANT:
+            captured_square = to - 8 if us == WHITE else to + 8
+            pawn_code = (us ^ 1) * 6 + PAWN
+            cap_bit = 1 << captured_square
+            bb[pawn_code] |= cap_bit
+            occ[us ^ 1] |= cap_bit
+            squares[captured_square] = pawn_code
+        elif flags & FLAG_CASTLING:
+            if to > frm:
+                rook_from, rook_to = to + 1, to - 1
+            else:
+                rook_from, rook_to = to - 2, to + 1
+            rook_code = us * 6 + ROOK
+            rook_bits = (1 << rook_from) | (1 << rook_to)
+            bb[rook_code] ^= rook_bits
+            occ[us] ^= rook_bits
+            squares[rook_to] = EMPTY
+            squares[rook_from] = rook_code
+
+
+def perft(pos, depth):
+    """Leaf count using make/unmake on every node, like chess_perft.perft"""
+    if depth == 0:
+        return 1
+
+    nodes = 0
+    for move in pos.legal_moves():
+        pos.push(move)
+        nodes += perft(pos, depth - 1)
+        pos.pop()
+    return nodes
@@ -0,0 +1,44 @@
+import math
+
+DEFAULT_ERROR_RATE = 0.01
+
+
+class BloomFilter:
+    """Set membership with no false negatives and about error_rate false positives while at most
+    `capacity` items have been added. Uses m bits and k hash positions per item, derived from the
+    item's hash by double hashing."""
+
+    def __init__(self, capacity, error_rate=DEFAULT_ERROR_RATE):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Python's string hash is salted per process, which is fine for a filter that only lives in memory
+        h = hash(item) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def __len__(self):
+        return self.count
+
+    def is_full(self):
+        """Past capacity the false positive rate climbs above error_rate; rebuild bigger"""
+        return self.count > self.capacity
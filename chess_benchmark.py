@@ -0,0 +1,185 @@
+import argparse
+import json
+import sys
+import time
+import chess
+from chess_bot import ChessBot
+
+# Tactical test positions (Win At Chess) in EPD format with their best moves
+BENCHMARK_EPDS = [
+    '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - bm Qg6; id "WAC.001";',
+    '8/7p/5k2/5p2/p1p2P2/Pr1pPK2/1P1R3P/8 b - - bm Rxb2; id "WAC.002";',
+    '5rk1/1ppb3p/p1pb4/6q1/3P1p1r/2P1R2P/PP1BQ1P1/5RKN w - - bm Rg3; id "WAC.003";',
+    'r1bq2rk/pp3pbp/2p1p1pQ/7P/3P4/2PB1N2/PP3PPR/2KR4 w - - bm Qxh7+; id "WAC.004";',
+    '5k2/6pp/p1qN4/1p1p4/3P4/2PKP2Q/PP3r2/3R4 b - - bm Qc4+; id "WAC.005";',
+    '7k/p7/1R5K/6r1/6p1/6P1/8/8 w - - bm Rb7; id "WAC.006";',
+    'rnbqkb1r/pppp1ppp/8/4P3/6n1/7P/PPPNPPP1/R1BQKBNR b KQkq - bm Ne3; id "WAC.007";',
+    'r4q1k/p2bR1rp/2p2Q1N/5p2/5p2/2P5/PP3PPP/R5K1 w - - bm Rf7; id "WAC.008";',
+    '3q1rk1/p4pp1/2pb3p/3p4/6Pr/1PNQ4/P1PB1PP1/4RRK1 b - - bm Bh2+; id "WAC.009";',
+    '2br2k1/2q3rn/p2NppQ1/2p1P3/Pp5R/4P3/1P3PPP/3R2K1 w - - bm Rxh7; id "WAC.010";',
+]
+
+
+def load_epd_file(path):
+    """Read EPD lines from a file, skipping blanks and comments"""
+    with open(path, encoding="utf8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def parse_epd(epd, index):
+    """Turn an EPD line into a board plus its id and best/avoid move sets"""
+    board, ops = chess.Board.from_epd(epd)
+    best_moves = ops.get('bm', [])
+    avoid_moves = ops.get('am', [])
+    position_id = ops.get('id', f"pos{index + 1}")
+    return board, position_id, best_moves, avoid_moves
+
+
+def branching_factor(depth_history):
+    """Effective branching factor: geometric mean of node growth between iterations"""
+    # Entries carry the running node total, so each iteration's own count is the difference
+    iteration_nodes = []
+    previous_total = 0
+    for entry in depth_history:
+        iteration_nodes.append(entry['nodes'] - previous_total)
+        previous_total = entry['nodes']
+
+    ratios = []
+    for previous_nodes, nodes in zip(iteration_nodes, iteration_nodes[1:]):
+        if previous_nodes:
+            ratios.append(nodes / previous_nodes)
+
+    if not ratios:
+        return 0.0
+
+    product = 1.0
+    for ratio in ratios:
+        product *= ratio
+    return product ** (1.0 / len(ratios))
+
+
+def run_position(epd, index, depth, time_limit):
+    """Search one position with a fresh bot and collect its statistics"""
+    board, position_id, best_moves, avoid_moves = parse_epd(epd, index)
+
+    bot = ChessBot()
+    bot.time_limit = time_limit
+
+    start = time.perf_counter()
+    move = bot.get_best_move(board, max_depth=depth)
+    elapsed = time.perf_counter() - start
+
+    if best_moves:
+        solved = move in best_moves
+    elif avoid_moves:
+        solved = move not in avoid_moves
+    else:
+        solved = None
+
+    return {
+        'id': position_id,
+        'fen': board.fen(),
+        'move': board.san(move) if move else None,
+        'expected': [board.san(m) for m in best_moves],
+        'solved': solved,
+        'nodes': bot.nodes_searched,
+        'time': elapsed,
+        'nps': bot.nodes_searched / elapsed if elapsed > 0 else 0.0,
+        'depth_reached': max((e['depth'] for e in bot.depth_history if e['completed']), default=0),
+        'time_to_depth': {e['depth']: e['time'] for e in bot.depth_history if e['completed']},
+        'tt_probes': bot.tt.probes,
+        'tt_hits': bot.tt.hits,
+        'tt_hit_rate': bot.tt.hit_rate(),
+        'branching_factor': branching_factor(bot.depth_history),
+    }
+
+
+def run_suite(epds, depth, time_limit, label):
+    """Run every position under one search limit and summarise the totals"""
+    results = [run_position(epd, i, depth, time_limit) for i, epd in enumerate(epds)]
+
+    total_nodes = sum(r['nodes'] for r in results)
+    total_time = sum(r['time'] for r in results)
+    total_probes = sum(r['tt_probes'] for r in results)
+    total_hits = sum(r['tt_hits'] for r in results)
+    scored = [r for r in results if r['solved'] is not None]
+    factors = [r['branching_factor'] for r in results if r['branching_factor']]
+
+    return {
+        'mode': label,
+        'depth': depth,
+        'time_limit': time_limit,
+        'positions': results,
+        'summary': {
+            'positions': len(results),
+            'solved': sum(1 for r in scored if r['solved']),
+            'scored': len(scored),
+            'nodes': total_nodes,
+            'time': total_time,
+            'nps': total_nodes / total_time if total_time > 0 else 0.0,
+            'tt_hit_rate': total_hits / total_probes if total_probes else 0.0,
+            'branching_factor': sum(factors) / len(factors) if factors else 0.0,
+        }
+    }
+
+
+def print_report(report, out=sys.stdout):
+    """Print a human readable table for one suite run"""
+    limit = "none" if report['time_limit'] == float('inf') else f"{report['time_limit']}s"
+    print(f"== {report['mode']} (depth {report['depth']}, time limit {limit}) ==", file=out)
+    print(f"{'id':<10} {'move':<8} {'ok':<4} {'depth':>5} {'nodes':>10} {'nps':>9} {'tt hit':>7} {'ebf':>6}",
+          file=out)
+    for r in report['positions']:
+        ok = '-' if r['solved'] is None else ('yes' if r['solved'] else 'no')
+        print(f"{r['id']:<10} {str(r['move']):<8} {ok:<4} {r['depth_reached']:>5} {r['nodes']:>10} "
+              f"{r['nps']:>9.0f} {r['tt_hit_rate']:>7.1%} {r['branching_factor']:>6.2f}", file=out)
+
+    s = report['summary']
+    print(f"solved {s['solved']}/{s['scored']}  nodes {s['nodes']}  time {s['time']:.2f}s  "
+          f"nps {s['nps']:.0f}  tt hit {s['tt_hit_rate']:.1%}  ebf {s['branching_factor']:.2f}", file=out)
+    print(file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ChessBot on a fixed set of EPD positions")
+    parser.add_argument("--epd", help="EPD file to use instead of the built-in positions")
+    parser.add_argument("--depth", type=int, default=3, help="depth for the fixed-depth run")
+    parser.add_argument("--movetime", type=float, default=2.0, help="seconds per position for the fixed-time run")
+    parser.add_argument("--mode", choices=["depth", "time", "both"], default="both")
+    parser.add_argument("--json", metavar="PATH", help="write machine-readable results ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    epds = load_epd_file(args.epd) if args.epd else BENCHMARK_EPDS
+
+    reports = []
+    if args.mode in ("depth", "both"):
+        # No time limit, so every position is searched to exactly the requested depth
+        reports.append(run_suite(epds, args.depth, float('inf'), "fixed-depth"))
+    if args.mode in ("time", "both"):
+        # Depth cap high enough that the clock is always what stops the search
+        reports.append(run_suite(epds, 64, args.movetime, "fixed-time"))
+
+    text_out = sys.stderr if args.json == '-' else sys.stdout
+    for report in reports:
+        print_report(report, text_out)
+
+    if args.json:
+        result = {
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': sys.version.split()[0],
+            'runs': reports,
+        }
+        # JSON has no infinity, so an unlimited clock is written as null
+        for report in result['runs']:
+            if report['time_limit'] == float('inf'):
+                report['time_limit'] = None
+        if args.json == '-':
+            json.dump(result, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, "w", encoding="utf8") as f:
+                json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,8 @@
 import chess
 import random
 import time
-import hashlib
+from bitboard_position import (Position, WHITE, BLACK, PAWN, KNIGHT, BISHOP, QUEEN, EMPTY,
+                               FILE_A, popcount)
 
 # Improved piece values based on modern chess theory
 PIECE_VALUES = {
@@ -95,11 +96,37 @@ PIECE_SQUARE_TABLES = {
     'k': KING_TABLE_MIDDLEGAME
 }
 
+# Piece values indexed by bitboard_position piece type (PAWN..KING)
+TYPE_VALUES = [PIECE_VALUES[symbol] for symbol in 'pnbrqk']
+
+FILE_MASKS = [FILE_A << file_index for file_index in range(8)]
+
+
+def _square_value_tables(king_table):
+    """Material plus piece-square value per square, indexed by piece code (color * 6 + type)"""
+    tables = []
+    for color in (chess.WHITE, chess.BLACK):
+        for symbol in 'pnbrqk':
+            table = king_table if symbol == 'k' else PIECE_SQUARE_TABLES[symbol]
+            values = []
+            for square in range(64):
+                # Flip square for black pieces
+                lookup = square if color == chess.WHITE else chess.square_mirror(square)
+                values.append(PIECE_VALUES[symbol] + table[lookup])
+            tables.append(values)
+    return tables
+
+
+SQUARE_VALUES = _square_value_tables(KING_TABLE_MIDDLEGAME)
+ENDGAME_SQUARE_VALUES = _square_value_tables(KING_TABLE_ENDGAME)
+
 
 class TranspositionTable:
     def __init__(self, size=1000000):
         self.table = {}
         self.size = size
+        self.probes = 0
+        self.hits = 0
 
     def store(self, key, depth, value, flag, best_move=None):
         if len(self.table) >= self.size:
@@ -114,7 +141,19 @@ class TranspositionTable:
         }
 
     def lookup(self, key):
-        return self.table.get(key)
+        self.probes += 1
+        entry = self.table.get(key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def hit_rate(self):
+        """Fraction of lookups that found an entry"""
+        return self.hits / self.probes if self.probes else 0.0
+
+    def hashfull(self):
+        """Table usage in permille, as reported by UCI engines"""
+        return min(1000, len(self.table) * 1000 // self.size) if self.size else 0
 
 
 class ChessBot:
@@ -123,94 +162,91 @@ class ChessBot:
         self.nodes_searched = 0
         self.time_limit = 5.0  # seconds
         self.start_time = 0
-
-    def get_piece_square_value(self, piece, square, is_endgame=False):
-        """Get positional value for a piece on a given square"""
-        piece_type = piece.symbol().lower()
-
-        if piece_type == 'k' and is_endgame:
-            table = KING_TABLE_ENDGAME
-        else:
-            table = PIECE_SQUARE_TABLES.get(piece_type, [0] * 64)
-
-        # Flip square for black pieces
-        if piece.color == chess.BLACK:
-            square = chess.square_mirror(square)
-
-        return table[square]
-
-    def is_endgame(self, board):
+        # One entry per finished iteration of iterative deepening (used by the benchmark)
+        self.depth_history = []
+        # Set from another thread to end the current search early (UCI "stop");
+        # whoever starts the next search clears it again
+        self.stop_requested = False
+        # Optional function called with each depth_history entry as it finishes
+        self.info_callback = None
+
+    def is_endgame(self, pos):
         """Determine if we're in endgame based on material"""
-        queens = len(board.pieces(chess.QUEEN, chess.WHITE)) + len(board.pieces(chess.QUEEN, chess.BLACK))
-        minors = (len(board.pieces(chess.BISHOP, chess.WHITE)) + len(board.pieces(chess.KNIGHT, chess.WHITE)) +
-                  len(board.pieces(chess.BISHOP, chess.BLACK)) + len(board.pieces(chess.KNIGHT, chess.BLACK)))
+        bb = pos.bb
+        queens = popcount(bb[QUEEN] | bb[6 + QUEEN])
+        minors = popcount(bb[BISHOP] | bb[KNIGHT] | bb[6 + BISHOP] | bb[6 + KNIGHT])
 
         # Endgame if no queens or very few minor pieces
         return queens == 0 or (queens == 2 and minors <= 1)
 
-    def evaluate_position(self, board):
+    def evaluate_position(self, pos, moves=None):
         """Comprehensive position evaluation"""
-        if board.is_checkmate():
-            return -20000 if board.turn else 20000
+        if moves is None:
+            moves = pos.legal_moves()
 
-        if board.is_stalemate() or board.is_insufficient_material():
+        if not moves:
+            if pos.is_check():
+                return -20000 if pos.turn == WHITE else 20000
             return 0
 
+        if pos.is_insufficient_material():
+            return 0
+
+        bb = pos.bb
         score = 0
-        is_endgame = self.is_endgame(board)
+        is_endgame = self.is_endgame(pos)
+        tables = ENDGAME_SQUARE_VALUES if is_endgame else SQUARE_VALUES
 
         # Material and positional evaluation
-        for square, piece in board.piece_map().items():
-            piece_value = PIECE_VALUES[piece.symbol().lower()]
-            positional_value = self.get_piece_square_value(piece, square, is_endgame)
-
-            total_value = piece_value + positional_value
-
-            if piece.color == chess.WHITE:
+        for code in range(12):
+            pieces = bb[code]
+            table = tables[code]
+            total_value = 0
+            while pieces:
+                bit = pieces & -pieces
+                pieces ^= bit
+                total_value += table[bit.bit_length() - 1]
+
+            if code < 6:
                 score += total_value
             else:
                 score -= total_value
 
-        # Mobility evaluation
-        white_mobility = len(list(board.legal_moves)) if board.turn == chess.WHITE else 0
-        board.turn = not board.turn
-        black_mobility = len(list(board.legal_moves)) if board.turn == chess.BLACK else 0
-        board.turn = not board.turn
-
-        score += (white_mobility - black_mobility) * 10
+        # Mobility evaluation (only counted with White to move)
+        if pos.turn == WHITE:
+            white_mobility = len(moves)
+            black_mobility = pos.count_moves_for(BLACK)
+            score += (white_mobility - black_mobility) * 10
 
         # King safety in middlegame
         if not is_endgame:
-            white_king_square = board.king(chess.WHITE)
-            black_king_square = board.king(chess.BLACK)
-
             # Penalize exposed kings
-            white_king_attackers = len(board.attackers(chess.BLACK, white_king_square))
-            black_king_attackers = len(board.attackers(chess.WHITE, black_king_square))
+            white_king_attackers = popcount(pos.attackers(BLACK, pos.king_square(WHITE)))
+            black_king_attackers = popcount(pos.attackers(WHITE, pos.king_square(BLACK)))
 
             score -= white_king_attackers * 50
             score += black_king_attackers * 50
 
         # Pawn structure evaluation
-        white_pawns = board.pieces(chess.PAWN, chess.WHITE)
-        black_pawns = board.pieces(chess.PAWN, chess.BLACK)
+        white_pawns = bb[PAWN]
+        black_pawns = bb[6 + PAWN]
 
         # Doubled pawns penalty
-        for file in chess.FILE_NAMES:
-            file_index = ord(file) - ord('a')
-            white_pawns_in_file = len([s for s in white_pawns if chess.square_file(s) == file_index])
-            black_pawns_in_file = len([s for s in black_pawns if chess.square_file(s) == file_index])
+        for file_mask in FILE_MASKS:
+            white_pawns_in_file = popcount(white_pawns & file_mask)
+            black_pawns_in_file = popcount(black_pawns & file_mask)
 
             if white_pawns_in_file > 1:
                 score -= 20 * (white_pawns_in_file - 1)
             if black_pawns_in_file > 1:
                 score += 20 * (black_pawns_in_file - 1)
 
-        return score if board.turn == chess.WHITE else -score
+        return score if pos.turn == WHITE else -score
 
-    def order_moves(self, board, moves, tt_best_move=None):
+    def order_moves(self, pos, moves, tt_best_move=None):
         """Order moves for better alpha-beta pruning"""
         move_scores = []
+        squares = pos.squares
 
         for move in moves:
             score = 0
@@ -220,26 +256,25 @@ class ChessBot:
                 score += 10000
 
             # Captures
-            if board.is_capture(move):
-                captured_piece = board.piece_at(move.to_square)
-                if captured_piece:
-                    moving_piece = board.piece_at(move.from_square)
-                    # MVV-LVA: Most Valuable Victim - Least Valuable Attacker
-                    score += PIECE_VALUES[captured_piece.symbol().lower()] - PIECE_VALUES[
-                        moving_piece.symbol().lower()] + 1000
+            captured_piece = squares[(move >> 6) & 63]
+            if captured_piece != EMPTY:
+                moving_piece = squares[move & 63]
+                # MVV-LVA: Most Valuable Victim - Least Valuable Attacker
+                score += TYPE_VALUES[captured_piece % 6] - TYPE_VALUES[moving_piece % 6] + 1000
 
             # Checks
-            board.push(move)
-            if board.is_check():
+            pos.push(move)
+            if pos.is_check():
                 score += 500
-            board.pop()
+            pos.pop()
 
             # Promotions
-            if move.promotion:
-                score += PIECE_VALUES[chess.piece_name(move.promotion)]
+            promotion = (move >> 12) & 7
+            if promotion:
+                score += TYPE_VALUES[promotion - 1]
 
             # Castling
-            if board.is_castling(move):
+            if pos.is_castling(move):
                 score += 200
 
             move_scores.append((move, score))
@@ -248,22 +283,20 @@ class ChessBot:
         move_scores.sort(key=lambda x: x[1], reverse=True)
         return [move for move, _ in move_scores]
 
-    def get_board_hash(self, board):
-        """Generate a hash for the board position"""
-        # Use FEN string as a simple hash (you could use a more sophisticated method)
-        fen = board.fen()
-        return hashlib.md5(fen.encode()).hexdigest()
+    def get_board_hash(self, pos):
+        """Zobrist hash of the position, maintained incrementally by push/pop"""
+        return pos.hash
 
-    def minimax(self, board, depth, alpha, beta, maximizing_player, start_time):
+    def minimax(self, pos, depth, alpha, beta, maximizing_player, start_time):
         """Enhanced minimax with alpha-beta pruning and transposition table"""
         self.nodes_searched += 1
 
         # Time management
-        if time.time() - start_time > self.time_limit:
-            return None, self.evaluate_position(board)
+        if self.stop_requested or time.time() - start_time > self.time_limit:
+            return None, self.evaluate_position(pos)
 
         # Transposition table lookup
-        board_hash = self.get_board_hash(board)
+        board_hash = self.get_board_hash(pos)
         tt_entry = self.tt.lookup(board_hash)
         tt_best_move = None
 
@@ -276,18 +309,16 @@ class ChessBot:
                 return tt_entry['best_move'], tt_entry['value']
             tt_best_move = tt_entry['best_move']
 
-        # Terminal conditions
-        if depth == 0 or board.is_game_over():
-            value = self.evaluate_position(board)
+        # Terminal conditions (the move list doubles as the checkmate/stalemate test)
+        moves = pos.legal_moves()
+        if depth == 0 or not moves or pos.is_insufficient_material() or \
+                pos.is_seventyfive_moves() or pos.is_fivefold_repetition():
+            value = self.evaluate_position(pos, moves)
             self.tt.store(board_hash, depth, value, 'exact')
             return None, value
 
-        moves = list(board.legal_moves)
-        if not moves:
-            return None, self.evaluate_position(board)
-
         # Move ordering
-        moves = self.order_moves(board, moves, tt_best_move)
+        moves = self.order_moves(pos, moves, tt_best_move)
 
         best_move = moves[0]
         original_alpha = alpha
@@ -295,9 +326,9 @@ class ChessBot:
         if maximizing_player:
             max_eval = float('-inf')
             for move in moves:
-                board.push(move)
-                _, eval_score = self.minimax(board, depth - 1, alpha, beta, False, start_time)
-                board.pop()
+                pos.push(move)
+                _, eval_score = self.minimax(pos, depth - 1, alpha, beta, False, start_time)
+                pos.pop()
 
                 if eval_score > max_eval:
                     max_eval = eval_score
@@ -321,9 +352,9 @@ class ChessBot:
         else:
             min_eval = float('inf')
             for move in moves:
-                board.push(move)
-                _, eval_score = self.minimax(board, depth - 1, alpha, beta, True, start_time)
-                board.pop()
+                pos.push(move)
+                _, eval_score = self.minimax(pos, depth - 1, alpha, beta, True, start_time)
+                pos.pop()
 
                 if eval_score < min_eval:
                     min_eval = eval_score
@@ -348,32 +379,74 @@ class ChessBot:
         """Iterative deepening search with time management"""
         self.start_time = time.time()
         self.nodes_searched = 0
+        self.depth_history = []
+
+        # The search runs on the lightweight position; only the root touches chess.Board
+        pos = Position.from_board(board)
 
         best_move = None
         best_eval = 0
 
         for depth in range(1, max_depth + 1):
-            if time.time() - self.start_time > self.time_limit:
+            if self.stop_requested or time.time() - self.start_time > self.time_limit:
                 break
 
             try:
                 move, eval_score = self.minimax(
-                    board, depth, float('-inf'), float('inf'),
+                    pos, depth, float('-inf'), float('inf'),
                     board.turn == chess.WHITE, self.start_time
                 )
 
-                if move:
-                    best_move = move
+                elapsed = time.time() - self.start_time
+                completed = elapsed <= self.time_limit and not self.stop_requested
+
+                # An aborted iteration has only looked at some moves; keep the last full depth's answer
+                # (unless there is none yet, when a partial answer beats no move)
+                if move and (completed or best_move is None):
+                    best_move = pos.to_chess_move(move)
                     best_eval = eval_score
 
+                entry = {
+                    'depth': depth,
+                    'nodes': self.nodes_searched,  # running total over all iterations so far
+                    'time': elapsed,
+                    'move': pos.to_chess_move(move) if move else None,
+                    'eval': eval_score,
+                    'completed': completed
+                }
+                self.depth_history.append(entry)
+                if self.info_callback:
+                    entry['pv'] = self.principal_variation(pos, depth)
+                    self.info_callback(entry)
+
             except KeyboardInterrupt:
                 break
 
         return best_move, best_eval
 
+    def principal_variation(self, pos, max_length):
+        """Follow transposition table best moves from pos, as chess.Move objects"""
+        pv = []
+        seen = set()
+        for _ in range(max_length):
+            # Read the table directly so the PV walk doesn't count towards the hit rate
+            entry = self.tt.table.get(pos.hash)
+            if not entry or not entry['best_move'] or pos.hash in seen:
+                break
+            move = entry['best_move']
+            if move not in pos.legal_moves():
+                break
+            seen.add(pos.hash)
+            pv.append(pos.to_chess_move(move))
+            pos.push(move)
+
+        for _ in pv:
+            pos.pop()
+        return pv
+
     def get_best_move(self, board, max_depth=6):
         """Get the best move using iterative deepening"""
-        if not list(board.legal_moves):
+        if not any(board.legal_moves):
             return None
 
         move, eval_score = self.iterative_deepening(board, max_depth)
@@ -1,8 +1,10 @@
+import json
 import tkinter as tk
 from PIL import Image, ImageTk
 import chess
 from socket import AF_INET, socket, SOCK_STREAM
 from threading import Thread
+import auth_client
 
 # Import shared functions and constants from chess_engine_bot
 from chess_engine_bot import (
@@ -64,6 +66,11 @@ def set_server_connection(host, port):
     ADDR = (HOST, PORT)
     print(f"Server connection set to {HOST}:{PORT}")
 
+def session_hello():
+    """First message of a game connection: the session token from sign-in, which the server maps to the username"""
+    accounts = auth_client.accounts
+    return "{session}" + (accounts.token if accounts is not None and accounts.token else "")
+
 # Update the connect_to_server function in chess_client_graphics.py:
 def connect_to_server(username="Player1"):
     """Connect to the chess server"""
@@ -73,7 +80,7 @@ def connect_to_server(username="Player1"):
     try:
         print(f"Attempting to connect to {HOST}:{PORT}")
         client_socket.connect(ADDR)
-        client_socket.send(bytes(username, "utf8"))
+        client_socket.send(bytes(session_hello(), "utf8"))
 
         # Start receiving thread
         receive_thread = Thread(target=receive_messages, daemon=True)
@@ -365,7 +372,7 @@ def connect_to_server(username="Player1"):
     client_socket = socket(AF_INET, SOCK_STREAM)
     try:
         client_socket.connect(ADDR)
-        client_socket.send(bytes(username, "utf8"))
+        client_socket.send(bytes(session_hello(), "utf8"))
 
         # Start receiving thread
         receive_thread = Thread(target=receive_messages, daemon=True)
@@ -382,9 +389,17 @@ def receive_messages():
 
     while True:
         try:
-            msg = client_socket.recv(BUFSIZ).decode("utf8")
-            if not msg:
+            data = client_socket.recv(BUFSIZ)
+            if not data:
                 break
+            if data.startswith(b"{leaderboard}"):
+                # Leaderboard replies can take several reads; the server ends them with a newline
+                while b"\n" not in data:
+                    more = client_socket.recv(BUFSIZ)
+                    if not more:
+                        break
+                    data += more
+            msg = data.decode("utf8")
 
             print(f"Server: {msg}")
 
@@ -439,6 +454,11 @@ def receive_messages():
                     chat_display.configure(state="disabled")
                     chat_display.see(tk.END)
 
+            elif msg.startswith("{analysis}"):
+                show_analysis(msg[len("{analysis}"):])
+            elif msg.startswith("{leaderboard}"):
+                show_leaderboard(msg[len("{leaderboard}"):])
+
             # Check if the message is a move
             elif msg.startswith("{move}"):
                 move_text = msg[6:]  # Remove {move} prefix
@@ -560,6 +580,61 @@ def process_opponent_move(move_text):
         print(f"Error processing opponent move: {e}")
 
 
+def request_analysis(fen=None):
+    """Ask the server's engines about a position (the current board by default)"""
+    send_message("{analyze}" + (fen or board.fen()))
+
+
+def show_analysis(payload):
+    """Show an {analysis} reply in the chat"""
+    try:
+        result = json.loads(payload)
+    except ValueError:
+        print(f"Bad analysis reply: {payload}")
+        return
+
+    if result["mate"] is not None:
+        evaluation = f"mate in {result['mate']}"
+    elif result["score"] is not None:
+        evaluation = f"{result['score'] / 100:+.2f}"
+    else:
+        evaluation = "?"
+    text = f"Analysis: best move {result['bestmove']} ({evaluation}, depth {result['depth']})"
+    if chat_display and chat_display.winfo_exists():
+        chat_display.configure(state="normal")
+        chat_display.insert(tk.END, f"System: {text}\n")
+        chat_display.configure(state="disabled")
+        chat_display.see(tk.END)
+
+
+def request_leaderboard(page=None):
+    """Ask the server for a leaderboard page (by default the one with this player on it)"""
+    send_message("{leaderboard}" + (str(page) if page else ""))
+
+
+def show_leaderboard(payload):
+    """Show a {leaderboard} reply in the chat"""
+    try:
+        result = json.loads(payload.split("\n", 1)[0])
+    except ValueError:
+        print(f"Bad leaderboard reply: {payload}")
+        return
+
+    # rows leaves out the players already in top
+    lines = ["Leaderboard:"]
+    lines += [f"{rank}. {username} {rating}" for rank, username, rating in result["top"]]
+    if result["rows"]:
+        lines.append(f"Page {result['page']}:")
+        lines += [f"{rank}. {username} {rating}" for rank, username, rating in result["rows"]]
+    if result["you"]:
+        lines.append(f"You are #{result['you'][0]} with {result['you'][1]}")
+    if chat_display and chat_display.winfo_exists():
+        chat_display.configure(state="normal")
+        chat_display.insert(tk.END, "".join(f"System: {line}\n" for line in lines))
+        chat_display.configure(state="disabled")
+        chat_display.see(tk.END)
+
+
 def send_message(msg):
     """Send a message to the server"""
     try:
@@ -872,11 +947,7 @@ def update_board(canvas, chess_board, game_state):
 
 
 def show_game_over_screen(canvas, result_text, win, return_to_homescreen):
-    """Display game over screen with result and update database"""
-    from SQLL_database import UserDatabase
-    db = UserDatabase()
-    if win is not None:
-        db.add_rating(user_name, 10 if win else -10)
+    """Display game over screen with result (the server updates both players' ratings)"""
 
     # Center of the canvas
     center_x = canvas.winfo_width() / 2
@@ -911,6 +982,11 @@ def show_game_over_screen(canvas, result_text, win, return_to_homescreen):
                               command=return_to_homescreen)
     canvas.create_window(center_x, center_y + rect_height / 4, window=return_button)
 
+    # The server's engines look at the final position; the answer arrives in the chat
+    analyze_button = tk.Button(canvas, text="Analyze Position", font=("Arial", 14),
+                               command=request_analysis)
+    canvas.create_window(center_x, center_y + rect_height / 4 - 50, window=analyze_button)
+
 
 def start_game(window, userName, return_to_homescreen):
     """Start a new chess game"""
@@ -988,6 +1064,11 @@ def start_game(window, userName, return_to_homescreen):
     canvas.create_window(window.winfo_screenwidth() / 2 - 100, window.winfo_screenheight() / 2 + BOARD_SIZE / 2 + 25,
                          window=resign_button)
 
+    # The leaderboard around this player's rank is shown in the chat
+    leaderboard_button = tk.Button(canvas, text="Leaderboard", width=15, command=request_leaderboard)
+    canvas.create_window(window.winfo_screenwidth() / 2 + 300, window.winfo_screenheight() / 2 + BOARD_SIZE / 2 + 25,
+                         window=leaderboard_button)
+
     # === Left: Chat Frame ===
     chat_frame = tk.Frame(canvas, bg="white", bd=5, relief="ridge")
     canvas.create_window(window.winfo_screenwidth() / 2 - BOARD_SIZE / 2 - 150, window.winfo_screenheight() / 2,
@@ -2,11 +2,12 @@ import tkinter as tk
 import tkinter.messagebox
 from PIL import Image, ImageTk
 import chess
-from stockfish import Stockfish
+from stockfish_pool import get_pool
+from stockfish_client import AsyncStockfishClient
+import engine_locator
 from threading import Thread
 import time
 import os
-from SQLL_database import UserDatabase
 
 # Constants
 BOARD_SIZE = 760  # Using the larger size from stockfish version
@@ -14,6 +15,11 @@ SQUARE_SIZE = BOARD_SIZE // 8
 PIECE_SIZE_TO_SQUARE = 15
 COLORS = {'odd': '#83CB72', 'even': '#DCE2D6'}
 CIRCLE_CONST = 35
+# Upper bound on one Stockfish move, and how often the UI checks for it
+STOCKFISH_MOVETIME_MS = 1000
+STOCKFISH_POLL_MS = 50
+# Seconds the chess bot may think per move at each difficulty (depth)
+BOT_TIME_LIMITS = {2: 1.0, 3: 2.0, 4: 3.0, 5: 5.0}
 
 # Global variables - shared by both engines
 piece_images = {}
@@ -32,7 +38,7 @@ difficulty = 1
 player_name = "Player1"
 
 # Engine-specific globals
-stockfish_engine = None
+stockfish_client = None
 chess_bot_instance = None
 
 
@@ -48,7 +54,7 @@ def load_piece_images():
 
     for key, name in piece_names.items():
         try:
-            img = Image.open(f"assets\\pieces\\{name}.png")
+            img = Image.open(os.path.join("assets", "pieces", f"{name}.png"))
             img = img.resize((SQUARE_SIZE - PIECE_SIZE_TO_SQUARE, SQUARE_SIZE - PIECE_SIZE_TO_SQUARE))
             piece_images[key] = ImageTk.PhotoImage(img)
         except Exception as e:
@@ -125,6 +131,8 @@ def on_square_click(event, engine_type):
             if game_board.is_game_over():
                 result_text = get_game_result()
                 game_state["game_active"] = False
+                if engine_type == "stockfish":
+                    cleanup_stockfish()
 
                 return_to_homescreen = getattr(game_canvas.master, 'return_to_homescreen', None)
                 if return_to_homescreen:
@@ -133,7 +141,7 @@ def on_square_click(event, engine_type):
 
             # Start the appropriate engine move
             if engine_type == "stockfish":
-                Thread(target=stockfish_make_move, daemon=True).start()
+                stockfish_make_move()
             else:
                 Thread(target=chess_bot_make_move, daemon=True).start()
         else:
@@ -261,7 +269,7 @@ def create_game_interface(window, return_to_homescreen, engine_type):
     # Background
     try:
         bg_image = ImageTk.PhotoImage(
-            Image.open("assets\\utils\\chessBackground.jpg").resize(
+            Image.open(os.path.join("assets", "utils", "chessBackground.jpg")).resize(
                 (window.winfo_screenwidth(), window.winfo_screenheight())))
         canvas.bg_image = bg_image
         canvas.create_image(0, 0, image=bg_image, anchor=tk.NW)
@@ -318,131 +326,120 @@ def resign_game(return_to_homescreen, engine_type):
 # ============= STOCKFISH-SPECIFIC FUNCTIONS =============
 
 def initialize_stockfish_engine(difficulty_level=1):
-    """Initialize the Stockfish engine using the stockfish library"""
-    global stockfish_engine
+    """Take a ready Stockfish engine from the pool and configure it for the difficulty"""
+    global stockfish_client
 
     try:
-        # Clean up any existing engine first
-        if stockfish_engine is not None:
-            try:
-                del stockfish_engine
-            except:
-                pass
-            stockfish_engine = None
-
-        # Try to create Stockfish engine without specifying path first
-        try:
-            stockfish_engine = Stockfish("stockfish-windows-x86-64-avx2\\stockfish\\stockfish-windows-x86-64-avx2.exe")
-            # Test if it works
-            test_fen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-            if not stockfish_engine.is_fen_valid(test_fen):
-                raise Exception("Stockfish validation failed")
-        except Exception as e:
-            print(f"Default Stockfish failed: {e}, trying specific paths...")
-
-            if stockfish_engine is None:
-                raise FileNotFoundError("Could not initialize Stockfish with any available path")
+        # Hand back any engine left over from the previous game first
+        cleanup_stockfish()
 
-        # Configure engine strength based on difficulty
+        path = engine_locator.find_stockfish()
+        if path is None:
+            print("Stockfish not found: set STOCKFISH_PATH or install stockfish")
+            return False
         try:
-            if difficulty_level <= 5:
-                # Beginner levels
-                stockfish_engine.set_depth(max(1, difficulty_level))
-                if hasattr(stockfish_engine, 'set_elo_rating'):
-                    stockfish_engine.set_elo_rating(800 + (difficulty_level - 1) * 100)
-            elif difficulty_level <= 10:
-                # Intermediate levels
-                stockfish_engine.set_depth(5 + (difficulty_level - 5))
-                if hasattr(stockfish_engine, 'set_elo_rating'):
-                    stockfish_engine.set_elo_rating(1200 + (difficulty_level - 6) * 150)
-            elif difficulty_level <= 15:
-                # Advanced levels
-                stockfish_engine.set_depth(10 + (difficulty_level - 10))
-                if hasattr(stockfish_engine, 'set_elo_rating'):
-                    stockfish_engine.set_elo_rating(1950 + (difficulty_level - 11) * 100)
-            else:
-                # Expert levels - full strength
-                stockfish_engine.set_depth(15)
-        except Exception as config_error:
-            print(f"Warning: Could not configure engine settings: {config_error}")
-            # Continue anyway with default settings
+            stockfish_client = AsyncStockfishClient(path, difficulty_level, STOCKFISH_MOVETIME_MS)
+        except Exception:
+            engine_locator.report_failure(path)
+            raise
 
         print(f"Stockfish initialized successfully for difficulty level {difficulty_level}")
         return True
 
     except Exception as e:
         print(f"Failed to initialize Stockfish: {e}")
-        if stockfish_engine:
-            try:
-                del stockfish_engine
-            except:
-                pass
-            stockfish_engine = None
+        stockfish_client = None
         return False
 
 
 def stockfish_make_move():
-    """Make Stockfish move using the stockfish library"""
-    global game_board, game_state, stockfish_engine
+    """Ask Stockfish for a move without blocking the UI; poll_stockfish_move picks up the answer"""
+    global game_state
 
-    if not game_state["game_active"] or game_state["my_turn"] or stockfish_engine is None:
+    if not game_state["game_active"] or game_state["my_turn"] or stockfish_client is None:
         return
 
     try:
-        # Set the current position in Stockfish
-        current_fen = game_board.fen()
-        stockfish_engine.set_fen_position(current_fen)
+        game_state["stockfish_request"] = stockfish_client.request_move(game_board.fen())
+    except Exception as e:
+        print(f"Stockfish move error: {e}")
+        show_stockfish_error()
+        return
 
-        # Get best move from Stockfish
-        best_move = stockfish_engine.get_best_move()
+    if game_canvas and game_canvas.winfo_exists():
+        game_canvas.after(STOCKFISH_POLL_MS, poll_stockfish_move)
 
-        if best_move:
-            # Convert to chess.Move object
-            move = chess.Move.from_uci(best_move)
 
-            if move in game_board.legal_moves:
-                game_board.push(move)
-                game_state["selected"] = None
-                game_state["current_player"] = chess.WHITE
-                game_state["my_turn"] = True
+def poll_stockfish_move():
+    """Runs on the Tk loop until the pending Stockfish search answers"""
+    global game_board, game_state
 
-                if game_canvas and game_canvas.winfo_exists():
-                    game_canvas.after(0, update_board)
+    # The game was resigned or the board closed: the search has already been cancelled
+    if not game_state["game_active"] or stockfish_client is None:
+        return
+    if not game_canvas or not game_canvas.winfo_exists():
+        return
+
+    result = stockfish_client.poll()
+    if result is None:
+        game_canvas.after(STOCKFISH_POLL_MS, poll_stockfish_move)
+        return
+
+    request_id, best_move, error = result
+    if request_id != game_state.get("stockfish_request"):
+        return
+    if error is not None:
+        print(f"Stockfish move error: {error}")
+        show_stockfish_error()
+        return
+    if not best_move:
+        print("Stockfish returned no move")
+        return
 
-                if status_label and status_label.winfo_exists():
-                    game_canvas.after(0, lambda: status_label.config(text="Your turn"))
+    move = chess.Move.from_uci(best_move)
+    if move not in game_board.legal_moves:
+        print(f"Stockfish suggested illegal move: {best_move}")
+        return
 
-                if game_board.is_game_over():
-                    result_text = get_game_result()
-                    game_state["game_active"] = False
+    game_board.push(move)
+    game_state["selected"] = None
+    game_state["current_player"] = chess.WHITE
+    game_state["my_turn"] = True
+    update_board()
+    if status_label and status_label.winfo_exists():
+        status_label.config(text="Your turn")
 
-                    return_to_homescreen = getattr(game_canvas.master, 'return_to_homescreen', None)
-                    if return_to_homescreen:
-                        game_canvas.after(1000, lambda: show_game_over(result_text, return_to_homescreen))
-            else:
-                print(f"Stockfish suggested illegal move: {best_move}")
-        else:
-            print("Stockfish returned no move")
+    if game_board.is_game_over():
+        result_text = get_game_result()
+        game_state["game_active"] = False
+        cleanup_stockfish()
+
+        return_to_homescreen = getattr(game_canvas.master, 'return_to_homescreen', None)
+        if return_to_homescreen:
+            game_canvas.after(1000, lambda: show_game_over(result_text, return_to_homescreen))
 
-    except Exception as e:
-        print(f"Stockfish move error: {e}")
-        # Try to continue the game even if Stockfish fails
-        if game_canvas and game_canvas.winfo_exists():
-            game_canvas.after(0, lambda: status_label.config(text="Stockfish error - Your turn"))
+
+def show_stockfish_error():
+    # Try to continue the game even if Stockfish fails
+    game_state["my_turn"] = True
+    if status_label and status_label.winfo_exists():
+        status_label.config(text="Stockfish error - Your turn")
 
 
 def cleanup_stockfish():
-    """Clean up Stockfish engine safely"""
-    global stockfish_engine
+    """Stop any running search and return the Stockfish engine to the pool"""
+    global stockfish_client
 
-    if stockfish_engine is not None:
+    if stockfish_client is not None:
         try:
-            # The stockfish library should handle cleanup automatically
-            del stockfish_engine
+            stockfish_client.close()
+            stats = stockfish_client.cache.stats()
+            print(f"Stockfish cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.0%}), {stats['size']} positions")
         except Exception as e:
             print(f"Error during Stockfish cleanup: {e}")
         finally:
-            stockfish_engine = None
+            stockfish_client = None
 
 
 def show_stockfish_difficulty_selection(window, return_to_homescreen):
@@ -488,7 +485,7 @@ def start_stockfish_game(window, return_to_homescreen):
     global game_board, game_state
 
     if not initialize_stockfish_engine(difficulty):
-        tkinter.messagebox.showerror("Error", "Failed to initialize Stockfish!\nMake sure Stockfish is installed.")
+        start_fallback_bot_game(window, return_to_homescreen)
         return
 
     # Reset game
@@ -501,6 +498,29 @@ def start_stockfish_game(window, return_to_homescreen):
     create_game_interface(window, return_to_homescreen, "stockfish")
 
 
+def start_fallback_bot_game(window, return_to_homescreen):
+    """Play the chess bot at a comparable level when Stockfish can't be started"""
+    global difficulty
+
+    if difficulty <= 1:
+        difficulty = 2
+    elif difficulty <= 5:
+        difficulty = 3
+    elif difficulty <= 10:
+        difficulty = 4
+    else:
+        difficulty = 5
+
+    if not initialize_chess_bot():
+        tkinter.messagebox.showerror("Error", "Failed to initialize Stockfish!\nMake sure Stockfish is installed.")
+        return
+    chess_bot_instance.time_limit = BOT_TIME_LIMITS[difficulty]
+
+    tkinter.messagebox.showinfo("Stockfish unavailable",
+                                "Stockfish could not be started.\nYou will play against the chess bot instead.")
+    start_chess_bot_game(window, return_to_homescreen)
+
+
 # ============= CHESS BOT-SPECIFIC FUNCTIONS =============
 
 def initialize_chess_bot():
@@ -616,9 +636,8 @@ def show_chess_bot_difficulty_selection(window, return_to_homescreen):
             return
 
         # Configure the bot's time limit based on difficulty
-        time_limits = {2: 1.0, 3: 2.0, 4: 3.0, 5: 5.0}
         if hasattr(chess_bot_instance, 'time_limit'):
-            chess_bot_instance.time_limit = time_limits.get(difficulty, 5.0)
+            chess_bot_instance.time_limit = BOT_TIME_LIMITS.get(difficulty, 5.0)
 
         overlay.destroy()
         start_chess_bot_game(window, return_to_homescreen)
@@ -659,6 +678,10 @@ def play_with_stockfish(window, return_to_homescreen, player_name_param="Player1
     """Main entry point for Stockfish games"""
     global player_name
     player_name = player_name_param
+    # Start an engine while the player picks a difficulty
+    path = engine_locator.find_stockfish()
+    if path is not None:
+        get_pool(path).warm_up()
     show_stockfish_difficulty_selection(window, return_to_homescreen)
 
 
@@ -0,0 +1,135 @@
+import argparse
+import sys
+import time
+import chess
+import bitboard_position
+
+# Standard perft positions with their known node counts for depth 1, 2, 3, ...
+PERFT_POSITIONS = [
+    ("startpos", chess.STARTING_FEN,
+     [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(board, depth):
+    """Count leaf nodes of the legal move tree using push/pop on every node"""
+    if depth == 0:
+        return 1
+
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board, depth):
+    """Perft split by root move, the usual way to find which subtree is wrong"""
+    counts = {}
+    for move in board.legal_moves:
+        board.push(move)
+        counts[move.uci()] = perft(board, depth - 1)
+        board.pop()
+    return counts
+
+
+def bitboard_perft(board, depth):
+    """Perft on the search's bitboard position (conversion time excluded by the caller)"""
+    return bitboard_position.perft(bitboard_position.Position.from_board(board), depth)
+
+
+def bitboard_divide(board, depth):
+    pos = bitboard_position.Position.from_board(board)
+    counts = {}
+    for move in pos.legal_moves():
+        pos.push(move)
+        counts[pos.to_chess_move(move).uci()] = bitboard_position.perft(pos, depth - 1)
+        pos.pop()
+    return counts
+
+
+BACKENDS = {
+    "python-chess": (perft, divide),
+    "bitboard": (bitboard_perft, bitboard_divide),
+}
+
+
+def timed_perft(board, depth, backend="python-chess"):
+    """Run perft and return (nodes, seconds)"""
+    perft_function = BACKENDS[backend][0]
+    start = time.perf_counter()
+    nodes = perft_function(board, depth)
+    return nodes, time.perf_counter() - start
+
+
+def run_suite(max_depth, max_nodes, backend="python-chess", out=sys.stdout):
+    """Validate every standard position up to max_depth and report positions/sec"""
+    total_nodes = 0
+    total_time = 0.0
+    failures = 0
+
+    for name, fen, expected_counts in PERFT_POSITIONS:
+        for depth, expected in enumerate(expected_counts, start=1):
+            if depth > max_depth or expected > max_nodes:
+                break
+
+            nodes, elapsed = timed_perft(chess.Board(fen), depth, backend)
+            total_nodes += nodes
+            total_time += elapsed
+
+            status = "ok" if nodes == expected else f"FAIL (expected {expected})"
+            if nodes != expected:
+                failures += 1
+            nps = nodes / elapsed if elapsed > 0 else 0.0
+            print(f"{name:<10} depth {depth}: {nodes:>10} nodes  {elapsed:8.3f}s  {nps:>10.0f} pos/s  {status}",
+                  file=out)
+
+    nps = total_nodes / total_time if total_time > 0 else 0.0
+    print(f"total {total_nodes} nodes in {total_time:.3f}s ({nps:.0f} pos/s), {failures} failure(s)", file=out)
+    return failures == 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move generation correctness and speed check")
+    parser.add_argument("--fen", help="run a single position instead of the standard suite")
+    parser.add_argument("--depth", type=int, default=3, help="depth for --fen, or the maximum depth for the suite")
+    parser.add_argument("--divide", action="store_true", help="print the node count for each root move")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="python-chess",
+                        help="move generator to exercise")
+    parser.add_argument("--max-nodes", type=int, default=1000000,
+                        help="skip suite entries expected to visit more nodes than this")
+    args = parser.parse_args(argv)
+
+    if args.fen is None:
+        return 0 if run_suite(args.depth, args.max_nodes, args.backend) else 1
+
+    perft_function, divide_function = BACKENDS[args.backend]
+    board = chess.Board(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        counts = divide_function(board, args.depth)
+        for move in sorted(counts):
+            print(f"{move}: {counts[move]}")
+        nodes = sum(counts.values())
+    else:
+        nodes = perft_function(board, args.depth)
+    elapsed = time.perf_counter() - start
+
+    nps = nodes / elapsed if elapsed > 0 else 0.0
+    print(f"nodes {nodes}  time {elapsed:.3f}s  {nps:.0f} pos/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
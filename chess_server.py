@@ -1,8 +1,23 @@
 from socket import AF_INET, socket, SOCK_STREAM
-from threading import Thread
+from threading import Thread, Lock
 import random
+import json
+import os
 import signal
 import sys
+import time
+from datetime import datetime, timezone
+import chess
+from analysis_service import AnalysisService
+from rating_service import RatingService
+from game_archive import GameArchive
+from db_writer import DatabaseWriter
+from db_maintenance import MaintenanceSweeper
+from leaderboard import Leaderboard
+from auth_service import AuthService
+from rate_limiter import LoginRateLimiter
+from mail_outbox import get_outbox
+from SQLL_database import UserDatabase
 
 connected_clients = []  # All connected clients
 waiting_clients = []  # Clients who have sent {enter_game}
@@ -13,10 +28,24 @@ addresses = {}
 turns = {}  # client -> is_their_turn (bool)
 colors = {}  # client -> color (True for white, False for black)
 
+names = {}  # client -> username sent on connect
+# client -> the game it is playing: {"white", "black", "board", "finished", "illegal_by", "draw_offered_by",
+# "started_at", "clock", "turn_started"}, shared by both players
+games = {}
+games_lock = Lock()
+
 HOST = ''
 PORT = 33000
+# Clients play 5 minutes each without increment (PGN TimeControl notation)
+TIME_CONTROL = "300"
+# Slack for network delay when the server's clock and a client's disagree about a flag (seconds)
+CLOCK_TOLERANCE = 1.0
 BUFSIZ = 1024
+# Longest {auth} request line; a connection that sends more without a newline is closed
+MAX_AUTH_LINE = 4096
 ADDR = (HOST, PORT)
+# Set to 1 on a development server to create the sample account (see UserDatabase.add_sample_user)
+SAMPLE_USER_ENV_VAR = "CHESS_SAMPLE_USER"
 
 SERVER = socket(AF_INET, SOCK_STREAM)
 SERVER.bind(ADDR)
@@ -24,6 +53,21 @@ SERVER.bind(ADDR)
 # Flag to control server shutdown
 server_running = True
 
+# Shared engines for {analyze} requests, started in __main__
+analysis_service = None
+# Applies each finished game's rating change once, started in __main__
+rating_service = None
+# Single writer thread for every database write of the server, started in __main__
+db_writer = None
+# Stores finished games through db_writer, started in __main__
+game_archive = None
+# Deletes expired sign-up and reset rows in the background, started in __main__
+maintenance = None
+# Players by rating for {leaderboard} requests, started in __main__
+leaderboard = None
+# Sign-in, sign-up and account requests ({auth} connections) and the sessions they issue, started in __main__
+auth_service = None
+
 
 def signal_handler(sig, frame):
     """Handle Ctrl+C gracefully"""
@@ -44,6 +88,13 @@ def signal_handler(sig, frame):
     except:
         pass
 
+    if analysis_service:
+        analysis_service.shutdown()
+    if maintenance:
+        maintenance.close()
+    if db_writer:
+        db_writer.close()
+
     print("Server shutdown complete.")
     sys.exit(0)
 
@@ -87,6 +138,16 @@ def try_pairing():
         colors[player1] = player1_is_white
         colors[player2] = not player1_is_white
 
+        # The server keeps its own board so it can decide the result instead of trusting either client
+        white, black = (player1, player2) if player1_is_white else (player2, player1)
+        game = {"white": white, "black": black, "board": chess.Board(), "finished": False, "illegal_by": None,
+                "draw_offered_by": None, "started_at": datetime.now(timezone.utc),
+                # Seconds left per side (keyed like board.turn), and when the side to move started thinking
+                "clock": {chess.WHITE: float(TIME_CONTROL), chess.BLACK: float(TIME_CONTROL)},
+                "turn_started": None}
+        games[player1] = game
+        games[player2] = game
+
         # Set initial turns (white always goes first)
         turns[player1] = player1_is_white
         turns[player2] = not player1_is_white
@@ -115,15 +176,141 @@ def try_pairing():
             sleep(1)
             player1.send(bytes("{start_clock}", "utf8"))
             player2.send(bytes("{start_clock}", "utf8"))
+            game["turn_started"] = time.monotonic()
         except:
             # If sending fails, clean up the pairing
             unpair(player1, notify_partner=False)
 
 
+def finish_game(game, result, reason):
+    """Record the result of a game once and update both players' ratings"""
+    with games_lock:
+        if game["finished"]:
+            return
+        game["finished"] = True
+
+    white, black = game["white"], game["black"]
+    white_name, black_name = names.get(white), names.get(black)
+    print(f"Game over: {white_name} vs {black_name} {result} ({reason})")
+    if game_archive is not None:
+        game_archive.record(white_name or "?", black_name or "?", result, reason, game["board"].move_stack,
+                            game["started_at"], TIME_CONTROL)
+    if rating_service is None or not white_name or not black_name:
+        return
+
+    future = rating_service.submit_game(white_name, black_name, result)
+    future.add_done_callback(lambda f: report_ratings(game, white_name, black_name, f))
+
+
+def report_ratings(game, white_name, black_name, future):
+    """Tell both players their new rating once the write has committed (runs on the writer thread)"""
+    error = future.exception()
+    success, changes = (False, error) if error else future.result()
+    if not success:
+        print(f"Rating update failed: {changes}")
+        return
+    if leaderboard is not None:
+        leaderboard.update({name: new for name, (old, new) in changes.items()})
+
+    for player, name in ((game["white"], white_name), (game["black"], black_name)):
+        old, new = changes[name]
+        try:
+            player.send(bytes(f"{{info}}Your rating: {old} -> {new}", "utf8"))
+        except OSError:
+            pass
+
+
+def loss_for(game, loser):
+    return "0-1" if loser is game["white"] else "1-0"
+
+
+def time_left(game, color, now=None):
+    """Seconds left on color's clock by the server's reckoning (its clock only runs while it is to move)"""
+    left = game["clock"][color]
+    if game["board"].turn == color and game["turn_started"] is not None:
+        left -= (time.monotonic() if now is None else now) - game["turn_started"]
+    return left
+
+
+def record_move(client, move_text):
+    """Play a forwarded move on the server's board and end the game on mate or a draw"""
+    game = games.get(client)
+    if not game or game["finished"]:
+        return
+    board = game["board"]
+    try:
+        move = chess.Move.from_uci(move_text.strip())
+    except ValueError:
+        move = None
+    if move is None or move not in board.legal_moves:
+        # The opponent's client will report it with {illegal_move}
+        game["illegal_by"] = client
+        return
+
+    # The mover's clock stops when the move arrives; the opponent's starts
+    now = time.monotonic()
+    mover = board.turn
+    game["clock"][mover] = time_left(game, mover, now)
+    game["turn_started"] = now
+    if game["clock"][mover] < -CLOCK_TOLERANCE:
+        finish_game(game, loss_for(game, client), "timeout")
+        return
+
+    board.push(move)
+    if game["draw_offered_by"] is not None and game["draw_offered_by"] is not client:
+        # Moving instead of answering declines the opponent's offer
+        game["draw_offered_by"] = None
+    outcome = board.outcome()
+    if outcome:
+        finish_game(game, outcome.result(), outcome.termination.name.lower())
+
+
+def record_game_event(client, data):
+    """Results that are decided by a message rather than by a move.
+    Returns False for an event the server rejects (a draw accept without an offer, or a timeout claim while
+    the opponent's clock is still running), which must not be relayed to the opponent."""
+    game = games.get(client)
+    if not game or game["finished"]:
+        return True
+
+    if data.startswith("{opponent_resigned}"):
+        # Sent by the player who resigns
+        finish_game(game, loss_for(game, client), "resignation")
+    elif data.startswith("{draw_offer}"):
+        game["draw_offered_by"] = client
+    elif data.startswith("{draw_decline}"):
+        game["draw_offered_by"] = None
+    elif data.startswith("{draw_accept}"):
+        # Only the opponent of whoever offered can accept
+        offered_by = game["draw_offered_by"]
+        if offered_by is None or offered_by is client:
+            return False
+        finish_game(game, "1/2-1/2", "agreement")
+    elif data.startswith("{timeout}"):
+        # Both clients send it when a clock runs out. Only the side to move can be out of time; the claim
+        # is believed from that player, or once the server's own clock for them has run out too
+        loser = game["white"] if game["board"].turn == chess.WHITE else game["black"]
+        if loser is not client and time_left(game, game["board"].turn) > CLOCK_TOLERANCE:
+            return False
+        finish_game(game, loss_for(game, loser), "timeout")
+    elif data.startswith("{illegal_move}"):
+        # Only believed when the server also rejected the opponent's last move
+        partner = pairs.get(client)
+        if partner is not None and game["illegal_by"] is partner:
+            finish_game(game, loss_for(game, partner), "illegal_move")
+    return True
+
+
 def unpair(client, notify_partner=True):
     """Unpair the client and optionally notify their partner."""
+    game = games.pop(client, None)
     partner = pairs.pop(client, None)
+    if game and game["board"].move_stack and not game["finished"]:
+        # Leaving a started game loses it
+        finish_game(game, loss_for(game, client), "abandoned")
+
     if partner:
+        games.pop(partner, None)
         pairs.pop(partner, None)
         # Also clean up the turns and colors data
         turns.pop(client, None)
@@ -138,14 +325,105 @@ def unpair(client, notify_partner=True):
                 pass
 
 
+def handle_analysis_request(client, fen):
+    """Answer {analyze}<fen> with {analysis}<json> once an engine has looked at the position"""
+    if analysis_service is None:
+        client.send(bytes("{error}Analysis is not available.", "utf8"))
+        return
+    game = games.get(client)
+    if game and not game["finished"]:
+        # An engine's opinion in the middle of a rated game would be cheating
+        client.send(bytes("{error}Analysis is available once the game is over.", "utf8"))
+        return
+
+    def reply(result, error):
+        try:
+            if error is not None:
+                client.send(bytes(f"{{error}}Analysis failed: {error}", "utf8"))
+            else:
+                client.send(bytes("{analysis}" + json.dumps(result), "utf8"))
+        except OSError:
+            # The client left before the analysis finished
+            pass
+
+    analysis_service.analyze(fen, reply, client)
+
+
+def handle_leaderboard_request(client, page_text):
+    """Answer {leaderboard}[page] with {leaderboard}<json>\n: the top players, the rest of one page and the
+    sender's rank. The reply can be longer than one client read, so it ends with a newline."""
+    if leaderboard is None:
+        client.send(bytes("{error}The leaderboard is not available.", "utf8"))
+        return
+    name = names.get(client)
+    page = int(page_text) if page_text.isdigit() and int(page_text) > 0 else leaderboard.page_of(name) or 1
+    top = leaderboard.top()
+    # Rows already in the top list aren't sent twice
+    top_names = {username for _, username, _ in top}
+    rows = [row for row in leaderboard.page(page) if row[1] not in top_names]
+    reply = {"top": top, "page": page, "rows": rows, "you": leaderboard.rank(name)}
+    client.sendall(bytes("{leaderboard}" + json.dumps(reply) + "\n", "utf8"))
+
+
+def handle_auth_connection(client, data):
+    """Serve {auth}<json> requests, one per line, until the client disconnects.
+    data is the raw bytes read so far; lines are decoded whole, so a character split between reads is fine."""
+    ip_address = addresses.get(client, ("?",))[0]
+    bad_request = bytes("{auth}" + json.dumps({"success": False, "result": "Bad request"}) + "\n", "utf8")
+    buffer = data
+    try:
+        while server_running:
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                try:
+                    line = line.decode("utf8")
+                    request = json.loads(line[len("{auth}"):]) if line.startswith("{auth}") else None
+                except ValueError:
+                    # UnicodeDecodeError is a ValueError too
+                    request = None
+                if not isinstance(request, dict):
+                    client.sendall(bad_request)
+                    continue
+                reply = auth_service.handle(request, ip_address)
+                client.sendall(bytes("{auth}" + json.dumps(reply) + "\n", "utf8"))
+            if len(buffer) > MAX_AUTH_LINE:
+                # No line is this long; don't hold on to whatever is being sent
+                client.sendall(bad_request)
+                break
+            data = client.recv(BUFSIZ)
+            if not data:
+                break
+            buffer += data
+    except OSError:
+        pass
+    finally:
+        cleanup_client(client)
+
+
 def handle_client(client):
     try:
-        name = client.recv(BUFSIZ).decode("utf8")
+        hello = client.recv(BUFSIZ)
+        if hello.startswith(b"{auth}"):
+            # Account requests can be longer than one read; that handler decodes whole lines
+            handle_auth_connection(client, hello)
+            return
+        hello = hello.decode("utf8")
     except:
         # Connection failed during initial handshake
         cleanup_client(client)
         return
 
+    # Game connections open with the session token from sign-in, so the name (and rating) is the server's
+    username = auth_service.sessions.lookup(hello[len("{session}"):].strip()) if hello.startswith("{session}") else None
+    if username is None:
+        try:
+            client.send(bytes("{error}Please sign in again.", "utf8"))
+        except OSError:
+            pass
+        cleanup_client(client)
+        return
+    names[client] = username
+
     while server_running:
         try:
             data = client.recv(BUFSIZ).decode("utf8")
@@ -170,6 +448,12 @@ def handle_client(client):
                 client.send(bytes("{quit}", "utf8"))
                 break
 
+            elif data.startswith("{analyze}"):
+                handle_analysis_request(client, data[len("{analyze}"):].strip())
+
+            elif data.startswith("{leaderboard}"):
+                handle_leaderboard_request(client, data[len("{leaderboard}"):].strip())
+
             elif data.startswith("{move}"):
                 partner = pairs.get(client)
                 if not partner:
@@ -182,6 +466,8 @@ def handle_client(client):
                     continue
 
                 # If it is their turn, process the move
+                record_move(client, data[len("{move}"):])
+
                 # Switch turns
                 turns[client] = False
                 turns[partner] = True
@@ -193,19 +479,25 @@ def handle_client(client):
                     client.send(bytes("{turn}Opponent's turn to move.", "utf8"))
                     partner.send(bytes("{turn}Your turn to move.", "utf8"))
                 except:
-                    # Partner connection failed
-                    unpair(client, notify_partner=False)
+                    # Partner connection failed; the abandoned game is the partner's loss, not this player's
+                    unpair(partner, notify_partner=False)
                     client.send(bytes("{error}Partner disconnected.", "utf8"))
 
             else:
-                # Handle regular chat messages
+                # Handle regular chat messages (and game events such as resignation, which are relayed the same way)
+                if not record_game_event(client, data):
+                    if data.startswith("{timeout}"):
+                        client.send(bytes("{error}Your opponent still has time.", "utf8"))
+                    else:
+                        client.send(bytes("{error}There is no draw offer to accept.", "utf8"))
+                    continue
                 partner = pairs.get(client)
                 if partner:
                     try:
                         partner.send(bytes(data, "utf8"))
                     except:
-                        # Partner connection failed
-                        unpair(client, notify_partner=False)
+                        # Partner connection failed; the abandoned game is the partner's loss, not this player's
+                        unpair(partner, notify_partner=False)
                         client.send(bytes("{error}Partner disconnected.", "utf8"))
                 else:
                     client.send(bytes("{error}No partner to send to.", "utf8"))
@@ -231,6 +523,8 @@ def cleanup_client(client):
     if client in connected_clients:
         connected_clients.remove(client)
 
+    names.pop(client, None)
+
     try:
         client.close()
     except:
@@ -242,6 +536,20 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
 
+    analysis_service = AnalysisService()
+    db_writer = DatabaseWriter()
+    rating_service = RatingService(writer=db_writer)
+    game_archive = GameArchive(db_writer)
+    maintenance = MaintenanceSweeper()
+    maintenance.start()
+    leaderboard = Leaderboard()
+    # Its password is public, so never on a shared server
+    if os.environ.get(SAMPLE_USER_ENV_VAR) == "1":
+        UserDatabase().add_sample_user()
+    limiter = LoginRateLimiter()
+    limiter.restore(UserDatabase())
+    auth_service = AuthService(UserDatabase(writer=db_writer, limiter=limiter), get_outbox(), leaderboard=leaderboard)
+
     try:
         SERVER.listen(5)
         print("Waiting for connections...")
@@ -266,4 +574,7 @@ if __name__ == "__main__":
             SERVER.close()
         except:
             pass
+        analysis_service.shutdown()
+        maintenance.close()
+        db_writer.close()
         print("Server stopped.")
\ No newline at end of file
@@ -0,0 +1,342 @@
+import argparse
+import math
+import random
+import time
+from multiprocessing import Pool
+import chess
+import chess.pgn
+from chess_bot import ChessBot, TranspositionTable
+from uci_engine import time_budget
+import engine_locator
+
+DEFAULT_STOCKFISH_PATH = "stockfish"
+MAX_PLIES = 300
+
+
+def parse_player(spec):
+    """'bot:depth=4' or 'stockfish:elo=1500,depth=8' -> {'kind': ..., 'options': {...}, 'name': spec}"""
+    kind, _, option_text = spec.partition(":")
+    if kind not in ("bot", "stockfish"):
+        raise ValueError(f"Unknown player type '{kind}' (use bot or stockfish)")
+
+    options = {}
+    for item in filter(None, option_text.split(",")):
+        key, _, value = item.partition("=")
+        try:
+            options[key] = int(value)
+        except ValueError:
+            try:
+                options[key] = float(value)
+            except ValueError:
+                options[key] = value
+    return {"kind": kind, "options": options, "name": spec}
+
+
+def parse_time_control(text):
+    """'0.5' -> fixed seconds per move; '10+0.1' -> base seconds plus increment"""
+    if "+" in text:
+        base, increment = text.split("+", 1)
+        return {"base": float(base), "increment": float(increment)}
+    return {"movetime": float(text)}
+
+
+class BotPlayer:
+    def __init__(self, options):
+        self.bot = ChessBot()
+        self.max_depth = options.get("depth", 64)
+
+    def new_game(self):
+        self.bot.tt = TranspositionTable(self.bot.tt.size)
+
+    def choose_move(self, board, clock):
+        budget = time_budget(board, clock)
+        self.bot.time_limit = budget if budget is not None else float('inf')
+        self.bot.stop_requested = False
+        return self.bot.get_best_move(board, max_depth=self.max_depth)
+
+    def close(self):
+        pass
+
+
+class StockfishPlayer:
+    def __init__(self, options, path):
+        from stockfish import Stockfish
+        self.engine = Stockfish(options.get("path", path))
+        if "elo" in options:
+            self.engine.set_elo_rating(options["elo"])
+        if "skill" in options:
+            self.engine.set_skill_level(options["skill"])
+        self.depth = options.get("depth")
+
+    def new_game(self):
+        self.engine.send_ucinewgame_command()
+
+    def choose_move(self, board, clock):
+        self.engine.set_fen_position(board.fen())
+        if self.depth:
+            self.engine.set_depth(self.depth)
+            uci = self.engine.get_best_move()
+        elif "movetime" in clock:
+            uci = self.engine.get_best_move_time(clock["movetime"])
+        else:
+            uci = self.engine.get_best_move(wtime=clock["wtime"], btime=clock["btime"])
+        return chess.Move.from_uci(uci) if uci else None
+
+    def close(self):
+        self.engine.send_quit_command()
+
+
+def make_player(spec, stockfish_path):
+    if spec["kind"] == "bot":
+        return BotPlayer(spec["options"])
+    return StockfishPlayer(spec["options"], stockfish_path)
+
+
+def random_opening(rng, plies):
+    """Random legal moves from the start position, avoiding ones that end the game"""
+    board = chess.Board()
+    for _ in range(plies):
+        moves = list(board.legal_moves)
+        rng.shuffle(moves)
+        for move in moves:
+            board.push(move)
+            if not board.is_game_over():
+                break
+            board.pop()
+        else:
+            break
+    return [move.uci() for move in board.move_stack]
+
+
+def play_game(job):
+    """Play one game in a worker process and return its record"""
+    white_spec, black_spec = job["white"], job["black"]
+    players = {
+        chess.WHITE: make_player(white_spec, job["stockfish_path"]),
+        chess.BLACK: make_player(black_spec, job["stockfish_path"]),
+    }
+    time_control = job["time_control"]
+    board = chess.Board()
+    for uci in job["opening"]:
+        board.push_uci(uci)
+
+    remaining = {color: time_control.get("base", 0.0) for color in (chess.WHITE, chess.BLACK)}
+    think_time = {chess.WHITE: 0.0, chess.BLACK: 0.0}
+    result, reason = None, None
+
+    try:
+        for player in players.values():
+            player.new_game()
+
+        while result is None:
+            outcome = board.outcome(claim_draw=True)
+            if outcome:
+                result, reason = outcome.result(), outcome.termination.name.lower()
+                break
+            if len(board.move_stack) >= MAX_PLIES:
+                result, reason = "1/2-1/2", "max_plies"
+                break
+
+            if "movetime" in time_control:
+                clock = {"movetime": int(time_control["movetime"] * 1000)}
+            else:
+                clock = {"wtime": int(remaining[chess.WHITE] * 1000), "btime": int(remaining[chess.BLACK] * 1000),
+                         "winc": int(time_control["increment"] * 1000),
+                         "binc": int(time_control["increment"] * 1000)}
+
+            mover = board.turn
+            start = time.perf_counter()
+            move = players[mover].choose_move(board, clock)
+            elapsed = time.perf_counter() - start
+            think_time[mover] += elapsed
+
+            if "base" in time_control:
+                remaining[mover] -= elapsed
+                if remaining[mover] < 0:
+                    result, reason = ("0-1" if mover == chess.WHITE else "1-0"), "time_forfeit"
+                    break
+                remaining[mover] += time_control["increment"]
+
+            if move is None or move not in board.legal_moves:
+                result, reason = ("0-1" if mover == chess.WHITE else "1-0"), "illegal_move"
+                break
+            board.push(move)
+    finally:
+        for player in players.values():
+            player.close()
+
+    return {
+        "index": job["index"],
+        "white": white_spec["name"],
+        "black": black_spec["name"],
+        "opening": job["opening"],
+        "moves": [move.uci() for move in board.move_stack],
+        "result": result,
+        "reason": reason,
+        "think_time": {"white": think_time[chess.WHITE], "black": think_time[chess.BLACK]},
+    }
+
+
+def elo_from_score(score):
+    if score <= 0:
+        return float('-inf')
+    if score >= 1:
+        return float('inf')
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_from_elo(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def match_statistics(scores):
+    """Elo estimate with a 95% interval from per-game scores of the first player (1, 0.5, 0)"""
+    n = len(scores)
+    if n == 0:
+        return {"games": 0, "wins": 0, "draws": 0, "losses": 0, "score": 0.0, "elo": 0.0,
+                "elo_error": float('inf')}
+
+    mean = sum(scores) / n
+    variance = sum((s - mean) ** 2 for s in scores) / n
+    stderr = math.sqrt(variance / n)
+    low = min(max(mean - 1.96 * stderr, 1e-6), 1 - 1e-6)
+    high = min(max(mean + 1.96 * stderr, 1e-6), 1 - 1e-6)
+    return {
+        "games": n,
+        "wins": scores.count(1.0),
+        "draws": scores.count(0.5),
+        "losses": scores.count(0.0),
+        "score": mean,
+        "elo": elo_from_score(mean),
+        "elo_error": (elo_from_score(high) - elo_from_score(low)) / 2,
+    }
+
+
+def sprt_llr(scores, elo0, elo1):
+    """Log-likelihood ratio of H1 (elo1) against H0 (elo0), normal approximation"""
+    n = len(scores)
+    if n < 2:
+        return 0.0
+    mean = sum(scores) / n
+    variance = sum((s - mean) ** 2 for s in scores) / n
+    if variance == 0:
+        return 0.0
+    s0, s1 = score_from_elo(elo0), score_from_elo(elo1)
+    return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def score_for(record, first_is_white):
+    """Score of the first player in one game record"""
+    points = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}[record["result"]]
+    return points if first_is_white else 1.0 - points
+
+
+def build_jobs(args, first, second):
+    """Game pairs: each opening is played twice with colours swapped"""
+    rng = random.Random(args.seed)
+    jobs = []
+    for pair in range((args.games + 1) // 2):
+        opening = random_opening(rng, args.opening_plies)
+        for swap in (False, True):
+            if len(jobs) >= args.games:
+                break
+            white, black = (second, first) if swap else (first, second)
+            jobs.append({
+                "index": len(jobs),
+                "white": white,
+                "black": black,
+                "opening": opening,
+                "time_control": parse_time_control(args.tc),
+                "stockfish_path": args.stockfish,
+            })
+    return jobs
+
+
+def write_pgn(records, path):
+    with open(path, "w", encoding="utf8") as f:
+        for record in sorted(records, key=lambda r: r["index"]):
+            game = chess.pgn.Game()
+            game.headers["Event"] = "chess_tournament"
+            game.headers["Round"] = str(record["index"] + 1)
+            game.headers["White"] = record["white"]
+            game.headers["Black"] = record["black"]
+            game.headers["Result"] = record["result"]
+            game.headers["Termination"] = record["reason"]
+            node = game
+            for uci in record["moves"]:
+                node = node.add_variation(chess.Move.from_uci(uci))
+            print(game, file=f, end="\n\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play ChessBot configurations against each other or Stockfish")
+    parser.add_argument("first", help="player spec, e.g. bot:depth=4")
+    parser.add_argument("second", help="player spec, e.g. bot:depth=3 or stockfish:elo=1350")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=2, help="games played in parallel processes")
+    parser.add_argument("--tc", default="0.5", help="seconds per move ('0.5') or base+increment ('10+0.1')")
+    parser.add_argument("--opening-plies", type=int, default=4, help="random plies played before each game pair")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stockfish", help="path to the Stockfish binary (default: auto-detect)")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"),
+                        help="stop early once the SPRT accepts H0 (elo0) or H1 (elo1)")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--pgn", help="write finished games to this PGN file")
+    args = parser.parse_args(argv)
+
+    first, second = parse_player(args.first), parse_player(args.second)
+    if args.stockfish is None:
+        args.stockfish = engine_locator.find_stockfish() or DEFAULT_STOCKFISH_PATH
+    if first["name"] == second["name"]:
+        second["name"] += " (2)"
+    jobs = build_jobs(args, first, second)
+
+    records = []
+    scores = []
+    verdict = None
+    lower, upper = sprt_bounds(args.alpha, args.beta)
+    start = time.time()
+
+    with Pool(processes=max(1, args.concurrency)) as pool:
+        for record in pool.imap_unordered(play_game, jobs):
+            records.append(record)
+            scores.append(score_for(record, record["white"] == first["name"]))
+            stats = match_statistics(scores)
+            line = (f"game {len(records)}/{len(jobs)}: {record['white']} vs {record['black']} "
+                    f"{record['result']} ({record['reason']})  "
+                    f"+{stats['wins']} ={stats['draws']} -{stats['losses']}  "
+                    f"elo {stats['elo']:+.1f} +/- {stats['elo_error']:.1f}")
+            if args.sprt:
+                llr = sprt_llr(scores, *args.sprt)
+                line += f"  llr {llr:.2f} [{lower:.2f}, {upper:.2f}]"
+                if llr >= upper:
+                    verdict = "H1 accepted"
+                elif llr <= lower:
+                    verdict = "H0 accepted"
+            print(line, flush=True)
+            if verdict:
+                pool.terminate()
+                break
+
+    stats = match_statistics(scores)
+    first_time = sum(r["think_time"]["white" if r["white"] == first["name"] else "black"] for r in records)
+    second_time = sum(r["think_time"]["black" if r["white"] == first["name"] else "white"] for r in records)
+    print()
+    print(f"{first['name']} vs {second['name']}: {stats['games']} games in {time.time() - start:.1f}s")
+    print(f"+{stats['wins']} ={stats['draws']} -{stats['losses']}  score {stats['score']:.3f}  "
+          f"elo {stats['elo']:+.1f} +/- {stats['elo_error']:.1f}")
+    print(f"thinking time: {first['name']} {first_time:.1f}s, {second['name']} {second_time:.1f}s")
+    if args.sprt:
+        print(f"SPRT [{args.sprt[0]}, {args.sprt[1]}]: {verdict or 'inconclusive'}")
+
+    if args.pgn:
+        write_pgn(records, args.pgn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from SQLL_database import UserDatabase, MIGRATIONS, apply_migrations, schema_version
+
+USERNAMES = 10000
+# attempt_time values are spread over this many seconds before "now"
+TIME_SPAN = 90 * 24 * 3600
+
+
+def populate(conn, attempts, pending, resets, seed=1):
+    """Fill the tables with synthetic rows (timestamps as SQLite text, like CURRENT_TIMESTAMP writes)"""
+    rng = random.Random(seed)
+    now = time.time()
+
+    def attempt_rows():
+        for _ in range(attempts):
+            t = now - rng.random() * TIME_SPAN
+            yield (f"user{rng.randrange(USERNAMES)}", f"10.0.{rng.randrange(256)}.{rng.randrange(256)}",
+                   time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(t)), rng.random() < 0.7)
+
+    conn.executemany("INSERT INTO login_attempts (username, ip_address, attempt_time, successful) VALUES (?, ?, ?, ?)",
+                     attempt_rows())
+    conn.executemany(
+        "INSERT INTO pending_users (username, email, password_hash, salt, verification_code, expires_at) "
+        "VALUES (?, ?, 'x', 'x', '123456', ?)",
+        ((f"pending{i}", f"pending{i}@example.com", now + rng.uniform(-TIME_SPAN, 1800)) for i in range(pending)))
+    conn.executemany(
+        "INSERT INTO password_resets (email, reset_code, expires_at) VALUES (?, '123456', ?)",
+        ((f"user{rng.randrange(USERNAMES)}@example.com", now + rng.uniform(-TIME_SPAN, 1800)) for _ in range(resets)))
+    conn.commit()
+
+
+def drop_migrated_indexes(conn):
+    """Return the database to the pre-index schema (version 0) to measure the baseline"""
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall():
+        conn.execute(f"DROP INDEX {name}")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+
+
+def hot_queries(rng):
+    """(label, sql, params) for the lookups the app runs per login / reset / cleanup"""
+    username = f"user{rng.randrange(USERNAMES)}"
+    since = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - 900))
+    return [
+        ("latest attempt for user",
+         "SELECT id FROM login_attempts WHERE username = ? ORDER BY attempt_time DESC LIMIT 1", (username,)),
+        ("recent failures for user",
+         "SELECT COUNT(*) FROM login_attempts WHERE username = ? AND attempt_time > ? AND successful = FALSE",
+         (username, since)),
+        ("reset code lookup",
+         "SELECT expires_at FROM password_resets WHERE email = ? AND reset_code = ?",
+         (f"{username}@example.com", "123456")),
+        ("expired pending users",
+         "SELECT COUNT(*) FROM pending_users WHERE expires_at < ?", (time.time() - TIME_SPAN / 2,)),
+    ]
+
+
+def time_queries(conn, repeat, seed=2):
+    """Mean milliseconds per hot query"""
+    rng = random.Random(seed)
+    totals = {}
+    for _ in range(repeat):
+        for label, sql, params in hot_queries(rng):
+            start = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            totals[label] = totals.get(label, 0.0) + time.perf_counter() - start
+    return {label: total / repeat * 1000 for label, total in totals.items()}
+
+
+def query_plan(conn, sql, params):
+    return "; ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the UserDatabase hot queries before and after the index migration")
+    parser.add_argument("--attempts", type=int, default=1000000, help="rows in login_attempts")
+    parser.add_argument("--pending", type=int, default=100000, help="rows in pending_users")
+    parser.add_argument("--resets", type=int, default=100000, help="rows in password_resets")
+    parser.add_argument("--repeat", type=int, default=50, help="times each query is run per phase")
+    parser.add_argument("--db", help="database file to create (default: a temporary file)")
+    args = parser.parse_args(argv)
+
+    directory = None
+    if args.db:
+        path = args.db
+    else:
+        directory = tempfile.TemporaryDirectory()
+        path = os.path.join(directory.name, "benchmark.db")
+
+    try:
+        UserDatabase(path)
+        conn = sqlite3.connect(path)
+        start = time.perf_counter()
+        populate(conn, args.attempts, args.pending, args.resets)
+        print(f"populated {args.attempts} login attempts, {args.pending} pending users, {args.resets} reset codes "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        drop_migrated_indexes(conn)
+        before = time_queries(conn, args.repeat)
+
+        start = time.perf_counter()
+        apply_migrations(conn)
+        print(f"migrated to schema version {schema_version(conn)}/{len(MIGRATIONS)} "
+              f"in {time.perf_counter() - start:.1f}s")
+        after = time_queries(conn, args.repeat)
+
+        print()
+        print(f"{'query':<28}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+        for label in before:
+            speedup = before[label] / after[label] if after[label] > 0 else float('inf')
+            print(f"{label:<28}{before[label]:>12.3f}{after[label]:>12.3f}{speedup:>9.0f}x")
+
+        print()
+        for label, sql, params in hot_queries(random.Random(3)):
+            print(f"{label}: {query_plan(conn, sql, params)}")
+        conn.close()
+    finally:
+        if directory:
+            directory.cleanup()
+
+
+if __name__ == "__main__":
+    main()
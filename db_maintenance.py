@@ -0,0 +1,134 @@
+import argparse
+import threading
+import time
+from datetime import datetime
+from SQLL_database import UserDatabase, EXPIRING_TABLES, delete_expired, get_connection_pool
+
+SWEEP_INTERVAL = 600.0
+# Rows deleted per transaction. Each batch rewrites most of the unique email/username index pages, so smaller
+# batches cost more in total but hold the write lock for less time (1000 rows: ~30 ms)
+SWEEP_BATCH = 1000
+# Free pages returned to the OS per sweep (4 KB each by default)
+VACUUM_PAGES = 1000
+
+
+class MaintenanceSweeper:
+    """Periodically deletes expired pending users and reset codes, returns freed pages to the OS
+    and refreshes the query planner statistics (PRAGMA optimize)"""
+
+    def __init__(self, db_file="user_data.db", interval=SWEEP_INTERVAL, batch_size=SWEEP_BATCH,
+                 vacuum_pages=VACUUM_PAGES, clock=time.time):
+        # Make sure the schema exists before the first sweep
+        UserDatabase(db_file)
+        self.pool = get_connection_pool(db_file)
+        self.interval = interval
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.clock = clock
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+        self.last_run = None
+        self.totals = {"runs": 0, "rows_deleted": 0, "pages_freed": 0, "seconds": 0.0, "errors": 0}
+
+    def sweep(self):
+        """One maintenance pass; returns its metrics"""
+        start = time.perf_counter()
+        conn = self.pool.acquire()
+        try:
+            now = self.clock()
+            deleted = {table: delete_expired(conn, table, now, self.batch_size) for table in EXPIRING_TABLES}
+
+            pages_freed = 0
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                # incremental_vacuum frees one page per step and execute() only steps a row-less statement once;
+                # executescript runs it to completion
+                conn.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+                pages_freed = free_before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+            conn.execute("PRAGMA optimize")
+        finally:
+            self.pool.release(conn)
+
+        metrics = {"deleted": deleted, "pages_freed": pages_freed, "seconds": time.perf_counter() - start,
+                   "finished_at": datetime.now()}
+        self.last_run = metrics
+        self.totals["runs"] += 1
+        self.totals["rows_deleted"] += sum(deleted.values())
+        self.totals["pages_freed"] += pages_freed
+        self.totals["seconds"] += metrics["seconds"]
+        return metrics
+
+    def run(self):
+        while self.running:
+            try:
+                metrics = self.sweep()
+                if sum(metrics["deleted"].values()) or metrics["pages_freed"]:
+                    print(f"Maintenance: {format_metrics(metrics)}")
+            except Exception as e:
+                self.totals["errors"] += 1
+                print(f"Maintenance sweep failed: {e}")
+            self.wake.wait(self.interval)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stats(self):
+        return {"totals": dict(self.totals), "last_run": self.last_run}
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+
+
+def format_metrics(metrics):
+    deleted = ", ".join(f"{rows} {table}" for table, rows in metrics["deleted"].items())
+    return f"deleted {deleted}; freed {metrics['pages_freed']} pages in {metrics['seconds'] * 1000:.1f} ms"
+
+
+def enable_incremental_vacuum(db_file):
+    """Switch an existing file to auto_vacuum=INCREMENTAL; needs a full VACUUM, so run it while the server is down"""
+    pool = get_connection_pool(db_file)
+    conn = pool.acquire()
+    try:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    finally:
+        pool.release(conn)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Delete expired rows and compact the user database")
+    parser.add_argument("--db", default="user_data.db")
+    parser.add_argument("--interval", type=float, help="keep running, sweeping every this many seconds")
+    parser.add_argument("--batch-size", type=int, default=SWEEP_BATCH, help="rows deleted per transaction")
+    parser.add_argument("--vacuum-pages", type=int, default=VACUUM_PAGES, help="free pages released per sweep")
+    parser.add_argument("--convert", action="store_true",
+                        help="first enable incremental vacuum on an existing file (runs a full VACUUM)")
+    args = parser.parse_args(argv)
+
+    if args.convert:
+        print("incremental vacuum enabled" if enable_incremental_vacuum(args.db) else "could not enable incremental vacuum")
+
+    sweeper = MaintenanceSweeper(args.db, args.interval or SWEEP_INTERVAL, args.batch_size, args.vacuum_pages)
+    if args.interval is None:
+        print(format_metrics(sweeper.sweep()))
+        return
+
+    sweeper.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        sweeper.close()
+        print(sweeper.stats()["totals"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from SQLL_database import UserDatabase, get_connection_pool
+
+# How long the first queued write waits for others to share its transaction
+FLUSH_MS = 50
+# Callers block once this many writes are queued, so a stalled disk can't grow memory without bound
+MAX_PENDING = 10000
+MAX_BATCH = 1000
+
+
+class DatabaseWriter:
+    """Single writer thread for the server: callers queue an operation and get a Future right away,
+    and the thread runs everything queued within flush_ms in one transaction.
+
+    An operation is a function(cursor, *args) such as SQLL_database.insert_games. Each one runs in its own
+    savepoint, so one that fails is rolled back and reported on its Future without losing the others.
+    A Future only completes once its transaction has committed.
+    """
+
+    def __init__(self, db_file="user_data.db", flush_ms=FLUSH_MS, max_pending=MAX_PENDING, max_batch=MAX_BATCH):
+        # Make sure the schema exists before the first write
+        UserDatabase(db_file)
+        self.pool = get_connection_pool(db_file)
+        self.flush_ms = flush_ms
+        self.max_batch = max_batch
+        self.jobs = queue.Queue(max_pending)
+        self.running = True
+        self.counters = {"writes": 0, "failed": 0, "transactions": 0, "largest_batch": 0}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, operation, *args):
+        """Queue operation(cursor, *args); the Future gets its return value"""
+        if not self.running:
+            raise RuntimeError("Database writer is closed")
+        future = Future()
+        self.jobs.put((operation, args, future))
+        return future
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is committed"""
+        self.submit(lambda cursor: None).result(timeout)
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            batch = [job]
+            deadline = time.monotonic() + self.flush_ms / 1000
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    job = self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stop = True
+                    break
+                batch.append(job)
+            self.write_batch(batch)
+            if stop:
+                break
+
+    def write_batch(self, batch):
+        conn = self.pool.acquire()
+        cursor = conn.cursor()
+        results = []
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            for operation, args, future in batch:
+                cursor.execute("SAVEPOINT operation")
+                try:
+                    results.append((future, operation(cursor, *args), None))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO operation")
+                    results.append((future, None, e))
+                cursor.execute("RELEASE operation")
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"Database writer: batch of {len(batch)} failed: {e}")
+            conn.rollback()
+            results = [(future, None, e) for _, _, future in batch]
+        finally:
+            self.pool.release(conn)
+
+        self.counters["transactions"] += 1
+        self.counters["largest_batch"] = max(self.counters["largest_batch"], len(batch))
+        for future, result, error in results:
+            if error is None:
+                self.counters["writes"] += 1
+                future.set_result(result)
+            else:
+                self.counters["failed"] += 1
+                future.set_exception(error)
+
+    def stats(self):
+        stats = dict(self.counters)
+        stats["queued"] = self.jobs.qsize()
+        return stats
+
+    def close(self):
+        """Write everything still queued, then stop the thread"""
+        if not self.running:
+            return
+        self.running = False
+        self.jobs.put(None)
+        self.thread.join()
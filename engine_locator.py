@@ -0,0 +1,105 @@
+import os
+import platform
+import shutil
+import threading
+
+# Environment variable that points at a specific Stockfish binary
+PATH_ENV_VAR = "STOCKFISH_PATH"
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Official Stockfish x86-64 builds from fastest to most compatible, with the CPU flags each one needs
+BUILD_VARIANTS = [
+    ("avx512", {"avx512f", "avx512bw"}),
+    ("bmi2", {"bmi2", "avx2"}),
+    ("avx2", {"avx2"}),
+    ("sse41-popcnt", {"sse4_1", "popcnt"}),
+    ("", set()),
+]
+# Where distribution packages install Stockfish when it isn't on PATH
+SYSTEM_LOCATIONS = ["/usr/games/stockfish", "/usr/local/bin/stockfish", "/opt/homebrew/bin/stockfish"]
+
+_lock = threading.Lock()
+_cpu_flags = None
+_resolved = {}
+_failed = set()
+
+
+def cpu_flags():
+    """Instruction set flags of this CPU (read once; empty when they can't be probed)"""
+    global _cpu_flags
+    if _cpu_flags is None:
+        flags = set()
+        try:
+            with open("/proc/cpuinfo") as f:
+                for line in f:
+                    if line.startswith("flags"):
+                        flags.update(line.split(":", 1)[1].split())
+                        break
+        except OSError:
+            pass
+        _cpu_flags = flags
+    return _cpu_flags
+
+
+def platform_name():
+    system = platform.system()
+    if system == "Windows":
+        return "windows"
+    if system == "Darwin":
+        return "macos"
+    return "ubuntu"
+
+
+def supported_variants():
+    """Build variants this machine can run, best first"""
+    flags = cpu_flags()
+    if not flags and platform_name() == "windows":
+        # No cpuinfo on Windows: the bundled avx2 build is what the app always shipped with
+        return ["avx2", "sse41-popcnt", ""]
+    return [variant for variant, needed in BUILD_VARIANTS if needed <= flags]
+
+
+def bundled_candidates(base_dir=BASE_DIR):
+    """Paths of the release builds unpacked next to the app, in preference order"""
+    system = platform_name()
+    extension = ".exe" if system == "windows" else ""
+    candidates = []
+    for variant in supported_variants():
+        name = f"stockfish-{system}-x86-64" + (f"-{variant}" if variant else "")
+        candidates.append(os.path.join(base_dir, name, "stockfish", name + extension))
+        candidates.append(os.path.join(base_dir, name, name + extension))
+    return candidates
+
+
+def is_executable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def candidate_paths():
+    configured = os.environ.get(PATH_ENV_VAR)
+    if configured:
+        yield configured
+    yield from bundled_candidates()
+    installed = shutil.which("stockfish")
+    if installed:
+        yield installed
+    yield from SYSTEM_LOCATIONS
+
+
+def find_stockfish(refresh=False):
+    """Path of the best usable Stockfish binary, or None; the answer is cached"""
+    with _lock:
+        if refresh:
+            _resolved.clear()
+            _failed.clear()
+        if "stockfish" not in _resolved:
+            _resolved["stockfish"] = next(
+                (path for path in candidate_paths() if path not in _failed and is_executable(path)), None)
+        return _resolved["stockfish"]
+
+
+def report_failure(path):
+    """A binary failed to start: skip it from now on instead of retrying the spawn"""
+    with _lock:
+        _failed.add(path)
+        _resolved.pop("stockfish", None)
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+import chess
+
+DEFAULT_MAX_SIZE = 4096
+DEFAULT_TTL = 3600.0
+
+
+def position_key(fen):
+    """The position part of a FEN (board, turn, castling, en passant) without the move counters"""
+    return chess.Board(fen).epd()
+
+
+class EvaluationCache:
+    """Thread-safe LRU cache of engine answers keyed by (position, engine profile), with expiry"""
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (stored_at, value)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, fen, profile=None):
+        """Cached value for the position under this profile, or None"""
+        key = (position_key(fen), profile)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.ttl is not None and self.clock() - entry[0] > self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, fen, value, profile=None):
+        key = (position_key(fen), profile)
+        with self.lock:
+            self.entries[key] = (self.clock(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hit_rate(), "evictions": self.evictions, "expirations": self.expirations}
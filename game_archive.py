@@ -0,0 +1,96 @@
+import argparse
+import sys
+from datetime import datetime, timezone
+import chess
+import chess.pgn
+from SQLL_database import UserDatabase, insert_games
+
+EVENT_NAME = "chess master"
+
+
+class GameArchive:
+    """Stores finished games through the server's DatabaseWriter, so recording a game never waits for the disk
+    and games finishing close together share one transaction"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.stored = 0
+        self.failed = 0
+
+    def record(self, white, black, result, termination, moves, started_at=None, time_control=None):
+        """Queue one finished game (moves: chess.Move or UCI strings); returns the Future of the write"""
+        game = {
+            "white": white, "black": black, "result": result, "termination": termination,
+            "time_control": time_control, "moves": [str(move) for move in moves],
+            "started_at": started_at, "ended_at": datetime.now(timezone.utc),
+        }
+        future = self.writer.submit(insert_games, [game])
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, future):
+        error = future.exception()
+        if error is None:
+            self.stored += future.result()
+        else:
+            self.failed += 1
+            print(f"Failed to store a game: {error}")
+
+
+def game_to_pgn(record):
+    """chess.pgn.Game for a stored game dict (see UserDatabase.iter_games)"""
+    game = chess.pgn.Game()
+    ended_at = record.get("ended_at") or ""
+    game.headers["Event"] = EVENT_NAME
+    game.headers["Site"] = "?"
+    game.headers["Date"] = ended_at[:10].replace("-", ".") if ended_at else "????.??.??"
+    game.headers["Round"] = "-"
+    game.headers["White"] = record["white"]
+    game.headers["Black"] = record["black"]
+    game.headers["Result"] = record["result"]
+    if record.get("time_control"):
+        game.headers["TimeControl"] = record["time_control"]
+    if record.get("termination"):
+        game.headers["Termination"] = record["termination"]
+
+    node = game
+    board = chess.Board()
+    for uci in record["moves"]:
+        move = chess.Move.from_uci(uci)
+        if move not in board.legal_moves:
+            # Games end on an illegal move the server refused; stop the movetext there
+            break
+        board.push(move)
+        node = node.add_variation(move)
+    return game
+
+
+def export_pgn(db, out, player=None, since=None):
+    """Write stored games as PGN to the file object out; returns the number of games"""
+    count = 0
+    exporter = chess.pgn.FileExporter(out)
+    for record in db.iter_games(player=player, since=since):
+        game_to_pgn(record).accept(exporter)
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export stored games as PGN")
+    parser.add_argument("--db", default="user_data.db")
+    parser.add_argument("--player", help="only games of this username")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only games ended at or after this UTC date")
+    parser.add_argument("-o", "--output", help="PGN file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    db = UserDatabase(args.db)
+    if args.output:
+        with open(args.output, "w", encoding="utf8") as f:
+            count = export_pgn(db, f, args.player, args.since)
+    else:
+        count = export_pgn(db, sys.stdout, args.player, args.since)
+    print(f"exported {count} games", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
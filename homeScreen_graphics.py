@@ -4,17 +4,22 @@ from PIL import Image, ImageTk
 import math
 import chess_client_graphics
 import chess_engine_bot
-from SQLL_database import UserDatabase
+import auth_client
 
 player_name = "Player1"  # Default player name
 player_rating = 0  # Default rating
 
 
+def accounts():
+    """The server connection sign-in made; running this module directly falls back to the client's server"""
+    return auth_client.accounts or auth_client.connect(chess_client_graphics.HOST, chess_client_graphics.PORT)
+
+
 def show_profile_overlay():
     global player_name, player_rating
 
-    # Get current rating from database
-    db = UserDatabase()
+    # Get current rating from the server
+    db = accounts()
     _, current_rating = db.get_rating(player_name)
 
     # Update global player_rating if we got a valid rating
@@ -105,11 +110,9 @@ def show_profile_overlay():
     def save_profile():
         global player_name, player_rating
         new_name = name_entry.get()
-        # Import the database class
-        from SQLL_database import UserDatabase
-        db = UserDatabase()
+        db = accounts()
 
-        # Update username in database
+        # Update username on the server
         success, message = db.update_username(player_name, new_name)
 
         if success:
@@ -165,6 +168,7 @@ def play_with_bot():
 
 def exit_game():
     chess_client_graphics.stop_client()
+    chess_engine_bot.cleanup_stockfish()
     window.quit()
 
 
@@ -380,10 +384,10 @@ def create_home_screen():
 
 def return_to_homescreen():
     global player_name, player_rating
-    db = UserDatabase()
+    db = accounts()
     _, current_rating = db.get_rating(player_name)
 
-    # Update player_rating with current value from database
+    # Update player_rating with current value from the server
     if current_rating and str(current_rating).isdigit():
         player_rating = current_rating
     else:
@@ -408,7 +412,7 @@ def run_home_screen(parent_window=None, username="Player1"):
 
     # Update the player name with the provided username
     player_name = username
-    db = UserDatabase()
+    db = accounts()
     _, current_rating = db.get_rating(player_name)
 
     # Update player_rating with proper type checking
@@ -0,0 +1,149 @@
+import argparse
+import bisect
+import threading
+import time
+from SQLL_database import UserDatabase
+
+TOP_N = 10
+PAGE_SIZE = 20
+# Reload from the database after this long, to pick up new and deactivated accounts
+MAX_AGE = 300.0
+
+
+class Leaderboard:
+    """Active players ordered by rating, kept in memory as a sorted list of (-rating, username).
+
+    rank() is a binary search and page() a slice, so neither depends on the number of players.
+    The top N is materialized and only rebuilt after a rating change that can affect it.
+    """
+
+    def __init__(self, db=None, top_n=TOP_N, max_age=MAX_AGE, clock=time.monotonic):
+        self.db = db or UserDatabase()
+        self.top_n = top_n
+        self.max_age = max_age
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = []
+        self.ratings = {}
+        self.loaded_at = None
+        self.top_cache = None
+        self.counters = {"loads": 0, "updates": 0, "top_rebuilds": 0}
+
+    def load(self):
+        """Read every active player, in index order so no sort is needed"""
+        with self.lock:
+            # Read under the lock, so an update() can't land between the read and the swap and be lost
+            # LIMIT -1 is SQLite for no limit
+            entries = [(-rating, username) for username, rating in self.db.top_players(-1)]
+            self.entries = entries
+            self.ratings = {username: -negative for negative, username in entries}
+            self.loaded_at = self.clock()
+            self.top_cache = None
+            self.counters["loads"] += 1
+
+    def _ensure_loaded(self):
+        if self.loaded_at is None or self.clock() - self.loaded_at > self.max_age:
+            self.load()
+
+    def update(self, new_ratings):
+        """Apply {username: new_rating} after a rating change (see RatingService)"""
+        with self.lock:
+            if self.loaded_at is None:
+                return
+            for username, rating in new_ratings.items():
+                old = self.ratings.get(username)
+                if old is not None:
+                    index = bisect.bisect_left(self.entries, (-old, username))
+                    del self.entries[index]
+                    old_index = index
+                else:
+                    old_index = len(self.entries)
+                new_index = bisect.bisect_left(self.entries, (-rating, username))
+                self.entries.insert(new_index, (-rating, username))
+                self.ratings[username] = rating
+                if min(old_index, new_index) < self.top_n:
+                    self.top_cache = None
+            self.counters["updates"] += 1
+
+    def rename(self, old_username, new_username):
+        """Move a player's entry to their new name (see UserDatabase.update_username)"""
+        with self.lock:
+            rating = self.ratings.pop(old_username, None)
+            if rating is None:
+                return
+            del self.entries[bisect.bisect_left(self.entries, (-rating, old_username))]
+            bisect.insort(self.entries, (-rating, new_username))
+            self.ratings[new_username] = rating
+            self.top_cache = None
+
+    def top(self):
+        """[(rank, username, rating)] for the best top_n players"""
+        self._ensure_loaded()
+        with self.lock:
+            if self.top_cache is None:
+                self.top_cache = self._ranked(0, self.top_n)
+                self.counters["top_rebuilds"] += 1
+            return self.top_cache
+
+    def page(self, number, per_page=PAGE_SIZE):
+        """[(rank, username, rating)] for page number (from 1)"""
+        self._ensure_loaded()
+        with self.lock:
+            return self._ranked((number - 1) * per_page, per_page)
+
+    def rank(self, username):
+        """(rank, rating) of a player, or None; equal ratings share a rank"""
+        self._ensure_loaded()
+        with self.lock:
+            rating = self.ratings.get(username)
+            if rating is None:
+                return None
+            return bisect.bisect_left(self.entries, (-rating,)) + 1, rating
+
+    def page_of(self, username, per_page=PAGE_SIZE):
+        """Page number that lists the player, or None"""
+        self._ensure_loaded()
+        with self.lock:
+            rating = self.ratings.get(username)
+            if rating is None:
+                return None
+            return bisect.bisect_left(self.entries, (-rating, username)) // per_page + 1
+
+    def size(self):
+        self._ensure_loaded()
+        return len(self.entries)
+
+    def _ranked(self, start, count):
+        rows = []
+        for index in range(start, min(start + count, len(self.entries))):
+            negative, username = self.entries[index]
+            # Competition ranking: the rank is one more than the number of players with a higher rating
+            rank = bisect.bisect_left(self.entries, (negative,)) + 1
+            rows.append((rank, username, -negative))
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the leaderboard")
+    parser.add_argument("--db", default="user_data.db")
+    parser.add_argument("--page", type=int, default=1)
+    parser.add_argument("--per-page", type=int, default=PAGE_SIZE)
+    parser.add_argument("--player", help="show this player's rank and their page")
+    args = parser.parse_args(argv)
+
+    board = Leaderboard(UserDatabase(args.db))
+    page = args.page
+    if args.player:
+        found = board.rank(args.player)
+        if found is None:
+            print(f"{args.player} is not ranked")
+            return
+        print(f"{args.player}: rank {found[0]} of {board.size()} with {found[1]}")
+        page = board.page_of(args.player, args.per_page)
+
+    for rank, username, rating in board.page(page, args.per_page):
+        print(f"{rank:>6}. {username:<24} {rating:>6}")
+
+
+if __name__ == "__main__":
+    main()
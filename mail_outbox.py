@@ -0,0 +1,223 @@
+import atexit
+import heapq
+import itertools
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import Future
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 587
+# The account codes are mailed from (for Gmail, an app password). Never commit these; without both,
+# mail is kept locally instead of sent (see make_outbox)
+SENDER_ENV_VAR = "CHESS_MAIL_SENDER"
+PASSWORD_ENV_VAR = "CHESS_MAIL_PASSWORD"
+# From address of mail that is only kept locally
+LOCAL_SENDER = "chess@localhost"
+# "smtp" (default) or "local"; local keeps mail in memory / writes .eml files instead of sending it
+TRANSPORT_ENV_VAR = "CHESS_MAIL_TRANSPORT"
+LOCAL_OUTBOX_DIR_ENV_VAR = "CHESS_MAIL_DIR"
+
+MAX_ATTEMPTS = 5
+BACKOFF = 2.0
+MAX_BACKOFF = 60.0
+# Close the SMTP connection after this long without mail; the next message reconnects
+IDLE_TIMEOUT = 60.0
+
+
+def build_message(sender, recipient, subject, body):
+    msg = MIMEMultipart()
+    msg["From"] = sender
+    msg["To"] = recipient
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "plain"))
+    return msg.as_string()
+
+
+def is_permanent(error):
+    """5xx replies (bad address, rejected login) won't change on a retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SMTPTransport:
+    """One logged-in SMTP connection, reused for every message until it drops or sits idle"""
+
+    def __init__(self, username, password, host=SMTP_HOST, port=SMTP_PORT, idle_timeout=IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.server = None
+        self.last_used = 0.0
+        self.connects = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.starttls()
+        server.login(self.username, self.password)
+        self.server = server
+        self.connects += 1
+
+    def send(self, sender, recipient, message):
+        if self.server is None:
+            self._connect()
+        try:
+            self.server.sendmail(sender, recipient, message)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+            # The server dropped the reused connection; one fresh connection before giving up.
+            # Not OSError: every SMTPException is one, and a refused recipient or message must reach the
+            # Outbox as it is, so permanent failures aren't retried
+            self.close()
+            self._connect()
+            self.server.sendmail(sender, recipient, message)
+        self.last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self.server is not None and time.monotonic() - self.last_used > self.idle_timeout:
+            self.close()
+
+    def close(self):
+        if self.server is not None:
+            try:
+                self.server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.server = None
+
+
+class LocalTransport:
+    """Stand-in for SMTP in tests and offline development: keeps every message, optionally as .eml files"""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.sent = []
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def send(self, sender, recipient, message):
+        self.sent.append((sender, recipient, message))
+        if self.directory:
+            path = os.path.join(self.directory, f"{len(self.sent):06d}-{recipient}.eml")
+            with open(path, "w", encoding="utf8") as f:
+                f.write(message)
+
+    def close_if_idle(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Outbox:
+    """Sends mail on a background thread so callers never wait for the mail server.
+    Failed messages are retried with exponential backoff; send() returns a Future that completes
+    once the message is accepted or has failed for good."""
+
+    def __init__(self, transport, sender, max_attempts=MAX_ATTEMPTS, backoff=BACKOFF,
+                 max_backoff=MAX_BACKOFF):
+        self.transport = transport
+        self.sender = sender
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.queue = []  # heap of (due time, sequence, message dict)
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+        self.running = True
+        self.counters = {"queued": 0, "sent": 0, "retries": 0, "failed": 0}
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def send(self, recipient, subject, body):
+        future = Future()
+        message = {"recipient": recipient, "text": build_message(self.sender, recipient, subject, body),
+                   "attempts": 0, "future": future}
+        with self.condition:
+            if not self.running:
+                raise RuntimeError("Outbox is closed")
+            heapq.heappush(self.queue, (time.monotonic(), next(self.sequence), message))
+            self.counters["queued"] += 1
+            self.condition.notify()
+        return future
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.queue and not self.running:
+                        return
+                    now = time.monotonic()
+                    if self.queue and self.queue[0][0] <= now:
+                        _, _, message = heapq.heappop(self.queue)
+                        break
+                    timeout = self.queue[0][0] - now if self.queue else getattr(self.transport, "idle_timeout", None)
+                    if not self.condition.wait(timeout):
+                        self.transport.close_if_idle()
+            self.deliver(message)
+
+    def deliver(self, message):
+        message["attempts"] += 1
+        try:
+            self.transport.send(self.sender, message["recipient"], message["text"])
+        except Exception as e:
+            if is_permanent(e) or message["attempts"] >= self.max_attempts or not self.running:
+                self.counters["failed"] += 1
+                print(f"Giving up on mail to {message['recipient']} after {message['attempts']} attempts: {e}")
+                message["future"].set_exception(e)
+                return
+            delay = min(self.max_backoff, self.backoff * 2 ** (message["attempts"] - 1))
+            delay *= random.uniform(0.5, 1.0)
+            print(f"Mail to {message['recipient']} failed ({e}), retrying in {delay:.1f}s")
+            self.counters["retries"] += 1
+            with self.condition:
+                heapq.heappush(self.queue, (time.monotonic() + delay, next(self.sequence), message))
+            return
+        self.counters["sent"] += 1
+        message["future"].set_result(message["attempts"])
+
+    def stats(self):
+        with self.condition:
+            stats = dict(self.counters)
+            stats["pending"] = len(self.queue)
+        return stats
+
+    def close(self, timeout=None):
+        """Deliver what is already due (retries waiting on backoff get one last attempt), then stop"""
+        with self.condition:
+            self.running = False
+            self.queue = [(0.0, sequence, message) for _, sequence, message in self.queue]
+            heapq.heapify(self.queue)
+            self.condition.notify()
+        self.thread.join(timeout)
+        self.transport.close()
+
+
+def make_outbox():
+    sender = os.environ.get(SENDER_ENV_VAR)
+    password = os.environ.get(PASSWORD_ENV_VAR)
+    if os.environ.get(TRANSPORT_ENV_VAR, "smtp").lower() != "local":
+        if sender and password:
+            return Outbox(SMTPTransport(sender, password), sender)
+        print(f"Mail: {SENDER_ENV_VAR} and {PASSWORD_ENV_VAR} are not set, so mail is kept locally, not sent")
+    return Outbox(LocalTransport(os.environ.get(LOCAL_OUTBOX_DIR_ENV_VAR)), sender or LOCAL_SENDER)
+
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+
+def get_outbox():
+    """The process-wide outbox, started on first use"""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = make_outbox()
+            atexit.register(_outbox.close, 10)
+        return _outbox
@@ -0,0 +1,33 @@
+import struct
+import chess
+
+# A move packs into 16 bits: from square (6) | to square (6) << 6 | promotion piece type (3) << 12.
+# Decoding needs no board, so a stored game can be read back without replaying it, and any move
+# (including the null move, which packs to 0) round-trips.
+FROM_MASK = 0x3F
+TO_SHIFT = 6
+PROMOTION_SHIFT = 12
+
+
+def encode_move(move):
+    """16-bit code for a chess.Move or UCI string"""
+    if isinstance(move, str):
+        move = chess.Move.from_uci(move)
+    return move.from_square | move.to_square << TO_SHIFT | (move.promotion or 0) << PROMOTION_SHIFT
+
+
+def decode_move(code):
+    if code == 0:
+        return chess.Move.null()
+    return chess.Move(code & FROM_MASK, code >> TO_SHIFT & FROM_MASK, code >> PROMOTION_SHIFT or None)
+
+
+def encode_moves(moves):
+    """Little-endian bytes, two per move"""
+    codes = [encode_move(move) for move in moves]
+    return struct.pack(f"<{len(codes)}H", *codes)
+
+
+def decode_moves(data):
+    """List of chess.Move from encode_moves output"""
+    return [decode_move(code) for code in struct.unpack(f"<{len(data) // 2}H", data)]
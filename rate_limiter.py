@@ -0,0 +1,136 @@
+import threading
+import time
+
+WINDOW = 900.0
+# Failed logins per account per window, whichever address they come from
+MAX_USER_FAILURES = 5
+# Login attempts per address per window, successful or not
+MAX_IP_ATTEMPTS = 30
+# Forget keys that have been quiet this long (in windows) every PRUNE_EVERY events
+PRUNE_EVERY = 1000
+
+
+class SlidingWindowCounter:
+    """Approximate number of events per key over the last `window` seconds.
+
+    Each key keeps the count of the current fixed window and of the previous one; the previous count is
+    weighted by how much of it still overlaps the sliding window. That is three numbers per key no matter
+    how many events arrive, so a flood can't grow memory or make a lookup slower.
+    """
+
+    def __init__(self, window=WINDOW, clock=time.time):
+        self.window = window
+        self.clock = clock
+        self.keys = {}  # key -> [window start, current count, previous count]
+        self.events = 0
+
+    def _slot(self, key, now):
+        start = now - now % self.window
+        slot = self.keys.get(key)
+        if slot is None:
+            slot = self.keys[key] = [start, 0, 0]
+        elif slot[0] != start:
+            # One window later the current count becomes the previous one; any later, both are stale
+            slot[2] = slot[1] if start - slot[0] == self.window else 0
+            slot[0], slot[1] = start, 0
+        return slot
+
+    def count(self, key, now=None):
+        now = self.clock() if now is None else now
+        if key not in self.keys:
+            return 0.0
+        start, current, previous = self._slot(key, now)
+        return current + previous * (1 - (now - start) / self.window)
+
+    def add(self, key, now=None, amount=1):
+        now = self.clock() if now is None else now
+        self._slot(key, now)[1] += amount
+        self.events += 1
+        if self.events % PRUNE_EVERY == 0:
+            self.prune(now)
+
+    def retry_after(self, key, limit, now=None):
+        """Seconds until the count drops below limit (0 if it already is)"""
+        now = self.clock() if now is None else now
+        if self.count(key, now) < limit:
+            return 0.0
+        start, current, previous = self.keys[key]
+        if current >= limit:
+            # Only the next window helps, and then this window's events decay like previous ones do now
+            return start + self.window - now + self.window * (1 - limit / current)
+        # previous * (1 - elapsed / window) must fall below limit - current
+        return max(0.0, start + self.window * (1 - (limit - current) / previous) - now)
+
+    def reset(self, key):
+        self.keys.pop(key, None)
+
+    def prune(self, now=None):
+        now = self.clock() if now is None else now
+        stale = [key for key, slot in self.keys.items() if now - slot[0] >= 2 * self.window]
+        for key in stale:
+            del self.keys[key]
+        return len(stale)
+
+
+class LoginRateLimiter:
+    """Rejects login floods before any password hashing is done.
+
+    check() runs once authenticate_user has looked the account up, before any password is hashed: it counts
+    the attempt against the address and refuses it if that address, or the failures on that account, are over
+    the limit. Accounts are keyed by their username, whether the username or the email was typed. record() is
+    told the outcome afterwards. The durable record is the login_attempts table, which restore() replays on start.
+    """
+
+    def __init__(self, window=WINDOW, max_user_failures=MAX_USER_FAILURES, max_ip_attempts=MAX_IP_ATTEMPTS,
+                 clock=time.time):
+        self.max_user_failures = max_user_failures
+        self.max_ip_attempts = max_ip_attempts
+        self.clock = clock
+        self.user_failures = SlidingWindowCounter(window, clock)
+        self.ip_attempts = SlidingWindowCounter(window, clock)
+        self.lock = threading.Lock()
+        self.counters = {"allowed": 0, "rejected": 0}
+
+    def check(self, username, ip_address=None):
+        """0 if the attempt may go ahead, otherwise the seconds to wait"""
+        now = self.clock()
+        with self.lock:
+            wait = self.user_failures.retry_after(username.lower(), self.max_user_failures, now)
+            if ip_address:
+                wait = max(wait, self.ip_attempts.retry_after(ip_address, self.max_ip_attempts, now))
+                if not wait:
+                    self.ip_attempts.add(ip_address, now)
+            self.counters["rejected" if wait else "allowed"] += 1
+            return wait
+
+    def record(self, username, ip_address, successful):
+        with self.lock:
+            if successful:
+                self.user_failures.reset(username.lower())
+            else:
+                self.user_failures.add(username.lower())
+
+    def failures(self, username):
+        """Failures counted against username in the current window"""
+        with self.lock:
+            return self.user_failures.count(username.lower())
+
+    def restore(self, db):
+        """Rebuild the counters from the attempts stored within the last window"""
+        attempts = db.recent_login_attempts(self.user_failures.window)
+        with self.lock:
+            for username, ip_address, successful, attempt_time in attempts:
+                if ip_address:
+                    self.ip_attempts.add(ip_address, attempt_time)
+                if successful:
+                    self.user_failures.reset(username.lower())
+                else:
+                    self.user_failures.add(username.lower(), attempt_time)
+        return len(attempts)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["tracked_users"] = len(self.user_failures.keys)
+            stats["tracked_addresses"] = len(self.ip_attempts.keys)
+            return stats
@@ -0,0 +1,163 @@
+import argparse
+from collections import defaultdict
+from concurrent.futures import Future
+from datetime import date
+import chess.pgn
+from SQLL_database import INITIAL_RATING, UserDatabase, rate_users
+
+K_FACTOR = 32
+# Ratings never go below this (UserDatabase.add_rating enforces the same rule)
+RATING_FLOOR = 0
+SCORES = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+
+def expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def elo_update(white_rating, black_rating, white_score, k=K_FACTOR):
+    """New (white, black) ratings after one game; the floor can make the exchange uneven"""
+    delta = round(k * (white_score - expected_score(white_rating, black_rating)))
+    return max(RATING_FLOOR, white_rating + delta), max(RATING_FLOOR, black_rating - delta)
+
+
+class RatingService:
+    """Applies the Elo change of each finished game once, to both players in one transaction"""
+
+    def __init__(self, db=None, k=K_FACTOR, writer=None):
+        self.db = db or UserDatabase()
+        self.k = k
+        self.writer = writer
+
+    def check_game(self, white, black, result):
+        if result not in SCORES:
+            return f"Unknown result '{result}'"
+        if white == black:
+            return "A player can't be rated against themselves"
+        return None
+
+    def compute_for(self, white, black, result):
+        def compute(ratings):
+            new_white, new_black = elo_update(ratings[white], ratings[black], SCORES[result], self.k)
+            return {white: new_white, black: new_black}
+        return compute
+
+    def record_game(self, white, black, result):
+        """result is '1-0', '0-1' or '1/2-1/2'. Returns (success, {username: (old, new)} or message)"""
+        error = self.check_game(white, black, result)
+        if error:
+            return False, error
+        return self.db.update_ratings([white, black], self.compute_for(white, black, result))
+
+    def submit_game(self, white, black, result):
+        """record_game through the DatabaseWriter; returns a Future of the same (success, ...) pair"""
+        error = self.check_game(white, black, result)
+        if error or self.writer is None:
+            future = Future()
+            future.set_result((False, error) if error else self.record_game(white, black, result))
+            return future
+        return self.writer.submit(rate_users, [white, black], self.compute_for(white, black, result))
+
+
+# ---- history replay ----
+
+def read_pgn_results(path):
+    """(white, black, score, date or None) for every decided game in a PGN file, in file order"""
+    games = []
+    with open(path, encoding="utf8") as f:
+        while True:
+            headers = chess.pgn.read_headers(f)
+            if headers is None:
+                break
+            result = headers.get("Result")
+            if result not in SCORES:
+                continue
+            games.append((headers.get("White", "?"), headers.get("Black", "?"), SCORES[result],
+                          parse_pgn_date(headers.get("Date", ""))))
+    return games
+
+
+def stored_results(db):
+    """Same tuples as read_pgn_results for the games the server recorded"""
+    return [(game["white"], game["black"], SCORES[game["result"]], parse_pgn_date((game["ended_at"] or "")[:10], "-"))
+            for game in db.iter_games() if game["result"] in SCORES]
+
+
+def parse_pgn_date(text, separator="."):
+    try:
+        year, month, day = (int(part) for part in text.split(separator))
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def rating_periods(games, period_days):
+    """Split games into consecutive rating periods of period_days (0 = every game is its own period).
+    Undated games stay in the period of the game before them."""
+    if period_days <= 0:
+        return [[game] for game in games]
+
+    periods = []
+    current_key = None
+    for game in games:
+        game_date = game[3]
+        key = game_date.toordinal() // period_days if game_date else current_key
+        if not periods or key != current_key:
+            periods.append([])
+            current_key = key
+        periods[-1].append(game)
+    return periods
+
+
+def replay(games, period_days=0, k=K_FACTOR, initial=None):
+    """Final ratings after replaying games from scratch.
+
+    Within a rating period every game is scored against the ratings at the start of the period and
+    each player's changes are summed and applied once, so the cost is one pass over the games no matter
+    how many games a player has per period. period_days=0 reproduces the live one-game-at-a-time updates.
+    """
+    # Players start where new accounts do (see SQLL_database.INITIAL_RATING)
+    ratings = defaultdict(lambda: INITIAL_RATING)
+    ratings.update(initial or {})
+
+    for period in rating_periods(games, period_days):
+        changes = defaultdict(float)
+        for white, black, score, _ in period:
+            change = k * (score - expected_score(ratings[white], ratings[black]))
+            changes[white] += change
+            changes[black] -= change
+        for player, change in changes.items():
+            ratings[player] = max(RATING_FLOOR, ratings[player] + round(change))
+    return dict(ratings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute Elo ratings by replaying a game history")
+    parser.add_argument("pgn", nargs="*", help="PGN files with the games, oldest first (default: the games table)")
+    parser.add_argument("--period-days", type=int, default=0,
+                        help="length of a rating period in days (0 = update after every game)")
+    parser.add_argument("--k", type=float, default=K_FACTOR, help="Elo K-factor")
+    parser.add_argument("--top", type=int, default=20, help="how many players to print")
+    parser.add_argument("--apply", action="store_true", help="write the recomputed ratings to the user database")
+    parser.add_argument("--db", default="user_data.db", help="database with the users (and games when no PGN is given)")
+    args = parser.parse_args(argv)
+
+    games = []
+    for path in args.pgn:
+        games.extend(read_pgn_results(path))
+    if not args.pgn:
+        games = stored_results(UserDatabase(args.db))
+    ratings = replay(games, args.period_days, args.k)
+
+    print(f"replayed {len(games)} games, {len(ratings)} players, "
+          f"{len(rating_periods(games, args.period_days))} rating periods")
+    for rank, (player, rating) in enumerate(sorted(ratings.items(), key=lambda item: -item[1])[:args.top], start=1):
+        print(f"{rank:>4}. {player:<24} {rating:>6}")
+
+    if args.apply:
+        updated = UserDatabase(args.db).set_ratings(ratings)
+        print(f"updated {updated} users in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
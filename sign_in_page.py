@@ -1,16 +1,15 @@
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
-import random
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import re
 from tkinter import messagebox
-from SQLL_database import UserDatabase
+import auth_client
 import sys
 import os
 import tkinter as tk
 
+# How often the UI checks whether a background server call has finished (ms)
+TASK_POLL_MS = 20
+
 
 class SignInApp:
     def __init__(self, root=None):
@@ -27,11 +26,8 @@ class SignInApp:
         self.root.title("Authentication")
         self.root.attributes('-fullscreen', True)
 
-        # Initialize database
-        self.db = UserDatabase()
-
-        # Add sample user for testing if needed
-        self.db.add_sample_user()
+        # Background server call in flight (password hashing), so repeated clicks don't queue more
+        self.pending_task = None
 
         # Get screen dimensions
         self.screen_width = self.root.winfo_screenwidth()
@@ -401,6 +397,11 @@ class SignInApp:
 
         return server_ip.strip(), port
 
+    @property
+    def db(self):
+        """Account calls go to the server in the connection fields; only the server opens user_data.db"""
+        return auth_client.connect(*self.get_server_connection_info())
+
     def load_home_screen(self, username):
         """Load the home screen module and transition to it"""
         # Add the current directory to sys.path if it's not already there
@@ -424,6 +425,29 @@ class SignInApp:
         except ImportError as e:
             messagebox.showerror("Error", f"Could not load home screen: {str(e)}")
 
+    def run_db_task(self, method_name, *args, on_done):
+        """Run a slow account call off the Tk thread and call on_done(result) back on it"""
+        if self.pending_task is not None:
+            return
+        self.pending_task = self.db.submit(method_name, *args)
+        self.root.config(cursor="watch")
+
+        def check():
+            future = self.pending_task
+            if not future.done():
+                self.root.after(TASK_POLL_MS, check)
+                return
+            self.pending_task = None
+            self.root.config(cursor="")
+            try:
+                result = future.result()
+            except Exception as e:
+                messagebox.showerror("Error", f"Server error: {e}")
+                return
+            on_done(result)
+
+        self.root.after(TASK_POLL_MS, check)
+
     def sign_in(self):
         username_or_email = self.username_entry.get()
         password = self.password_entry.get()
@@ -433,8 +457,11 @@ class SignInApp:
             messagebox.showerror("Error", "Please enter both username/email and password")
             return
 
-        # Authenticate with database
-        success, result = self.db.authenticate_user(username_or_email, password)
+        # Authenticate with database (password hashing runs in the background)
+        self.run_db_task("authenticate_user", username_or_email, password, on_done=self.finish_sign_in)
+
+    def finish_sign_in(self, auth_result):
+        success, result = auth_result
 
         if success:
             messagebox.showinfo("Success", f"Welcome back, {result['username']}!")
@@ -454,27 +481,16 @@ class SignInApp:
             messagebox.showerror("Error", "Please enter a valid email address")
             return
 
-        # Check if email exists in database
-        if not self.db.email_exists(email):
-            messagebox.showerror("Error", "Email not found in our records")
-            return
-
-        # Generate a random 6-digit code
-        code = str(random.randint(100000, 999999))
-
-        # Store code in database
-        success, message = self.db.create_password_reset(email, code)
+        # The server checks the email, stores a code and mails it
+        success, message = self.db.request_password_reset(email)
 
         if not success:
             messagebox.showerror("Error", message)
             return
 
-        # Save current email and code for verification
+        # Save current email for verification
         self.current_email = email
-        self.current_reset_code = code
-
-        # Send email with verification code
-        self.send_verification_email(email, code, "Password Reset")
+        messagebox.showinfo("Success", message)
 
         # Navigate to verification page
         self.show_verification_page("password_reset")
@@ -495,14 +511,6 @@ class SignInApp:
             messagebox.showerror("Error", "Please enter a valid email address")
             return
 
-        if self.db.email_exists(email):
-            messagebox.showerror("Error", "Email already exists")
-            return
-
-        if self.db.username_exists(username):
-            messagebox.showerror("Error", "Username already exists")
-            return
-
         if password != confirm_password:
             messagebox.showerror("Error", "Passwords do not match")
             return
@@ -511,49 +519,23 @@ class SignInApp:
             messagebox.showerror("Error", "Password must be at least 8 characters long")
             return
 
-        # Generate and send verification code
-        code = str(random.randint(100000, 999999))
-
-        # Add to pending users
-        success = self.db.add_pending_user(username, email, password, code)
+        # The server checks username and email, adds the pending user and mails the code
+        self.run_db_task("sign_up", username, email, password,
+                         on_done=lambda result: self.finish_sign_up(result, email))
 
+    def finish_sign_up(self, sign_up_result, email):
+        success, message = sign_up_result
         if not success:
-            messagebox.showerror("Error", "Failed to register user")
+            messagebox.showerror("Error", message)
             return
 
         # Save current email
         self.current_email = email
-
-        # Send verification email
-        self.send_verification_email(email, code, "Account Verification")
+        messagebox.showinfo("Success", message)
 
         # Navigate to signup verification page
         self.show_signup_verification_page()
 
-    def send_verification_email(self, email, code, purpose="Password Reset"):
-        # Email sending details (replace with your SMTP details)
-        sender_email = "chess.master9544@gmail.com"
-        sender_password = "xvdbnrghfruyoyfl"
-        subject = f"{purpose} Code"
-        body = f"Your {purpose.lower()} code is: {code}"
-
-        msg = MIMEMultipart()
-        msg["From"] = sender_email
-        msg["To"] = email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-
-        try:
-            with smtplib.SMTP("smtp.gmail.com", 587) as server:
-                server.starttls()
-                server.login(sender_email, sender_password)
-                server.sendmail(sender_email, email, msg.as_string())
-            print(f"Verification code sent to {email}: {code}")
-            messagebox.showinfo("Success", "Verification code sent to your email")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
-            messagebox.showerror("Error", f"Failed to send email: {e}")
-
     def resend_verification_code(self):
         if self.verification_mode == "password_reset":
             self.send_password_reset_verification_code()
@@ -562,14 +544,11 @@ class SignInApp:
         email = self.current_email
 
         if email:
-            # Generate a new code
-            code = str(random.randint(100000, 999999))
-
-            # Update verification code in database
-            success, message = self.db.resend_verification(email, code)
+            # The server replaces the code and mails the new one
+            success, message = self.db.resend_verification(email)
 
             if success:
-                self.send_verification_email(email, code, "Account Verification")
+                messagebox.showinfo("Success", "A new verification code is on its way to your email")
             else:
                 messagebox.showerror("Error", message)
         else:
@@ -587,7 +566,7 @@ class SignInApp:
             messagebox.showerror("Error", "Email not found")
             return
 
-        # Verify code with database
+        # Verify code with the server
         success, message = self.db.verify_reset_code(email, code)
 
         if success:
@@ -642,8 +621,11 @@ class SignInApp:
             messagebox.showerror("Error", "Invalid password reset session")
             return
 
-        # Reset password in database
-        success, message = self.db.reset_password(email, reset_code, new_password)
+        # Reset password on the server (password hashing runs in the background)
+        self.run_db_task("reset_password", email, reset_code, new_password, on_done=self.finish_reset_password)
+
+    def finish_reset_password(self, reset_result):
+        success, message = reset_result
 
         if success:
             messagebox.showinfo("Success", message)
@@ -0,0 +1,137 @@
+import queue
+import threading
+from stockfish_pool import get_pool, difficulty_profile
+from evaluation_cache import EvaluationCache
+
+DEFAULT_MOVETIME_MS = 1000
+
+# Answers shared by every client, so takebacks and common openings don't search again
+shared_cache = EvaluationCache()
+
+
+class AsyncStockfishClient:
+    """Runs Stockfish searches off the UI thread; finished moves are collected with poll()"""
+
+    def __init__(self, path, difficulty_level=1, movetime_ms=DEFAULT_MOVETIME_MS, cache=shared_cache):
+        self.pool = get_pool(path)
+        self.engine = self.pool.acquire(difficulty_level)
+        profile = difficulty_profile(difficulty_level)
+        self.depth = profile["depth"]
+        self.movetime_ms = movetime_ms
+        self.cache = cache
+        # Everything besides the position that changes the answer
+        self.profile = (path, profile["depth"], profile["elo"], movetime_ms)
+        self.results = queue.Queue()
+        self.lock = threading.Lock()
+        self.request_id = 0
+        # busy: a worker thread owns the engine; searching: a go command is running in the engine
+        self.busy = False
+        self.searching = False
+        self.cancelled = False
+        self.closed = False
+
+    def _write(self, command):
+        # Engine._put() waits for isready first, which would block until a running search ends
+        self.engine._stockfish.stdin.write(command + "\n")
+        self.engine._stockfish.stdin.flush()
+
+    def _stop(self):
+        if self.searching:
+            try:
+                self._write("stop")
+            except OSError:
+                # The engine process is gone, so there is nothing left to stop
+                pass
+
+    def request_move(self, fen):
+        """Start searching fen in the background; returns the id its result will carry"""
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("Stockfish client is closed")
+            if self.busy:
+                raise RuntimeError("A Stockfish search is already running")
+            self.request_id += 1
+            request_id = self.request_id
+
+            cached = self.cache.get(fen, self.profile) if self.cache is not None else None
+            if cached is not None:
+                self.results.put((request_id, cached["bestmove"], None))
+                return request_id
+
+            self.busy = True
+            self.cancelled = False
+
+        threading.Thread(target=self._search, args=(request_id, fen), daemon=True).start()
+        return request_id
+
+    def _search(self, request_id, fen):
+        move, error, answer = None, None, None
+        try:
+            self.engine.set_fen_position(fen)
+            with self.lock:
+                started = not self.cancelled
+                if started:
+                    # Depth keeps the difficulty profile, movetime bounds how long the player waits
+                    self._write(f"go depth {self.depth} movetime {self.movetime_ms}")
+                    self.searching = True
+            if started:
+                answer = self._read_best_move()
+                move = answer["bestmove"]
+        except Exception as e:
+            error = e
+        finally:
+            with self.lock:
+                self.busy = False
+                self.searching = False
+                cancelled, closed = self.cancelled, self.closed
+
+        # A stopped search is cut short, so only complete answers are worth reusing
+        if answer is not None and move is not None and not cancelled and self.cache is not None:
+            self.cache.put(fen, answer, self.profile)
+
+        if closed:
+            self.pool.release(self.engine)
+        elif not cancelled:
+            self.results.put((request_id, move, error))
+
+    def _read_best_move(self):
+        """Read search output up to bestmove: {'bestmove', 'score', 'mate'} from the side to move"""
+        answer = {"bestmove": None, "score": None, "mate": None}
+        while True:
+            parts = self.engine._read_line().split()
+            if not parts:
+                continue
+            if parts[0] == "bestmove":
+                if parts[1] != "(none)":
+                    answer["bestmove"] = parts[1]
+                return answer
+            if parts[0] == "info" and "score" in parts:
+                index = parts.index("score")
+                kind, value = parts[index + 1], int(parts[index + 2])
+                answer["score"], answer["mate"] = (value, None) if kind == "cp" else (None, value)
+
+    def poll(self):
+        """Next finished (request_id, move, error), or None while still thinking"""
+        try:
+            return self.results.get_nowait()
+        except queue.Empty:
+            return None
+
+    def cancel(self):
+        """Abandon the running search; its result is dropped"""
+        with self.lock:
+            self.cancelled = True
+            self._stop()
+
+    def close(self):
+        """Stop any search and hand the engine back to the pool once it is idle"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.cancelled = True
+            self._stop()
+            release_now = not self.busy
+
+        if release_now:
+            self.pool.release(self.engine)
@@ -0,0 +1,142 @@
+import atexit
+import threading
+from stockfish import Stockfish
+
+
+def difficulty_profile(difficulty_level):
+    """Search depth and Elo limit (None = full strength) for a difficulty level"""
+    if difficulty_level <= 5:
+        # Beginner levels
+        return {"depth": max(1, difficulty_level), "elo": 800 + (difficulty_level - 1) * 100}
+    elif difficulty_level <= 10:
+        # Intermediate levels
+        return {"depth": 5 + (difficulty_level - 5), "elo": 1200 + (difficulty_level - 6) * 150}
+    elif difficulty_level <= 15:
+        # Advanced levels
+        return {"depth": 10 + (difficulty_level - 10), "elo": 1950 + (difficulty_level - 11) * 100}
+    else:
+        # Expert levels - full strength
+        return {"depth": 15, "elo": None}
+
+
+class StockfishPool:
+    """Keeps Stockfish processes alive between games so a new game doesn't pay engine startup"""
+
+    def __init__(self, path, max_idle=2):
+        self.path = path
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        # Profile currently applied to each engine, so unchanged options aren't re-sent
+        self.profiles = {}
+        self.closed = False
+
+    def _spawn(self):
+        return Stockfish(self.path)
+
+    def is_healthy(self, engine):
+        """The process is still running and answers isready"""
+        try:
+            if engine._stockfish.poll() is not None:
+                return False
+            engine._is_ready()
+            return True
+        except Exception:
+            return False
+
+    def _terminate(self, engine):
+        self.profiles.pop(id(engine), None)
+        try:
+            engine.send_quit_command()
+        except Exception:
+            pass
+
+    def apply_profile(self, engine, difficulty_level):
+        profile = difficulty_profile(difficulty_level)
+        engine.set_depth(profile["depth"])
+        if self.profiles.get(id(engine)) == profile:
+            return
+
+        try:
+            if profile["elo"] is not None:
+                engine.set_elo_rating(profile["elo"])
+            else:
+                engine.update_engine_parameters({"UCI_LimitStrength": False})
+        except Exception as config_error:
+            # e.g. an Elo below the engine's minimum: play at full strength and only limit depth,
+            # like a freshly started engine would
+            print(f"Warning: Could not configure engine settings: {config_error}")
+            engine.update_engine_parameters({"UCI_LimitStrength": False})
+        self.profiles[id(engine)] = profile
+
+    def acquire(self, difficulty_level=1):
+        """Get a ready engine configured for difficulty_level, reusing an idle one when possible"""
+        engine = None
+        while engine is None:
+            with self.lock:
+                candidate = self.idle.pop() if self.idle else None
+            if candidate is None:
+                engine = self._spawn()
+            elif self.is_healthy(candidate):
+                engine = candidate
+            else:
+                self._terminate(candidate)
+
+        engine.send_ucinewgame_command()
+        self.apply_profile(engine, difficulty_level)
+        return engine
+
+    def release(self, engine):
+        """Return an engine after a game; extra or broken engines are shut down"""
+        if engine is None:
+            return
+        with self.lock:
+            keep = not self.closed and len(self.idle) < self.max_idle
+            if keep:
+                self.idle.append(engine)
+        if not keep:
+            self._terminate(engine)
+
+    def warm_up(self, count=1):
+        """Start engines in the background so the first game doesn't wait for a spawn"""
+        def spawn():
+            for _ in range(count):
+                with self.lock:
+                    if self.closed or len(self.idle) >= self.max_idle:
+                        return
+                try:
+                    engine = self._spawn()
+                except Exception as e:
+                    print(f"Stockfish warm-up failed: {e}")
+                    return
+                self.release(engine)
+
+        threading.Thread(target=spawn, daemon=True).start()
+
+    def shutdown(self):
+        with self.lock:
+            self.closed = True
+            engines, self.idle = self.idle, []
+        for engine in engines:
+            self._terminate(engine)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    """Shared pool for one engine binary"""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = StockfishPool(path)
+        return pool
+
+
+@atexit.register
+def shutdown_all():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.shutdown()
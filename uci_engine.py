@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+import sys
+import threading
+import time
+import chess
+from chess_bot import ChessBot, TranspositionTable
+
+ENGINE_NAME = "ChessBot"
+ENGINE_AUTHOR = "chess master"
+
+DEFAULT_HASH_MB = 64
+# Rough size of one transposition table entry (dict + key) in bytes
+TT_ENTRY_BYTES = 250
+MAX_DEPTH = 64
+
+
+def time_budget(board, params):
+    """Seconds to spend on this move from the go parameters, or None for no limit"""
+    if "movetime" in params:
+        return params["movetime"] / 1000.0
+
+    remaining = params.get("wtime" if board.turn == chess.WHITE else "btime")
+    if remaining is None:
+        return None
+
+    increment = params.get("winc" if board.turn == chess.WHITE else "binc", 0)
+    moves_to_go = params.get("movestogo", 30)
+    budget = remaining / max(1, moves_to_go) + increment * 0.75
+    # Never plan to use more than half the clock, and keep a small safety margin
+    budget = min(budget, remaining * 0.5) - 50
+    return max(0.01, budget / 1000.0)
+
+
+class UciEngine:
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.output_lock = threading.Lock()
+        self.bot = ChessBot()
+        self.bot.info_callback = self.send_info
+        self.hash_mb = DEFAULT_HASH_MB
+        self.bot.tt = TranspositionTable(self.tt_entries())
+        self.board = chess.Board()
+
+        self.search_thread = None
+        # Set when the GUI allows the result to be printed (stop/ponderhit or a normal search)
+        self.release_event = threading.Event()
+        self.search_board = None
+        self.pending_budget = None
+        self.pondering = False
+
+    def tt_entries(self):
+        return max(1024, self.hash_mb * 1024 * 1024 // TT_ENTRY_BYTES)
+
+    def send(self, line):
+        with self.output_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    # ---- command handlers ----
+
+    def handle(self, line):
+        """Process one line from the GUI; returns False on quit"""
+        parts = line.split()
+        if not parts:
+            return True
+        command, args = parts[0], parts[1:]
+
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 4096")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.wait_for_search()
+            self.bot.tt = TranspositionTable(self.tt_entries())
+            self.board = chess.Board()
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "position":
+            self.wait_for_search()
+            self.set_position(args)
+        elif command == "go":
+            self.wait_for_search()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "d":
+            self.send(str(self.board))
+            self.send(f"Fen: {self.board.fen()}")
+        elif command == "quit":
+            self.stop()
+            return False
+        return True
+
+    def set_option(self, args):
+        if "name" not in args:
+            return
+        name_end = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:name_end]).lower()
+        value = " ".join(args[name_end + 1:])
+
+        if name == "hash":
+            try:
+                self.hash_mb = max(1, int(value))
+            except ValueError:
+                return
+            self.wait_for_search()
+            self.bot.tt = TranspositionTable(self.tt_entries())
+
+    def set_position(self, args):
+        if not args:
+            return
+        if args[0] == "startpos":
+            board = chess.Board()
+            rest = args[1:]
+        elif args[0] == "fen":
+            fen_end = args.index("moves") if "moves" in args else len(args)
+            try:
+                board = chess.Board(" ".join(args[1:fen_end]))
+            except ValueError:
+                return
+            rest = args[fen_end:]
+        else:
+            return
+
+        if rest and rest[0] == "moves":
+            for uci in rest[1:]:
+                try:
+                    board.push_uci(uci)
+                except ValueError:
+                    break
+        self.board = board
+
+    def go(self, args):
+        params = {}
+        flags = set()
+        index = 0
+        while index < len(args):
+            key = args[index]
+            if key in ("infinite", "ponder"):
+                flags.add(key)
+                index += 1
+            elif key in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes", "mate"):
+                try:
+                    params[key] = int(args[index + 1])
+                except (IndexError, ValueError):
+                    pass
+                index += 2
+            else:
+                index += 1
+
+        budget = time_budget(self.board, params)
+        max_depth = params.get("depth", MAX_DEPTH)
+
+        self.pondering = "ponder" in flags
+        infinite = "infinite" in flags or self.pondering
+        # While pondering the clock has not started; ponderhit switches to the real budget
+        self.pending_budget = budget
+        self.bot.time_limit = float('inf') if infinite or budget is None else budget
+        self.bot.stop_requested = False
+
+        if infinite:
+            self.release_event.clear()
+        else:
+            self.release_event.set()
+
+        self.search_board = self.board.copy()
+        self.search_thread = threading.Thread(target=self.search, args=(self.search_board, max_depth),
+                                              daemon=True)
+        self.search_thread.start()
+
+    def search(self, board, max_depth):
+        move = None
+        try:
+            if any(board.legal_moves):
+                move, _ = self.bot.iterative_deepening(board, max_depth)
+                if move is None:
+                    # Stopped before depth 1 finished: any legal move beats no move
+                    move = next(iter(board.legal_moves))
+        except Exception as e:
+            self.send(f"info string search error: {e}")
+
+        # In infinite/ponder mode the GUI expects bestmove only after stop or ponderhit
+        self.release_event.wait()
+
+        if move is None:
+            self.send("bestmove 0000")
+            return
+
+        ponder_move = None
+        if self.bot.depth_history and self.bot.depth_history[-1].get('pv'):
+            pv = self.bot.depth_history[-1]['pv']
+            if len(pv) > 1 and pv[0] == move:
+                ponder_move = pv[1]
+        if ponder_move:
+            self.send(f"bestmove {move.uci()} ponder {ponder_move.uci()}")
+        else:
+            self.send(f"bestmove {move.uci()}")
+
+    def send_info(self, entry):
+        """ChessBot info_callback: one UCI info line per finished depth"""
+        if not entry['completed']:
+            return
+        elapsed = max(entry['time'], 1e-6)
+        score = entry['eval']
+        # ChessBot scores are from White's side; UCI wants the side to move
+        if self.search_board is not None and self.search_board.turn == chess.BLACK:
+            score = -score
+        if score in (float('inf'), float('-inf')):
+            return
+        pv = " ".join(move.uci() for move in entry.get('pv', []))
+        self.send(f"info depth {entry['depth']} score cp {int(score)} nodes {entry['nodes']} "
+                  f"nps {int(entry['nodes'] / elapsed)} time {int(elapsed * 1000)} "
+                  f"hashfull {self.bot.tt.hashfull()}" + (f" pv {pv}" if pv else ""))
+
+    def stop(self):
+        if self.search_thread and self.search_thread.is_alive():
+            self.bot.stop_requested = True
+            self.release_event.set()
+            self.search_thread.join()
+
+    def ponderhit(self):
+        if not self.pondering:
+            return
+        self.pondering = False
+        if self.pending_budget is not None:
+            # The clock starts now: allow the elapsed ponder time plus the normal budget
+            self.bot.time_limit = (time.time() - self.bot.start_time) + self.pending_budget
+        self.release_event.set()
+
+    def wait_for_search(self):
+        """Commands that change state must not race a running search"""
+        if self.search_thread and self.search_thread.is_alive():
+            if not self.release_event.is_set():
+                self.stop()
+            else:
+                self.search_thread.join()
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line.strip()):
+            return
+    # End of input is an implicit quit: finish the running search so its bestmove is still printed
+    engine.stop()
+    engine.wait_for_search()
+
+
+if __name__ == "__main__":
+    main()